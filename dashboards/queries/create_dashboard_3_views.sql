@@ -60,6 +60,42 @@ SELECT
 FROM ccvi_with_names
 WHERE latitude IS NOT NULL;
 
+-- ============================================================================
+-- VIEW 1b: v_ccvi_trip_pairs_weekly
+-- Purpose: Weekly trip counts and sums per pickup/dropoff community area, the
+--          partial aggregates VIEW 2, 5 and 6 total (additive: averages are
+--          kept as sums and counts)
+-- ============================================================================
+CREATE OR REPLACE VIEW `chicago-bi-app-msds-432-476520.gold_data.v_ccvi_trip_pairs_weekly` AS
+SELECT
+  DATE_TRUNC(t.trip_date, WEEK) as week_start,
+  t.pickup_community_area,
+  t.dropoff_community_area,
+
+  -- Trip counts
+  COUNT(*) as trips,
+  SUM(CASE WHEN t.trips_pooled > 1 THEN 1 ELSE 0 END) as pooled_trips,
+  SUM(CASE WHEN t.trips_pooled = 1 OR t.trips_pooled IS NULL THEN 1 ELSE 0 END) as solo_trips,
+  SUM(CASE WHEN t.source_dataset = 'taxi' THEN 1 ELSE 0 END) as taxi_trips,
+  SUM(CASE WHEN t.source_dataset = 'tnp' THEN 1 ELSE 0 END) as tnp_trips,
+  SUM(CASE WHEN t.shared_trip_authorized = TRUE THEN 1 ELSE 0 END) as shared_authorized,
+
+  -- Fare and distance sums with their non-NULL counts
+  SUM(t.fare) as fare_sum,
+  COUNT(t.fare) as fare_count,
+  SUM(CASE WHEN t.trips_pooled > 1 THEN t.fare END) as pooled_fare_sum,
+  COUNT(CASE WHEN t.trips_pooled > 1 THEN t.fare END) as pooled_fare_count,
+  SUM(CASE WHEN t.trips_pooled = 1 OR t.trips_pooled IS NULL THEN t.fare END) as solo_fare_sum,
+  COUNT(CASE WHEN t.trips_pooled = 1 OR t.trips_pooled IS NULL THEN t.fare END) as solo_fare_count,
+  SUM(t.trip_miles) as miles_sum,
+  COUNT(t.trip_miles) as miles_count
+
+FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched` t
+GROUP BY
+  DATE_TRUNC(t.trip_date, WEEK),
+  t.pickup_community_area,
+  t.dropoff_community_area;
+
 -- ============================================================================
 -- VIEW 2: v_ccvi_trip_activity
 -- Purpose: Taxi trip volumes from/to CCVI high-risk areas
@@ -78,27 +114,27 @@ high_risk_zips AS (
 ),
 trips_from_high_risk AS (
   SELECT
-    t.pickup_community_area as community_area,
+    p.pickup_community_area as community_area,
     ca.ccvi_score,
-    COUNT(*) as trips_from_area,
-    SUM(CASE WHEN t.trips_pooled > 1 THEN 1 ELSE 0 END) as pooled_trips_from,
-    AVG(t.fare) as avg_fare_from,
-    AVG(t.trip_miles) as avg_miles_from
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched` t
-  INNER JOIN high_risk_cas ca ON t.pickup_community_area = ca.community_area
-  GROUP BY t.pickup_community_area, ca.ccvi_score
+    SUM(p.trips) as trips_from_area,
+    SUM(p.pooled_trips) as pooled_trips_from,
+    SAFE_DIVIDE(SUM(p.fare_sum), SUM(p.fare_count)) as avg_fare_from,
+    SAFE_DIVIDE(SUM(p.miles_sum), SUM(p.miles_count)) as avg_miles_from
+  FROM `chicago-bi-app-msds-432-476520.gold_data.v_ccvi_trip_pairs_weekly` p
+  INNER JOIN high_risk_cas ca ON p.pickup_community_area = ca.community_area
+  GROUP BY p.pickup_community_area, ca.ccvi_score
 ),
 trips_to_high_risk AS (
   SELECT
-    t.dropoff_community_area as community_area,
+    p.dropoff_community_area as community_area,
     ca.ccvi_score,
-    COUNT(*) as trips_to_area,
-    SUM(CASE WHEN t.trips_pooled > 1 THEN 1 ELSE 0 END) as pooled_trips_to,
-    AVG(t.fare) as avg_fare_to,
-    AVG(t.trip_miles) as avg_miles_to
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched` t
-  INNER JOIN high_risk_cas ca ON t.dropoff_community_area = ca.community_area
-  GROUP BY t.dropoff_community_area, ca.ccvi_score
+    SUM(p.trips) as trips_to_area,
+    SUM(p.pooled_trips) as pooled_trips_to,
+    SAFE_DIVIDE(SUM(p.fare_sum), SUM(p.fare_count)) as avg_fare_to,
+    SAFE_DIVIDE(SUM(p.miles_sum), SUM(p.miles_count)) as avg_miles_to
+  FROM `chicago-bi-app-msds-432-476520.gold_data.v_ccvi_trip_pairs_weekly` p
+  INNER JOIN high_risk_cas ca ON p.dropoff_community_area = ca.community_area
+  GROUP BY p.dropoff_community_area, ca.ccvi_score
 ),
 combined AS (
   SELECT
@@ -253,33 +289,34 @@ SELECT
   ca.ccvi_score,
 
   -- Trip counts
-  COUNT(*) as total_trips,
-  SUM(CASE WHEN t.trips_pooled > 1 THEN 1 ELSE 0 END) as pooled_trips,
-  SUM(CASE WHEN t.trips_pooled = 1 OR t.trips_pooled IS NULL THEN 1 ELSE 0 END) as solo_trips,
+  SUM(p.trips) as total_trips,
+  SUM(p.pooled_trips) as pooled_trips,
+  SUM(p.solo_trips) as solo_trips,
 
   -- Pooled percentage
-  SAFE_DIVIDE(SUM(CASE WHEN t.trips_pooled > 1 THEN 1 ELSE 0 END), COUNT(*)) * 100 as pooled_pct,
+  SAFE_DIVIDE(SUM(p.pooled_trips), SUM(p.trips)) * 100 as pooled_pct,
 
   -- By source (Taxi vs TNP)
-  SUM(CASE WHEN t.source_dataset = 'taxi' THEN 1 ELSE 0 END) as taxi_trips,
-  SUM(CASE WHEN t.source_dataset = 'tnp' THEN 1 ELSE 0 END) as tnp_trips,
+  SUM(p.taxi_trips) as taxi_trips,
+  SUM(p.tnp_trips) as tnp_trips,
 
   -- Shared authorization rate
-  SUM(CASE WHEN t.shared_trip_authorized = TRUE THEN 1 ELSE 0 END) as shared_authorized,
-  SAFE_DIVIDE(SUM(CASE WHEN t.shared_trip_authorized = TRUE THEN 1 ELSE 0 END), COUNT(*)) * 100 as shared_auth_pct,
+  SUM(p.shared_authorized) as shared_authorized,
+  SAFE_DIVIDE(SUM(p.shared_authorized), SUM(p.trips)) * 100 as shared_auth_pct,
 
   -- Fare metrics
-  ROUND(AVG(t.fare), 2) as avg_fare,
-  ROUND(AVG(CASE WHEN t.trips_pooled > 1 THEN t.fare END), 2) as avg_fare_pooled,
-  ROUND(AVG(CASE WHEN t.trips_pooled = 1 OR t.trips_pooled IS NULL THEN t.fare END), 2) as avg_fare_solo,
+  ROUND(SAFE_DIVIDE(SUM(p.fare_sum), SUM(p.fare_count)), 2) as avg_fare,
+  ROUND(SAFE_DIVIDE(SUM(p.pooled_fare_sum), SUM(p.pooled_fare_count)), 2) as avg_fare_pooled,
+  ROUND(SAFE_DIVIDE(SUM(p.solo_fare_sum), SUM(p.solo_fare_count)), 2) as avg_fare_solo,
 
   -- Distance metrics
-  ROUND(AVG(t.trip_miles), 2) as avg_miles
+  ROUND(SAFE_DIVIDE(SUM(p.miles_sum), SUM(p.miles_count)), 2) as avg_miles
 
-FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched` t
+-- A trip counts once for each high-risk area it starts or ends in
+FROM `chicago-bi-app-msds-432-476520.gold_data.v_ccvi_trip_pairs_weekly` p
 INNER JOIN high_risk_cas ca
-  ON t.pickup_community_area = ca.community_area
-  OR t.dropoff_community_area = ca.community_area
+  ON p.pickup_community_area = ca.community_area
+  OR p.dropoff_community_area = ca.community_area
 LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.community_area_boundaries` cab
   ON ca.community_area = cab.area_numbe
 GROUP BY ca.community_area, cab.community, ca.ccvi_score
@@ -303,14 +340,14 @@ WITH ccvi_stats AS (
 ),
 trip_stats AS (
   SELECT
-    COUNT(*) as total_trips_high_ccvi_areas
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched` t
-  WHERE t.pickup_community_area IN (
+    COALESCE(SUM(p.trips), 0) as total_trips_high_ccvi_areas
+  FROM `chicago-bi-app-msds-432-476520.gold_data.v_ccvi_trip_pairs_weekly` p
+  WHERE p.pickup_community_area IN (
     SELECT CAST(geography_id AS INT64)
     FROM `chicago-bi-app-msds-432-476520.silver_data.silver_ccvi_high_risk`
     WHERE geography_type = 'CA'
   )
-  OR t.dropoff_community_area IN (
+  OR p.dropoff_community_area IN (
     SELECT CAST(geography_id AS INT64)
     FROM `chicago-bi-app-msds-432-476520.silver_data.silver_ccvi_high_risk`
     WHERE geography_type = 'CA'
@@ -1,6 +1,9 @@
 -- IQR Analysis for 8 Time Windows - Rush Hour Dashboard
 -- Purpose: Calculate min/max color scale limits for consistent comparison
 -- Created: November 20, 2025
+-- Source: gold_rush_hour_sketches (gold-layer/sql/10_gold_rush_hour_sketches.sql),
+--         one row per pickup ZIP, day and hour kept up to date by the trips
+--         pipeline; any trip_date range reads only its own partitions
 
 -- Calculate Q1, Q3, IQR, and limits for each time window
 WITH time_window_data AS (
@@ -21,7 +24,7 @@ WITH time_window_data AS (
       ELSE 'Other'
     END AS time_window,
     SUM(trip_count) AS total_trips
-  FROM `chicago-bi-app-msds-432-476520.gold_data.v_rush_hour_by_zip`
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`
   WHERE trip_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
     AND (
       (trip_hour >= 5 AND trip_hour < 7) OR
@@ -92,7 +95,7 @@ WITH time_window_data AS (
       ELSE 'Other'
     END AS time_window,
     SUM(trip_count) AS total_trips
-  FROM `chicago-bi-app-msds-432-476520.gold_data.v_rush_hour_by_zip`
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`
   WHERE trip_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
     AND (
       (trip_hour >= 5 AND trip_hour < 7) OR
@@ -162,7 +165,7 @@ WITH time_window_data AS (
       ELSE 'Other'
     END AS time_window,
     SUM(trip_count) AS total_trips
-  FROM `chicago-bi-app-msds-432-476520.gold_data.v_rush_hour_by_zip`
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`
   WHERE trip_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
   GROUP BY zip_code, trip_hour, day_type, time_window
 )
@@ -182,3 +185,32 @@ FROM time_window_data
 WHERE time_window != 'Other'
 GROUP BY time_window, day_type
 ORDER BY time_window, day_type;
+
+
+-- Fare percentiles by time window with weekday/weekend split, from the
+-- merged fare sketches (no trips are read; change the date range freely)
+SELECT
+  CASE
+    WHEN trip_hour >= 5 AND trip_hour < 7 THEN '1. 5 AM - 7 AM'
+    WHEN trip_hour >= 7 AND trip_hour < 9 THEN '2. 7 AM - 9 AM'
+    WHEN trip_hour >= 11 AND trip_hour < 13 THEN '3. 11 AM - 1 PM'
+    WHEN trip_hour >= 14 AND trip_hour < 16 THEN '4. 2 PM - 4 PM'
+    WHEN trip_hour >= 16 AND trip_hour < 18 THEN '5. 4 PM - 6 PM'
+    WHEN trip_hour >= 19 AND trip_hour < 21 THEN '6. 7 PM - 9 PM'
+    WHEN trip_hour >= 22 OR trip_hour = 0 THEN '7. 10 PM - 12 AM'
+    WHEN trip_hour >= 2 AND trip_hour < 4 THEN '8. 2 AM - 4 AM'
+    ELSE 'Other'
+  END AS time_window,
+  day_type,
+  SUM(trip_count) AS total_trips,
+  KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.25) AS fare_Q1,
+  KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.5) AS fare_median,
+  KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.75) AS fare_Q3,
+  KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.75) -
+    KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.25) AS fare_IQR,
+  KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.95) AS fare_p95
+FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`
+WHERE trip_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
+GROUP BY time_window, day_type
+HAVING time_window != 'Other'
+ORDER BY time_window, day_type;
@@ -115,7 +115,7 @@ SELECT
   ROUND(AVG(mape), 1) as avg_mape_pct,
   ROUND(AVG(r_squared), 3) as avg_r2,
   ROUND(AVG(training_records), 0) as avg_training_days
-FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics_latest`
 WHERE model_name LIKE 'traffic_forecast%'
 GROUP BY model_name, model_version, trained_date
 ORDER BY trained_date DESC;
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-process Prophet fit backend against cmdstanpy
+
+Fits the traffic (daily, multiplicative) and COVID (weekly, additive with
+regressors) model configurations on synthetic ZIP series with both backends,
+and reports fit time and how far the in-process forecasts are from the
+cmdstanpy ones. No BigQuery access is needed.
+
+Usage:
+    python3 benchmark_prophet_backend.py [--series 10]
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+from prophet_backend import InProcessBackend
+
+# cmdstanpy installs its own INFO handler unless the logger already has one
+logging.getLogger("cmdstanpy").addHandler(logging.NullHandler())
+logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+def traffic_model():
+    """Same configuration as traffic_volume_forecasting.train_prophet_model"""
+    return Prophet(
+        changepoint_prior_scale=0.05,
+        seasonality_prior_scale=10.0,
+        seasonality_mode='multiplicative',
+        yearly_seasonality=True,
+        weekly_seasonality=True,
+        daily_seasonality=False
+    )
+
+
+def covid_model():
+    """Same configuration as covid_alert_forecasting.train_covid_prophet_model"""
+    model = Prophet(
+        changepoint_prior_scale=0.1,
+        seasonality_prior_scale=5.0,
+        seasonality_mode='additive',
+        yearly_seasonality=True,
+        weekly_seasonality=False,
+        daily_seasonality=False
+    )
+    model.add_regressor('mobility', prior_scale=10.0)
+    model.add_regressor('case_rate', prior_scale=15.0)
+    return model
+
+
+def traffic_series(rng):
+    ds = pd.date_range('2021-01-01', '2025-10-31', freq='D')
+    t = np.arange(len(ds))
+    level = rng.uniform(100, 2000)
+    y = level * (1 + 0.0002 * t) * (1 + 0.25 * np.sin(2 * np.pi * t / 7)) \
+        * (1 + 0.15 * np.sin(2 * np.pi * t / 365.25))
+    return pd.DataFrame({'ds': ds, 'y': rng.poisson(y).astype(float)})
+
+
+def covid_series(rng):
+    ds = pd.date_range('2020-03-02', '2024-05-06', freq='W-MON')
+    t = np.arange(len(ds))
+    mobility = rng.uniform(1000, 5000) * (1 + 0.3 * np.sin(2 * np.pi * t / 52))
+    case_rate = np.abs(50 + 40 * np.sin(2 * np.pi * t / 26) + rng.normal(0, 5, len(t)))
+    y = 0.5 + 0.0002 * mobility + 0.01 * case_rate + rng.normal(0, 0.1, len(t))
+    return pd.DataFrame({'ds': ds, 'y': y, 'mobility': mobility, 'case_rate': case_rate})
+
+
+def fit_and_predict(make_model, df, inprocess):
+    model = make_model()
+    if inprocess:
+        model.stan_backend = InProcessBackend(model.stan_backend)
+    start = time.perf_counter()
+    model.fit(df)
+    elapsed = time.perf_counter() - start
+    return elapsed, model.predict(df.drop(columns='y'))['yhat'].to_numpy()
+
+
+def benchmark(name, make_model, make_series, n_series, rng):
+    timings = {False: [], True: []}
+    diffs = []
+    for _ in range(n_series):
+        df = make_series(rng)
+        results = {inprocess: fit_and_predict(make_model, df, inprocess) for inprocess in (False, True)}
+        for inprocess, (elapsed, _) in results.items():
+            timings[inprocess].append(elapsed)
+        yhat_stan, yhat_fast = results[False][1], results[True][1]
+        diffs.append(np.mean(np.abs(yhat_fast - yhat_stan)) / np.mean(np.abs(yhat_stan)) * 100)
+
+    stan, fast = np.mean(timings[False]), np.mean(timings[True])
+    print(f"{name:<8} cmdstanpy {stan * 1000:7.0f} ms/fit   in-process {fast * 1000:7.0f} ms/fit   "
+          f"speedup {stan / fast:4.1f}x   yhat diff {np.mean(diffs):.3f}% (max {np.max(diffs):.3f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--series", type=int, default=10, help="Series per configuration")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Warm up both paths so one-off import/model-load costs are not counted
+    fit_and_predict(traffic_model, traffic_series(rng), False)
+    fit_and_predict(traffic_model, traffic_series(rng), True)
+
+    benchmark("traffic", traffic_model, traffic_series, args.series, rng)
+    benchmark("covid", covid_model, covid_series, args.series, rng)
+
+
+if __name__ == "__main__":
+    main()
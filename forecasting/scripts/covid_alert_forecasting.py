@@ -14,12 +14,20 @@ Note: COVID data is available through May 2024, so this generates
 historical forecasts to demonstrate the capability for when data resumes.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from prophet import Prophet
 from google.cloud import bigquery
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from model_metrics import new_run, write_model_metrics
+from prophet_backend import use_inprocess_backend
+from forecast_drift import score_drift, print_drift_report, replace_zip_forecasts
+from model_tiers import (
+    TIER_PROPHET, TIER_EXP_SMOOTHING, TIER_SEASONAL_NAIVE,
+    build_panel, classify_zip_tiers, forecast_cheap_tier
+)
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -29,14 +37,35 @@ DATASET_ID = "gold_data"
 MODEL_VERSION = "v1.0.0"
 FORECAST_WEEKS = 12  # 3 months ahead
 TRAIN_TEST_SPLIT = 0.8
+TRAIN_END_DATE = date(2024, 5, 12)  # Full runs; --selective trains through the newest week
+
+# Model tier screening (see model_tiers.py): only high-signal ZIPs get Prophet
+TIER_MIN_HISTORY_WEEKS = 52   # Prophet needs at least 1 year of weekly data
+TIER_MIN_MEAN_RISK = 0.0      # Risk scores are not volumes; no volume screen
+TIER_MAX_ZERO_SHARE = 0.5     # Share of weeks with zero risk
+TIER_MIN_CV = 0.05            # Coefficient of variation (flat series)
+SEASON_LENGTH = 52            # Yearly seasonality for the cheap tiers
 
 # BigQuery client
 client = bigquery.Client(project=PROJECT_ID)
 
-def load_covid_and_mobility_data():
-    """Load COVID hotspots data with mobility indicators"""
+def selective_train_end():
+    """Last week start refits train through: every week available (today)"""
+    return date.today()
+
+def load_covid_and_mobility_data(zip_codes=None, train_end=None):
+    """Load COVID hotspots data with mobility indicators
+
+    zip_codes restricts the load to the ZIPs being retrained (--selective);
+    they are trained through selective_train_end(), so a refit sees the
+    actuals that triggered it and moves train_end_date. train_end overrides
+    the last week loaded (TRAIN_END_DATE for full runs).
+    """
     print("\n[1/6] Loading COVID + mobility data from BigQuery...")
 
+    zip_filter = "AND c.zip_code IN UNNEST(@zip_codes)" if zip_codes is not None else ""
+    if train_end is None:
+        train_end = selective_train_end() if zip_codes is not None else TRAIN_END_DATE
     query = f"""
     SELECT
       c.zip_code,
@@ -47,15 +76,25 @@ def load_covid_and_mobility_data():
       c.case_rate_weekly,
       SAFE_DIVIDE(c.cases_weekly * 100.0, c.tests_weekly) as positivity_rate,
       c.tests_weekly,
-      c.total_trips_from_zip + c.total_trips_to_zip as mobility_index,
+      COALESCE(m.total_trips_from_zip + m.total_trips_to_zip, 0) as mobility_index,
       c.population
     FROM `{PROJECT_ID}.{DATASET_ID}.gold_covid_hotspots` c
+    LEFT JOIN `{PROJECT_ID}.{DATASET_ID}.gold_mobility_weekly_by_zip` m
+      ON m.zip_code = c.zip_code AND m.week_start = c.week_start
     WHERE c.week_start >= '2020-03-01'
-      AND c.week_start <= '2024-05-12'
+      AND c.week_start <= @train_end
+      {zip_filter}
     ORDER BY c.zip_code, c.week_start
     """
 
-    df = client.query(query).to_dataframe()
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("train_end", "DATE", train_end),
+        ] + ([
+            bigquery.ArrayQueryParameter("zip_codes", "STRING", sorted(zip_codes)),
+        ] if zip_codes is not None else [])
+    )
+    df = client.query(query, job_config=job_config).to_dataframe()
     print(f"   ✅ Loaded {len(df):,} records")
     print(f"   ✅ Date range: {df['week_start'].min()} to {df['week_start'].max()}")
     print(f"   ✅ ZIP codes: {df['zip_code'].nunique()}")
@@ -78,7 +117,6 @@ def prepare_covid_prophet_data(df, zip_code):
     zip_df['case_rate_weekly'] = pd.to_numeric(zip_df['case_rate_weekly'], errors='coerce')
     zip_df['cases_weekly'] = pd.to_numeric(zip_df['cases_weekly'], errors='coerce')
     zip_df['positivity_rate'] = pd.to_numeric(zip_df['positivity_rate'], errors='coerce')
-    zip_df['risk_score'] = pd.to_numeric(zip_df['risk_score'], errors='coerce')
 
     # Add regressors (normalized with safe division)
     mobility_std = zip_df['mobility_index'].std()
@@ -119,6 +157,7 @@ def train_covid_prophet_model(df_prophet, zip_code):
     model.add_regressor('mobility', prior_scale=10.0)
     model.add_regressor('case_rate', prior_scale=15.0)
 
+    use_inprocess_backend(model)
     model.fit(train)
 
     # Evaluate on test set
@@ -172,13 +211,9 @@ def generate_alert_message(zip_code, risk_category, alert_level, predicted_cases
     else:
         return f"ZIP {zip_code} has {risk_category} COVID risk. Continue standard safety measures."
 
-def generate_forecasts(model, df_prophet, last_date, forecast_weeks):
-    """Generate future forecasts with regressors"""
-    # Get last known date as Timestamp
-    if isinstance(last_date, pd.Timestamp):
-        last_date_ts = last_date
-    else:
-        last_date_ts = pd.Timestamp(last_date)
+def future_week_starts(last_date, forecast_weeks):
+    """Return the forecast_weeks Mondays following last_date"""
+    last_date_ts = pd.Timestamp(last_date)
 
     # Create future Monday dates manually (weekly frequency)
     future_dates = []
@@ -193,6 +228,11 @@ def generate_forecasts(model, df_prophet, last_date, forecast_weeks):
         future_dates.append(current_date)
         current_date += pd.Timedelta(days=7)
 
+    return future_dates
+
+def generate_forecasts(model, df_prophet, last_date, forecast_weeks):
+    """Generate future forecasts with regressors"""
+    future_dates = future_week_starts(last_date, forecast_weeks)
     future = pd.DataFrame({'ds': future_dates})
 
     # Use last known values for regressors (in real scenario, would forecast these too)
@@ -207,6 +247,110 @@ def generate_forecasts(model, df_prophet, last_date, forecast_weeks):
 
     return forecast
 
+def build_covid_records(zip_code, df_prophet, forecast, metrics, training_weeks, model_tier):
+    """Turn a forecast (ds, yhat, yhat_lower, yhat_upper) into output records"""
+    is_prophet = model_tier == TIER_PROPHET
+    if is_prophet:
+        notes = f'{FORECAST_WEEKS}-week COVID risk forecast with mobility regressor'
+    else:
+        notes = f'{FORECAST_WEEKS}-week COVID risk forecast ({model_tier})'
+
+    # Calculate trend from last 4 weeks
+    recent_trend = df_prophet['y'].iloc[-4:].diff().mean()
+    recent_risk = df_prophet['y'].iloc[-4:].mean()
+
+    # Prepare forecast records
+    forecast_records = []
+    for _, row in forecast.iterrows():
+        risk_score = max(0, min(100, row['yhat']))  # Clamp to 0-100
+        risk_category = classify_risk(risk_score)
+        alert_level = generate_alert_level(risk_score, recent_trend)
+
+        # Estimate cases and positivity (simplified - in real scenario would forecast these separately)
+        # (flat zero-risk series, which the cheap tiers accept, scale to 0)
+        risk_ratio = risk_score / recent_risk if recent_risk > 0 else 0
+        predicted_cases = max(0, df_prophet['cases_weekly'].iloc[-4:].mean() * risk_ratio)
+        predicted_positivity = max(0, min(100, df_prophet['positivity_rate'].iloc[-4:].mean() * risk_ratio))
+
+        # Convert date properly
+        forecast_date = row['ds']
+        if isinstance(forecast_date, pd.Timestamp):
+            forecast_date = forecast_date.date()
+
+        forecast_records.append({
+            'zip_code': zip_code,
+            'forecast_date': forecast_date,
+            'predicted_risk_score': risk_score,
+            'predicted_risk_category': risk_category,
+            'predicted_case_rate': df_prophet['case_rate'].iloc[-1],  # Last known
+            'predicted_positivity_rate': predicted_positivity,
+            'risk_score_lower': max(0, row['yhat_lower']),
+            'risk_score_upper': min(100, row['yhat_upper']),
+            'predicted_mobility_index': df_prophet['mobility_index'].iloc[-1],
+            'predicted_cases_weekly': int(predicted_cases),
+            'predicted_tests_weekly': None,
+            'alert_level': alert_level,
+            'alert_message': generate_alert_message(zip_code, risk_category, alert_level, predicted_cases),
+            'model_trained_date': datetime.now().date(),
+            'training_weeks': training_weeks,
+            'model_version': MODEL_VERSION
+        })
+
+    # Prepare metrics record
+    # Note: df_prophet['ds'] contains datetime.date objects from BigQuery DATE type
+    min_date = df_prophet['ds'].min()
+    max_date = df_prophet['ds'].max()
+
+    # Convert to date if it's a Timestamp, otherwise use as-is
+    if isinstance(min_date, pd.Timestamp):
+        min_date = min_date.date()
+    if isinstance(max_date, pd.Timestamp):
+        max_date = max_date.date()
+
+    metrics_record = {
+        'model_name': f'covid_risk_forecast_zip_{zip_code}',
+        'model_version': MODEL_VERSION,
+        'trained_date': datetime.now().date(),
+        'train_start_date': min_date,
+        'train_end_date': max_date,
+        'training_records': training_weeks,
+        'mae': metrics['mae'],
+        'rmse': metrics['rmse'],
+        'mape': metrics['mape'],
+        'r_squared': metrics['r2'],
+        'changepoint_prior_scale': 0.1 if is_prophet else None,
+        'seasonality_prior_scale': 5.0 if is_prophet else None,
+        'seasonality_mode': 'additive' if is_prophet else None,
+        'zip_code': zip_code,
+        'neighborhood': None,
+        'model_tier': model_tier,
+        'notes': notes
+    }
+
+    return forecast_records, metrics_record
+
+def process_cheap_tier_covid(df, panel, tiers, tier):
+    """Forecast all ZIPs of a cheap tier in one vectorized pass"""
+    future_dates = future_week_starts(panel.index[-1], FORECAST_WEEKS)
+    forecast_df, metrics_df = forecast_cheap_tier(
+        panel, tier, SEASON_LENGTH, FORECAST_WEEKS, TRAIN_TEST_SPLIT,
+        clip_min=0, future_dates=future_dates
+    )
+
+    all_forecasts = []
+    all_metrics = []
+    for zip_code, zip_forecast in forecast_df.groupby('zip_code'):
+        df_prophet = prepare_covid_prophet_data(df, zip_code)
+        metrics = metrics_df.loc[zip_code]
+        forecast_records, metrics_record = build_covid_records(
+            zip_code, df_prophet, zip_forecast, metrics, len(df_prophet), tier
+        )
+        all_forecasts.extend(forecast_records)
+        all_metrics.append(metrics_record)
+        print(f"   ✅ {zip_code} [{tier}]: MAE={metrics['mae']:.1f}, MAPE={metrics['mape']:.1f}%, R²={metrics['r2']:.3f}")
+
+    return all_forecasts, all_metrics
+
 def process_zip_code_covid(df, zip_code):
     """Train model and generate COVID forecasts for a single ZIP code"""
     try:
@@ -224,73 +368,9 @@ def process_zip_code_covid(df, zip_code):
         last_date = df_prophet['ds'].max()
         forecast = generate_forecasts(model, df_prophet, last_date, FORECAST_WEEKS)
 
-        # Calculate trend from last 4 weeks
-        recent_trend = df_prophet['y'].iloc[-4:].diff().mean()
-
-        # Prepare forecast records
-        forecast_records = []
-        for _, row in forecast.iterrows():
-            risk_score = max(0, min(100, row['yhat']))  # Clamp to 0-100
-            risk_category = classify_risk(risk_score)
-            alert_level = generate_alert_level(risk_score, recent_trend)
-
-            # Estimate cases and positivity (simplified - in real scenario would forecast these separately)
-            predicted_cases = max(0, df_prophet['cases_weekly'].iloc[-4:].mean() * (risk_score / df_prophet['y'].iloc[-4:].mean()))
-            predicted_positivity = max(0, min(100, df_prophet['positivity_rate'].iloc[-4:].mean() * (risk_score / df_prophet['y'].iloc[-4:].mean())))
-
-            # Convert date properly
-            forecast_date = row['ds']
-            if isinstance(forecast_date, pd.Timestamp):
-                forecast_date = forecast_date.date()
-
-            forecast_records.append({
-                'zip_code': zip_code,
-                'forecast_date': forecast_date,
-                'predicted_risk_score': risk_score,
-                'predicted_risk_category': risk_category,
-                'predicted_case_rate': df_prophet['case_rate'].iloc[-1],  # Last known
-                'predicted_positivity_rate': predicted_positivity,
-                'risk_score_lower': max(0, row['yhat_lower']),
-                'risk_score_upper': min(100, row['yhat_upper']),
-                'predicted_mobility_index': df_prophet['mobility_index'].iloc[-1],
-                'predicted_cases_weekly': int(predicted_cases),
-                'predicted_tests_weekly': None,
-                'alert_level': alert_level,
-                'alert_message': generate_alert_message(zip_code, risk_category, alert_level, predicted_cases),
-                'model_trained_date': datetime.now().date(),
-                'training_weeks': training_weeks,
-                'model_version': MODEL_VERSION
-            })
-
-        # Prepare metrics record
-        # Note: df_prophet['ds'] contains datetime.date objects from BigQuery DATE type
-        min_date = df_prophet['ds'].min()
-        max_date = df_prophet['ds'].max()
-
-        # Convert to date if it's a Timestamp, otherwise use as-is
-        if isinstance(min_date, pd.Timestamp):
-            min_date = min_date.date()
-        if isinstance(max_date, pd.Timestamp):
-            max_date = max_date.date()
-
-        metrics_record = {
-            'model_name': f'covid_risk_forecast_zip_{zip_code}',
-            'model_version': MODEL_VERSION,
-            'trained_date': datetime.now().date(),
-            'train_start_date': min_date,
-            'train_end_date': max_date,
-            'training_records': training_weeks,
-            'mae': metrics['mae'],
-            'rmse': metrics['rmse'],
-            'mape': metrics['mape'],
-            'r_squared': metrics['r2'],
-            'changepoint_prior_scale': 0.1,
-            'seasonality_prior_scale': 5.0,
-            'seasonality_mode': 'additive',
-            'zip_code': zip_code,
-            'neighborhood': None,
-            'notes': f'{FORECAST_WEEKS}-week COVID risk forecast with mobility regressor'
-        }
+        forecast_records, metrics_record = build_covid_records(
+            zip_code, df_prophet, forecast, metrics, training_weeks, TIER_PROPHET
+        )
 
         print(f"   ✅ {zip_code}: MAE={metrics['mae']:.1f}, MAPE={metrics['mape']:.1f}%, R²={metrics['r2']:.3f}")
 
@@ -303,72 +383,128 @@ def process_zip_code_covid(df, zip_code):
         # print(traceback.format_exc())
         return None, None
 
-def write_to_bigquery(forecast_records, metrics_records):
-    """Write forecasts and metrics to BigQuery"""
+def screen_zip_tiers(df):
+    """Build the ZIP panel and assign every ZIP a model tier"""
+    panel = build_panel(df, 'zip_code', 'week_start', 'risk_score', freq='7D', fill='ffill')
+    tiers = classify_zip_tiers(
+        panel, TIER_MIN_HISTORY_WEEKS, TIER_MIN_MEAN_RISK,
+        TIER_MAX_ZERO_SHARE, TIER_MIN_CV, SEASON_LENGTH
+    )
+    print(f"\n   Model tiers: {tiers['tier'].value_counts().to_dict()}")
+    return panel, tiers
+
+def forecast_zips(df, panel, tiers, on_zip=None):
+    """Forecast every ZIP in tiers: Prophet for high-signal ZIPs, cheap tiers for the rest
+
+    tiers is updated in place when a Prophet fit falls back. on_zip, if
+    given, is called with (forecast_records, metrics_record) of each ZIP as
+    soon as it is forecast. Returns (forecast_records, metrics_records).
+    """
+    zip_codes = sorted(tiers.index[tiers['tier'] == TIER_PROPHET])
+
+    print(f"\n[2/6] Training Prophet models for {len(zip_codes)} high-signal ZIP codes...")
+    print("   This may take 3-5 minutes...")
+
+    # Train models for each ZIP code
+    all_forecasts = []
+    all_metrics = []
+
+    for i, zip_code in enumerate(zip_codes, 1):
+        print(f"   [{i}/{len(zip_codes)}] Processing {zip_code}...", end=" ")
+
+        forecast_records, metrics_record = process_zip_code_covid(df, zip_code)
+
+        if forecast_records:
+            all_forecasts.extend(forecast_records)
+            all_metrics.append(metrics_record)
+            if on_zip:
+                on_zip(forecast_records, metrics_record)
+        else:
+            # Fall back to the cheap tiers so every ZIP still gets a forecast
+            tiers.at[zip_code, 'tier'] = TIER_EXP_SMOOTHING
+            tiers.at[zip_code, 'reason'] = 'prophet-fallback'
+
+    # Fast vectorized models for the remaining ZIPs
+    for tier in (TIER_EXP_SMOOTHING, TIER_SEASONAL_NAIVE):
+        tier_zips = sorted(tiers.index[tiers['tier'] == tier])
+        if tier_zips:
+            print(f"\n   Forecasting {len(tier_zips)} ZIP codes with {tier}...")
+            forecast_records, metrics_records = process_cheap_tier_covid(df, panel[tier_zips], tiers, tier)
+            all_forecasts.extend(forecast_records)
+            all_metrics.extend(metrics_records)
+            if on_zip:
+                for metrics_record in metrics_records:
+                    on_zip([r for r in forecast_records if r['zip_code'] == metrics_record['zip_code']],
+                           metrics_record)
+
+    return all_forecasts, all_metrics
+
+def write_to_bigquery(forecast_records, metrics_records, run_id, run_timestamp, replace_zips=None):
+    """Write forecasts and metrics to BigQuery
+
+    With replace_zips (--selective), only those ZIPs' forecast rows are
+    replaced; every other ZIP keeps its published forecast.
+    """
     print("\n[5/6] Writing COVID forecasts to BigQuery...")
 
     # Write forecasts
     forecast_df = pd.DataFrame(forecast_records)
 
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-    )
+    if replace_zips is not None:
+        replace_zip_forecasts(
+            client, PROJECT_ID, DATASET_ID, 'gold_covid_risk_forecasts', forecast_df, replace_zips
+        )
+    else:
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
 
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_covid_risk_forecasts"
-    job = client.load_table_from_dataframe(forecast_df, table_id, job_config=job_config)
-    job.result()
+        table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_covid_risk_forecasts"
+        job = client.load_table_from_dataframe(forecast_df, table_id, job_config=job_config)
+        job.result()
 
     print(f"   ✅ Wrote {len(forecast_df):,} forecast records")
 
-    # Append metrics
+    # Append metrics (history is kept; latest-per-model table is refreshed)
     print("\n[6/6] Writing model metrics to BigQuery...")
-    metrics_df = pd.DataFrame(metrics_records)
-
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-    )
-
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_forecast_model_metrics"
-    job = client.load_table_from_dataframe(metrics_df, table_id, job_config=job_config)
-    job.result()
+    written = write_model_metrics(client, PROJECT_ID, DATASET_ID, metrics_records, run_id, run_timestamp)
 
-    print(f"   ✅ Appended {len(metrics_df):,} metrics records")
+    print(f"   ✅ Appended {written:,} metrics records (run {run_id})")
 
-def main():
+def main(selective=False):
     """Main COVID forecasting pipeline"""
     print("=" * 60)
     print("COVID-19 ALERT FORECASTING WITH PROPHET")
     print(f"Requirement 1: Forecast COVID alerts considering mobility")
     print("=" * 60)
 
-    # Load data
-    df = load_covid_and_mobility_data()
+    run_id, run_timestamp = new_run('covid')
 
-    # Get list of ZIP codes
-    zip_codes = sorted(df['zip_code'].unique())
-
-    print(f"\n[2/6] Training Prophet models for {len(zip_codes)} ZIP codes...")
-    print("   This may take 3-5 minutes...")
-
-    # Train models for each ZIP code
-    all_forecasts = []
-    all_metrics = []
+    # Selective mode: only retrain ZIPs that drifted or aged out
+    retrain_zips = None
+    if selective:
+        print("\n[0/6] Scoring published forecasts against new actuals...")
+        drift = score_drift(client, PROJECT_ID, DATASET_ID, 'covid')
+        print_drift_report(drift)
+        retrain_zips = sorted(drift.loc[drift['retrain'], 'zip_code'])
+        if not retrain_zips:
+            print("\n✅ No ZIP drifted - published forecasts kept, nothing to retrain")
+            return
 
-    for i, zip_code in enumerate(zip_codes, 1):
-        print(f"   [{i}/{len(zip_codes)}] Processing {zip_code}...", end=" ")
+    # Load data
+    df = load_covid_and_mobility_data(retrain_zips)
 
-        forecast_records, metrics_record = process_zip_code_covid(df, zip_code)
+    # Screen every ZIP series at once and pick a model tier
+    panel, tiers = screen_zip_tiers(df)
 
-        if forecast_records:
-            all_forecasts.extend(forecast_records)
-            all_metrics.append(metrics_record)
+    all_forecasts, all_metrics = forecast_zips(df, panel, tiers)
 
     print(f"\n[3/6] Successfully trained {len(all_metrics)} models")
     print(f"[4/6] Generated {len(all_forecasts):,} forecast records ({FORECAST_WEEKS} weeks × {len(all_metrics)} ZIPs)")
 
     # Write to BigQuery
     if all_forecasts and all_metrics:
-        write_to_bigquery(all_forecasts, all_metrics)
+        write_to_bigquery(all_forecasts, all_metrics, run_id, run_timestamp, replace_zips=retrain_zips)
 
         # Summary statistics
         print("\n" + "=" * 60)
@@ -398,4 +534,10 @@ def main():
         print("\n❌ No forecasts generated - check errors above")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="COVID alert forecasting with Prophet")
+    parser.add_argument(
+        "--selective", action="store_true",
+        help="Only retrain ZIPs whose forecasts drifted or whose model aged out (see forecast_drift.py)"
+    )
+    args = parser.parse_args()
+    main(selective=args.selective)
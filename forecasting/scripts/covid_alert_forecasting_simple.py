@@ -17,6 +17,8 @@ from datetime import datetime, timedelta
 from prophet import Prophet
 from google.cloud import bigquery
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from model_metrics import new_run, write_model_metrics
+from prophet_backend import use_inprocess_backend
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -36,21 +38,24 @@ def load_covid_data():
     """Load COVID hotspots data - simplified query"""
     print("\n[1/5] Loading COVID risk data from BigQuery...")
 
+    # Mobility comes from the incrementally maintained weekly table
     query = f"""
     SELECT
-      zip_code,
-      week_start,
-      adjusted_risk_score,
-      risk_category,
-      cases_weekly,
-      case_rate_weekly,
-      tests_weekly,
-      total_trips_from_zip + total_trips_to_zip as total_mobility
-    FROM `{PROJECT_ID}.{DATASET_ID}.gold_covid_hotspots`
-    WHERE week_start >= '2020-03-01'
-      AND week_start <= '2024-05-12'
-      AND adjusted_risk_score IS NOT NULL
-    ORDER BY zip_code, week_start
+      c.zip_code,
+      c.week_start,
+      c.adjusted_risk_score,
+      c.risk_category,
+      c.cases_weekly,
+      c.case_rate_weekly,
+      c.tests_weekly,
+      COALESCE(m.total_trips_from_zip + m.total_trips_to_zip, 0) as total_mobility
+    FROM `{PROJECT_ID}.{DATASET_ID}.gold_covid_hotspots` c
+    LEFT JOIN `{PROJECT_ID}.{DATASET_ID}.gold_mobility_weekly_by_zip` m
+      ON m.zip_code = c.zip_code AND m.week_start = c.week_start
+    WHERE c.week_start >= '2020-03-01'
+      AND c.week_start <= '2024-05-12'
+      AND c.adjusted_risk_score IS NOT NULL
+    ORDER BY c.zip_code, c.week_start
     """
 
     df = client.query(query).to_dataframe()
@@ -105,6 +110,7 @@ def train_prophet_model(df_prophet, zip_code):
 
     # Fit model
     print(f"      Training on {len(train)} weeks...", end=" ")
+    use_inprocess_backend(model)
     model.fit(train)
 
     # Evaluate on test set
@@ -284,7 +290,7 @@ def process_zip_code(df, zip_code):
         print(traceback.format_exc())
         return None, None
 
-def write_to_bigquery(forecast_records, metrics_records):
+def write_to_bigquery(forecast_records, metrics_records, run_id, run_timestamp):
     """Write forecasts and metrics to BigQuery"""
     print("\n[4/5] Writing COVID forecasts to BigQuery...")
 
@@ -301,19 +307,11 @@ def write_to_bigquery(forecast_records, metrics_records):
 
     print(f"   ✅ Wrote {len(forecast_df):,} forecast records to {table_id}")
 
-    # Append metrics
+    # Append metrics (history is kept; latest-per-model table is refreshed)
     print("\n[5/5] Writing model metrics to BigQuery...")
-    metrics_df = pd.DataFrame(metrics_records)
+    written = write_model_metrics(client, PROJECT_ID, DATASET_ID, metrics_records, run_id, run_timestamp)
 
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-    )
-
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_forecast_model_metrics"
-    job = client.load_table_from_dataframe(metrics_df, table_id, job_config=job_config)
-    job.result()
-
-    print(f"   ✅ Appended {len(metrics_df):,} metrics records")
+    print(f"   ✅ Appended {written:,} metrics records (run {run_id})")
 
 def main():
     """Main COVID forecasting pipeline - SIMPLIFIED"""
@@ -323,6 +321,8 @@ def main():
     print(f"Version: {MODEL_VERSION}")
     print("=" * 70)
 
+    run_id, run_timestamp = new_run('covid_simple')
+
     # Load data
     df = load_covid_data()
 
@@ -354,7 +354,7 @@ def main():
 
     # Write to BigQuery
     if all_forecasts and all_metrics:
-        write_to_bigquery(all_forecasts, all_metrics)
+        write_to_bigquery(all_forecasts, all_metrics, run_id, run_timestamp)
 
         # Summary statistics
         print("\n" + "=" * 70)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Drift-triggered selective retraining for the forecasting scripts
+
+Scores the last published forecasts against the actuals that arrived since
+each model was trained, for all ZIPs in one BigQuery pass, and decides which
+ZIPs need a refit:
+
+  error      Forecast MAPE on the new actuals is above DRIFT_MAX_MAPE
+  input      Mean of the new actuals moved more than DRIFT_MAX_Z baseline
+             standard deviations away from the pre-training baseline
+  age        Latest model is older than MAX_MODEL_AGE_DAYS
+  new        ZIP has actuals but no model yet
+
+All other ZIPs keep their published forecast rows unchanged; the forecast
+horizon is much longer than MAX_MODEL_AGE_DAYS, so those rows still cover the
+coming days when the age trigger fires. A refit trains on the actuals up to
+the newest available period, which moves train_end_date past the actuals
+that flagged it. The forecasting scripts use this in --selective mode.
+
+Usage:
+    python3 forecast_drift.py traffic
+    python3 forecast_drift.py covid
+"""
+
+import sys
+import uuid
+from datetime import date
+
+import pandas as pd
+from google.cloud import bigquery
+
+from model_metrics import LATEST_METRICS_TABLE
+
+# Configuration
+PROJECT_ID = "chicago-bi-app-msds-432-476520"
+DATASET_ID = "gold_data"
+
+# Retraining triggers
+DRIFT_MAX_MAPE = 25.0        # % error on actuals since training
+DRIFT_MAX_Z = 3.0            # Shift of recent mean vs baseline, in baseline std
+DRIFT_MIN_SCORED = 3         # Minimum scored periods before error/input triggers
+MAX_MODEL_AGE_DAYS = 7       # Refit at least weekly
+BASELINE_DAYS = 56           # Pre-training window for the input baseline
+
+# Forecast table vs actuals source, per forecasting script
+DRIFT_SOURCES = {
+    'traffic': {
+        'forecast_table': 'gold_traffic_forecasts_by_zip',
+        'forecast_value': 'yhat',
+        'forecast_period': 'f.forecast_date',
+        'model_pattern': r'^traffic_forecast_zip_[0-9]+$',
+        'actuals_sql': """
+            SELECT pickup_zip AS zip_code, trip_date AS ds, SUM(trip_count) AS y
+            FROM `{project_id}.{dataset_id}.gold_taxi_daily_by_zip`
+            WHERE pickup_zip IS NOT NULL
+              AND trip_date >= @actuals_since
+            GROUP BY pickup_zip, trip_date
+        """,
+    },
+    'covid': {
+        'forecast_table': 'gold_covid_risk_forecasts',
+        'forecast_value': 'predicted_risk_score',
+        # Forecasts are dated on Mondays, hotspots on week_start (Sunday)
+        'forecast_period': 'DATE_TRUNC(f.forecast_date, WEEK)',
+        'model_pattern': r'^covid_risk_forecast_zip_[0-9]+$',
+        'actuals_sql': """
+            SELECT zip_code, week_start AS ds, AVG(adjusted_risk_score) AS y
+            FROM `{project_id}.{dataset_id}.gold_covid_hotspots`
+            WHERE zip_code IS NOT NULL
+              AND week_start >= @actuals_since
+            GROUP BY zip_code, week_start
+        """,
+    },
+}
+
+
+def score_drift(client, project_id, dataset_id, source, as_of=None):
+    """Score every ZIP of a forecasting source in one query
+
+    Returns a DataFrame with one row per ZIP (models and/or actuals) and the
+    columns n_scored, mape, bias, recent_mean, baseline_mean, baseline_std,
+    drift_z, model_age_days, retrain and reason.
+    """
+    config = DRIFT_SOURCES[source]
+    as_of = as_of or date.today()
+
+    actuals_sql = config['actuals_sql'].format(project_id=project_id, dataset_id=dataset_id)
+    query = f"""
+    WITH models AS (
+      SELECT zip_code, trained_date, train_end_date
+      FROM `{project_id}.{dataset_id}.{LATEST_METRICS_TABLE}`
+      WHERE REGEXP_CONTAINS(model_name, @model_pattern)
+    ),
+    actuals AS ({actuals_sql}),
+    scored AS (
+      SELECT
+        f.zip_code,
+        COUNT(*) AS n_scored,
+        AVG(SAFE_DIVIDE(ABS(a.y - f.{config['forecast_value']}), a.y)) * 100 AS mape,
+        AVG(f.{config['forecast_value']} - a.y) AS bias,
+        AVG(a.y) AS recent_mean
+      FROM `{project_id}.{dataset_id}.{config['forecast_table']}` f
+      JOIN models m ON f.zip_code = m.zip_code
+      JOIN actuals a ON a.zip_code = f.zip_code AND a.ds = {config['forecast_period']}
+      WHERE a.ds > m.train_end_date
+      GROUP BY f.zip_code
+    ),
+    baseline AS (
+      SELECT a.zip_code, AVG(a.y) AS baseline_mean, STDDEV(a.y) AS baseline_std
+      FROM actuals a
+      JOIN models m ON a.zip_code = m.zip_code
+      WHERE a.ds BETWEEN DATE_SUB(m.train_end_date, INTERVAL @baseline_days DAY) AND m.train_end_date
+      GROUP BY a.zip_code
+    ),
+    active AS (
+      SELECT DISTINCT zip_code FROM actuals
+    )
+    SELECT
+      COALESCE(m.zip_code, z.zip_code) AS zip_code,
+      m.trained_date,
+      m.train_end_date,
+      DATE_DIFF(@as_of, m.trained_date, DAY) AS model_age_days,
+      COALESCE(s.n_scored, 0) AS n_scored,
+      s.mape,
+      s.bias,
+      s.recent_mean,
+      b.baseline_mean,
+      b.baseline_std,
+      SAFE_DIVIDE(ABS(s.recent_mean - b.baseline_mean), b.baseline_std) AS drift_z
+    FROM models m
+    FULL OUTER JOIN active z ON m.zip_code = z.zip_code
+    LEFT JOIN scored s ON s.zip_code = COALESCE(m.zip_code, z.zip_code)
+    LEFT JOIN baseline b ON b.zip_code = COALESCE(m.zip_code, z.zip_code)
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("model_pattern", "STRING", config['model_pattern']),
+            bigquery.ScalarQueryParameter("baseline_days", "INT64", BASELINE_DAYS),
+            bigquery.ScalarQueryParameter("as_of", "DATE", as_of),
+            # Actuals are only needed from the oldest baseline window onwards
+            bigquery.ScalarQueryParameter("actuals_since", "DATE", _actuals_since(client, project_id, dataset_id, config)),
+        ]
+    )
+    drift = client.query(query, job_config=job_config).to_dataframe()
+    return flag_retraining(drift)
+
+
+def _actuals_since(client, project_id, dataset_id, config):
+    """Earliest date the drift query needs actuals for (constant, so it prunes)"""
+    query = f"""
+    SELECT DATE_SUB(MIN(train_end_date), INTERVAL @baseline_days DAY) AS since
+    FROM `{project_id}.{dataset_id}.{LATEST_METRICS_TABLE}`
+    WHERE REGEXP_CONTAINS(model_name, @model_pattern)
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("model_pattern", "STRING", config['model_pattern']),
+            bigquery.ScalarQueryParameter("baseline_days", "INT64", BASELINE_DAYS),
+        ]
+    )
+    rows = list(client.query(query, job_config=job_config).result())
+    return rows[0]['since'] if rows and rows[0]['since'] else date(2020, 1, 1)
+
+
+def flag_retraining(drift):
+    """Apply the retraining triggers to the scored ZIPs (vectorized)"""
+    scored = drift['n_scored'] >= DRIFT_MIN_SCORED
+    triggers = {
+        'new': drift['trained_date'].isna(),
+        'age': drift['model_age_days'] > MAX_MODEL_AGE_DAYS,
+        'error': scored & (drift['mape'].astype(float) > DRIFT_MAX_MAPE),
+        'input': scored & (drift['drift_z'].astype(float) > DRIFT_MAX_Z),
+    }
+
+    reasons = pd.Series('', index=drift.index)
+    for label, flag in triggers.items():
+        flag = flag.fillna(False).astype(bool)
+        reasons = reasons.where(~flag, reasons + (reasons != '').map({True: ',', False: ''}) + label)
+
+    drift['retrain'] = reasons != ''
+    drift['reason'] = reasons
+    return drift
+
+
+def replace_zip_forecasts(client, project_id, dataset_id, table_name, forecast_df, zip_codes):
+    """Atomically replace the forecast rows of zip_codes, keep all other ZIPs
+
+    New rows are loaded into a staging table, then a multi-statement
+    transaction deletes the old rows of the retrained ZIPs and inserts the
+    new ones.
+    """
+    table_id = f"{project_id}.{dataset_id}.{table_name}"
+    staging_id = f"{project_id}.{dataset_id}._staging_{table_name}_{uuid.uuid4().hex[:8]}"
+
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+    )
+    client.load_table_from_dataframe(forecast_df, staging_id, job_config=job_config).result()
+
+    columns = ", ".join(forecast_df.columns)
+    query = f"""
+    BEGIN TRANSACTION;
+
+    DELETE FROM `{table_id}`
+    WHERE zip_code IN UNNEST(@zip_codes);
+
+    INSERT INTO `{table_id}` ({columns})
+    SELECT {columns} FROM `{staging_id}`;
+
+    COMMIT TRANSACTION;
+    """
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("zip_codes", "STRING", sorted(zip_codes)),
+        ]
+    )
+    try:
+        client.query(query, job_config=job_config).result()
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def print_drift_report(drift):
+    """Print a per-ZIP drift summary"""
+    retrain = drift[drift['retrain']]
+    print(f"   ✅ Scored {len(drift)} ZIP codes, {len(retrain)} need retraining")
+    for reason, count in retrain['reason'].value_counts().items():
+        print(f"      {reason}: {count}")
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else 'traffic'
+    if source not in DRIFT_SOURCES:
+        print(f"Unknown source '{source}' (expected one of: {', '.join(DRIFT_SOURCES)})")
+        return 1
+
+    client = bigquery.Client(project=PROJECT_ID)
+    print(f"Scoring {source} forecasts against new actuals...")
+    drift = score_drift(client, PROJECT_ID, DATASET_ID, source)
+    print_drift_report(drift)
+
+    columns = ['zip_code', 'model_age_days', 'n_scored', 'mape', 'drift_z', 'reason']
+    print(drift[drift['retrain']][columns].sort_values('zip_code').to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
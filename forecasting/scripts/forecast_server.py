@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Persistent forecasting worker for ad-hoc re-forecasts
+
+Keeps Prophet, cmdstanpy, the BigQuery clients and each source's training
+panel loaded in one long-running process, and serves forecast requests for a
+ZIP set over a local Unix socket. A re-forecast of a handful of ZIPs then
+skips interpreter start-up, imports, auth and the full data load, and only
+pays for the fits themselves.
+
+Protocol: one JSON object per line in each direction. Requests:
+
+  {"op": "forecast", "source": "traffic", "zip_codes": ["60601"], "write": false}
+  {"op": "reload", "source": "covid"}
+  {"op": "status"}
+  {"op": "stop"}
+
+A forecast streams one line per ZIP (tier, metrics, forecast rows) as soon
+as that ZIP is fit, then a final {"status": "done"} line. With
+"write": true the ZIPs' forecast rows are replaced in BigQuery and their
+metrics appended, as in --selective runs. Like those, the cached panel is
+trained through the newest actuals (the source's selective_train_end()); it
+is reloaded when that date moves.
+
+Usage:
+    python3 forecast_server.py serve [--preload traffic covid]
+    python3 forecast_server.py forecast traffic 60601 60614 [--write]
+    python3 forecast_server.py reload traffic
+    python3 forecast_server.py status
+    python3 forecast_server.py stop
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import numpy as np
+
+import traffic_volume_forecasting
+import covid_alert_forecasting
+from model_metrics import new_run
+
+SOCKET_PATH = os.environ.get("FORECAST_SOCKET", "/tmp/chicago_forecast.sock")
+CACHE_TTL_SECONDS = 6 * 3600  # Reload training data after 6 hours
+
+SOURCES = {
+    'traffic': {
+        'module': traffic_volume_forecasting,
+        'load': traffic_volume_forecasting.load_training_data,
+        'run_prefix': 'traffic_adhoc',
+    },
+    'covid': {
+        'module': covid_alert_forecasting,
+        'load': covid_alert_forecasting.load_covid_and_mobility_data,
+        'run_prefix': 'covid_adhoc',
+    },
+}
+
+
+class TrainingCache:
+    """Training data, ZIP panel and tiers per source, loaded on first use"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, source):
+        entry = self.entries.get(source)
+        if (entry is None or time.time() - entry['loaded_at'] > CACHE_TTL_SECONDS
+                or entry['train_end'] != SOURCES[source]['module'].selective_train_end()):
+            entry = self.reload(source)
+        return entry
+
+    def reload(self, source):
+        config = SOURCES[source]
+        train_end = config['module'].selective_train_end()
+        df = config['load'](train_end=train_end)
+        panel, tiers = config['module'].screen_zip_tiers(df)
+        entry = {'df': df, 'panel': panel, 'tiers': tiers, 'train_end': train_end, 'loaded_at': time.time()}
+        self.entries[source] = entry
+        return entry
+
+    def status(self):
+        return {
+            source: {
+                'rows': len(entry['df']),
+                'zip_codes': len(entry['tiers']),
+                'train_end': entry['train_end'].isoformat(),
+                'age_seconds': round(time.time() - entry['loaded_at']),
+            }
+            for source, entry in self.entries.items()
+        }
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _send(wfile, message):
+    wfile.write((json.dumps(message, default=_json_default) + "\n").encode())
+    wfile.flush()
+
+
+def forecast_request(cache, source, zip_codes, write, wfile):
+    """Forecast zip_codes from the cached panel and stream results to wfile"""
+    started = time.time()
+    entry = cache.get(source)
+    config = SOURCES[source]
+
+    known = [z for z in dict.fromkeys(zip_codes) if z in entry['tiers'].index]
+    for zip_code in zip_codes:
+        if zip_code not in entry['tiers'].index:
+            _send(wfile, {'zip_code': zip_code, 'error': 'no training data'})
+    if not known:
+        _send(wfile, {'status': 'done', 'zip_codes': 0, 'seconds': round(time.time() - started, 2)})
+        return
+
+    def send_zip(zip_forecasts, metrics):
+        # Sent as soon as the ZIP is fit, while the others are still running
+        _send(wfile, {
+            'zip_code': metrics['zip_code'],
+            'model_tier': metrics['model_tier'],
+            'metrics': {key: metrics[key] for key in ('mae', 'rmse', 'mape', 'r_squared')},
+            'forecasts': zip_forecasts,
+        })
+
+    df = entry['df'][entry['df']['zip_code'].isin(known)]
+    tiers = entry['tiers'].loc[known].copy()
+    forecast_records, metrics_records = config['module'].forecast_zips(
+        df, entry['panel'][known], tiers, on_zip=send_zip
+    )
+
+    if write and forecast_records:
+        run_id, run_timestamp = new_run(config['run_prefix'])
+        config['module'].write_to_bigquery(
+            forecast_records, metrics_records, run_id, run_timestamp, replace_zips=known
+        )
+
+    _send(wfile, {
+        'status': 'done',
+        'zip_codes': len(metrics_records),
+        'written': bool(write and forecast_records),
+        'seconds': round(time.time() - started, 2),
+    })
+
+
+class ForecastHandler(socketserver.StreamRequestHandler):
+    """Serve JSON-line requests until the client closes the connection"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                source = request.get('source')
+                if op in ('forecast', 'reload') and source not in SOURCES:
+                    raise ValueError(f"Unknown source '{source}' (expected one of: {', '.join(SOURCES)})")
+
+                if op == 'forecast':
+                    forecast_request(
+                        self.server.cache, source, [str(z) for z in request.get('zip_codes', [])],
+                        request.get('write', False), self.wfile
+                    )
+                elif op == 'reload':
+                    self.server.cache.reload(source)
+                    _send(self.wfile, {'status': 'done', 'cache': self.server.cache.status()})
+                elif op == 'status':
+                    _send(self.wfile, {'status': 'done', 'pid': os.getpid(), 'cache': self.server.cache.status()})
+                elif op == 'stop':
+                    _send(self.wfile, {'status': 'done'})
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+                else:
+                    raise ValueError(f"Unknown op '{op}'")
+            except Exception as e:
+                _send(self.wfile, {'status': 'error', 'error': str(e)})
+
+
+class ForecastServer(socketserver.UnixStreamServer):
+    """Single-threaded: requests are served one at a time, so fits never
+    compete for CPU and the cache needs no locking"""
+
+    def __init__(self, socket_path, cache):
+        self.cache = cache
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ForecastHandler)
+
+
+def serve(socket_path, preload):
+    cache = TrainingCache()
+    for source in preload:
+        print(f"Preloading {source} training data...")
+        cache.reload(source)
+
+    server = ForecastServer(socket_path, cache)
+    print(f"✅ Forecast server listening on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    print("Forecast server stopped")
+
+
+def request(socket_path, message):
+    """Send one request and yield the streamed response lines"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(message) + "\n").encode())
+        with sock.makefile('rb') as reader:
+            for line in reader:
+                response = json.loads(line)
+                yield response
+                if 'status' in response:
+                    return
+
+
+def print_response(response):
+    if 'zip_code' in response:
+        if 'error' in response:
+            print(f"   ❌ {response['zip_code']}: {response['error']}")
+        else:
+            m = response['metrics']
+            print(f"   ✅ {response['zip_code']} [{response['model_tier']}] "
+                  f"MAPE={m['mape']:.1f}% R²={m['r_squared']:.3f} ({len(response['forecasts'])} periods)")
+    elif response['status'] == 'error':
+        print(f"❌ {response['error']}")
+    else:
+        print(json.dumps({k: v for k, v in response.items() if k != 'status'}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent forecasting worker")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_cmd = commands.add_parser("serve", help="Run the server in the foreground")
+    serve_cmd.add_argument("--preload", nargs="*", choices=list(SOURCES), default=[])
+
+    forecast_cmd = commands.add_parser("forecast", help="Re-forecast a set of ZIP codes")
+    forecast_cmd.add_argument("source", choices=list(SOURCES))
+    forecast_cmd.add_argument("zip_codes", nargs="+")
+    forecast_cmd.add_argument("--write", action="store_true", help="Replace the ZIPs' rows in BigQuery")
+
+    reload_cmd = commands.add_parser("reload", help="Reload a source's training data")
+    reload_cmd.add_argument("source", choices=list(SOURCES))
+
+    commands.add_parser("status", help="Show cached sources")
+    commands.add_parser("stop", help="Stop the server")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.preload)
+        return 0
+
+    message = {'op': args.command}
+    if args.command in ('forecast', 'reload'):
+        message['source'] = args.source
+    if args.command == 'forecast':
+        message['zip_codes'] = args.zip_codes
+        message['write'] = args.write
+
+    try:
+        failed = False
+        for response in request(args.socket, message):
+            print_response(response)
+            failed = failed or response.get('status') == 'error'
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"❌ No forecast server on {args.socket} - start one with: python3 forecast_server.py serve")
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Run-scoped model metrics writes for the Prophet forecasting scripts
+
+Every forecasting script appends its metrics to gold_forecast_model_metrics
+tagged with a run_id and run_timestamp, so traffic and COVID runs no longer
+truncate each other's history. After each append the rows of that run are
+merged into gold_forecast_model_metrics_latest (one row per model_name), which
+dashboards and monitoring queries read instead of scanning every
+trained_date partition of the history table.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+from google.cloud import bigquery
+
+METRICS_TABLE = "gold_forecast_model_metrics"
+LATEST_METRICS_TABLE = "gold_forecast_model_metrics_latest"
+
+
+def new_run(run_prefix):
+    """Return (run_id, run_timestamp) identifying one forecasting run"""
+    run_timestamp = datetime.now(timezone.utc)
+    run_id = f"{run_prefix}_{run_timestamp:%Y%m%dT%H%M%SZ}_{uuid.uuid4().hex[:8]}"
+    return run_id, run_timestamp
+
+
+def write_model_metrics(client, project_id, dataset_id, metrics_records, run_id, run_timestamp):
+    """Append metrics for one run and refresh the latest-per-model table
+
+    Only columns that exist in the metrics table are loaded, so script-specific
+    keys in the metrics records never fail the load job.
+    """
+    table_id = f"{project_id}.{dataset_id}.{METRICS_TABLE}"
+    table_columns = [field.name for field in client.get_table(table_id).schema]
+
+    metrics_df = pd.DataFrame(metrics_records)
+    metrics_df['run_id'] = run_id
+    metrics_df['run_timestamp'] = run_timestamp
+    metrics_df = metrics_df[[col for col in metrics_df.columns if col in table_columns]]
+
+    job_config = bigquery.LoadJobConfig(
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+    )
+    job = client.load_table_from_dataframe(metrics_df, table_id, job_config=job_config)
+    job.result()
+
+    trained_dates = sorted(set(metrics_df['trained_date']))
+    refresh_latest_metrics(client, project_id, dataset_id, run_id, trained_dates, list(metrics_df.columns))
+
+    return len(metrics_df)
+
+
+def refresh_latest_metrics(client, project_id, dataset_id, run_id, trained_dates, columns):
+    """Replace the latest-table rows of every model written by run_id
+
+    One MERGE keyed on model_name, so the swap is atomic: a failure leaves
+    the previous rows, and concurrent runs (traffic and COVID) never see
+    their models missing. The source filter on trained_date prunes the
+    history table to the partitions this run wrote (normally exactly one).
+    """
+    column_list = ", ".join(columns)
+    update_list = ",\n        ".join(f"{column} = source.{column}" for column in columns)
+    values_list = ", ".join(f"source.{column}" for column in columns)
+
+    query = f"""
+    MERGE `{project_id}.{dataset_id}.{LATEST_METRICS_TABLE}` AS target
+    USING (
+      SELECT {column_list}
+      FROM `{project_id}.{dataset_id}.{METRICS_TABLE}`
+      WHERE trained_date IN UNNEST(@trained_dates)
+        AND run_id = @run_id
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY run_timestamp DESC) = 1
+    ) AS source
+    ON target.model_name = source.model_name
+
+    WHEN MATCHED THEN
+      UPDATE SET
+        {update_list}
+
+    WHEN NOT MATCHED THEN
+      INSERT ({column_list})
+      VALUES ({values_list})
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter("trained_dates", "DATE", trained_dates),
+            bigquery.ScalarQueryParameter("run_id", "STRING", run_id),
+        ]
+    )
+    client.query(query, job_config=job_config).result()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Tiered model selection for the per-ZIP forecasting scripts
+
+Low-volume, sparse, flat or short ZIP series do not justify two full Prophet
+fits. This module screens the whole panel at once (one column per ZIP),
+assigns every ZIP a tier, and forecasts the cheap tiers with vectorized
+models that fit all of their ZIPs in a single pass:
+
+  prophet         High-signal series - the scripts' existing Prophet path
+  exp_smoothing   Additive Holt-Winters (level + seasonal, fixed smoothing)
+  seasonal_naive  Repeat the last observed season (or last value)
+
+Every ZIP with at least one observation gets a forecast.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIER_PROPHET = 'prophet'
+TIER_EXP_SMOOTHING = 'exp_smoothing'
+TIER_SEASONAL_NAIVE = 'seasonal_naive'
+
+# Prophet's default interval_width is 0.8, so the cheap tiers use the same
+# two-sided 80% normal quantile for yhat_lower / yhat_upper.
+INTERVAL_Z = 1.2816
+
+ES_ALPHA = 0.3  # Level smoothing
+ES_GAMMA = 0.2  # Seasonal smoothing
+
+
+def build_panel(df, zip_col, date_col, value_col, freq, fill='zero'):
+    """Pivot long (zip, date, value) rows into a dense date x ZIP panel
+
+    Each column is NaN before the ZIP's first observation. After it, missing
+    periods are filled with 0 (fill='zero', e.g. days without trips) or the
+    previous value (fill='ffill', e.g. weekly risk scores).
+    """
+    panel = df.pivot_table(index=date_col, columns=zip_col, values=value_col, aggfunc='sum')
+    panel.index = pd.to_datetime(panel.index)
+    panel = panel.reindex(pd.date_range(panel.index.min(), panel.index.max(), freq=freq))
+    panel = panel.astype(float)
+
+    started = panel.notna().cummax()
+    if fill == 'ffill':
+        panel = panel.ffill()
+    else:
+        panel = panel.fillna(0.0)
+
+    return panel.where(started)
+
+
+def classify_zip_tiers(panel, min_history, min_mean, max_zero_share, min_cv, season_length):
+    """Classify every ZIP column of the panel into a model tier
+
+    Returns a DataFrame indexed by ZIP with the screening statistics, the
+    chosen tier and a short reason.
+    """
+    history = panel.notna().sum()
+    mean = panel.mean()
+    std = panel.std().fillna(0.0)
+    zero_share = panel.eq(0).sum() / history.where(history > 0)
+    cv = std / mean.where(mean > 0)
+
+    short = history < min_history
+    low_volume = mean < min_mean
+    sparse = zero_share > max_zero_share
+    flat = cv.fillna(0.0) < min_cv
+
+    tiers = pd.DataFrame({
+        'history': history,
+        'mean': mean,
+        'zero_share': zero_share,
+        'cv': cv,
+    })
+
+    tiers['tier'] = TIER_SEASONAL_NAIVE
+    es_mask = (history >= 2 * season_length) & ~sparse
+    tiers.loc[es_mask, 'tier'] = TIER_EXP_SMOOTHING
+    prophet_mask = ~(short | low_volume | sparse | flat)
+    tiers.loc[prophet_mask, 'tier'] = TIER_PROPHET
+
+    reasons = pd.Series('', index=tiers.index)
+    for flag, label in [(short, 'short'), (low_volume, 'low-volume'), (sparse, 'sparse'), (flat, 'flat')]:
+        reasons = reasons.where(~flag, reasons + np.where(reasons == '', '', ',') + label)
+    tiers['reason'] = reasons.replace('', 'high-signal')
+
+    return tiers
+
+
+def _seasonal_naive(Y, season_length):
+    """Vectorized seasonal naive over a (T, N) array
+
+    Returns (preds, forecast): preds[t] is the prediction made before seeing
+    Y[t] (the last value observed in the same season position, else the last
+    value) and forecast(horizon) extends the final state past the panel.
+    NaN entries are treated as unobserved, so predictions across a masked
+    stretch are multi-step forecasts from its start.
+    """
+    n_periods, n_series = Y.shape
+    last_season = np.full((season_length, n_series), np.nan)
+    last_value = np.full(n_series, np.nan)
+    preds = np.full((n_periods, n_series), np.nan)
+
+    for t in range(n_periods):
+        idx = t % season_length
+        preds[t] = np.where(np.isnan(last_season[idx]), last_value, last_season[idx])
+
+        y = Y[t]
+        observed = ~np.isnan(y)
+        last_season[idx] = np.where(observed, y, last_season[idx])
+        last_value = np.where(observed, y, last_value)
+
+    def forecast(horizon):
+        steps = (n_periods + np.arange(horizon)) % season_length
+        seasonal = last_season[steps]
+        return np.where(np.isnan(seasonal), last_value, seasonal)
+
+    return preds, forecast
+
+
+def _exp_smoothing(Y, season_length, alpha=ES_ALPHA, gamma=ES_GAMMA):
+    """Vectorized additive Holt-Winters (no trend) over a (T, N) array
+
+    Same contract as _seasonal_naive. The level of each column starts at its
+    first observation, so ZIPs with different history lengths are smoothed
+    together in one loop over time.
+    """
+    n_periods, n_series = Y.shape
+    level = np.full(n_series, np.nan)
+    season = np.zeros((season_length, n_series))
+    preds = np.full((n_periods, n_series), np.nan)
+
+    for t in range(n_periods):
+        idx = t % season_length
+        preds[t] = level + season[idx]
+
+        y = Y[t]
+        observed = ~np.isnan(y)
+        start = observed & np.isnan(level)
+        level[start] = y[start]
+
+        update = observed & ~start
+        new_level = alpha * (y - season[idx]) + (1 - alpha) * level
+        level = np.where(update, new_level, level)
+        new_season = gamma * (y - level) + (1 - gamma) * season[idx]
+        season[idx] = np.where(update, new_season, season[idx])
+
+    def forecast(horizon):
+        steps = (n_periods + np.arange(horizon)) % season_length
+        return level + season[steps]
+
+    return preds, forecast
+
+
+MODEL_FUNCTIONS = {
+    TIER_SEASONAL_NAIVE: _seasonal_naive,
+    TIER_EXP_SMOOTHING: _exp_smoothing,
+}
+
+
+def _holdout_metrics(Y, model_fn, season_length, train_test_split):
+    """Score each column on the last part of its own history
+
+    Each ZIP is split at train_test_split of its own history; the test
+    periods are masked and the model's multi-step predictions across them
+    are compared with the actuals, for all ZIPs in one pass.
+    """
+    history = (~np.isnan(Y)).sum(axis=0)
+    first = len(Y) - history
+    split_idx = first + (history * train_test_split).astype(int)
+    test_mask = np.arange(len(Y))[:, None] >= split_idx[None, :]
+
+    preds, _ = model_fn(np.where(test_mask, np.nan, Y), season_length)
+
+    valid = test_mask & ~np.isnan(Y) & ~np.isnan(preds)
+    test = np.where(valid, Y, 0.0)
+    err = np.where(valid, Y - preds, 0.0)
+    n = np.maximum(valid.sum(axis=0), 1)
+
+    mae = np.abs(err).sum(axis=0) / n
+    rmse = np.sqrt((err ** 2).sum(axis=0) / n)
+
+    nonzero = valid & (test != 0)
+    ape = np.abs(err) / np.where(nonzero, np.abs(test), 1.0)
+    mape = np.where(nonzero, ape, 0.0).sum(axis=0) / np.maximum(nonzero.sum(axis=0), 1) * 100
+
+    test_mean = test.sum(axis=0) / n
+    ss_tot = np.where(valid, (test - test_mean) ** 2, 0.0).sum(axis=0)
+    r2 = np.where(ss_tot > 0, 1 - (err ** 2).sum(axis=0) / np.where(ss_tot > 0, ss_tot, 1.0), 0.0)
+
+    return pd.DataFrame({'mae': mae, 'rmse': rmse, 'mape': mape, 'r2': r2})
+
+
+def forecast_cheap_tier(panel, tier, season_length, horizon, train_test_split,
+                        clip_min=None, clip_max=None, future_dates=None):
+    """Forecast every column of the panel with the tier's vectorized model
+
+    Returns (forecast_df, metrics_df): forecast_df has one row per ZIP and
+    future period (zip_code, ds, yhat, yhat_lower, yhat_upper); metrics_df is
+    indexed by ZIP with holdout mae / rmse / mape / r2. future_dates defaults
+    to the next `horizon` periods of the panel's own frequency.
+    """
+    model_fn = MODEL_FUNCTIONS[tier]
+    Y = panel.to_numpy(dtype=float)
+
+    preds, forecast = model_fn(Y, season_length)
+    yhat = forecast(horizon)
+
+    # In-sample one-step RMSE sets the interval width
+    residuals = Y - preds
+    observed = ~np.isnan(residuals)
+    sigma = np.sqrt(np.where(observed, residuals ** 2, 0.0).sum(axis=0) / np.maximum(observed.sum(axis=0), 1))
+
+    lower = yhat - INTERVAL_Z * sigma
+    upper = yhat + INTERVAL_Z * sigma
+    if clip_min is not None or clip_max is not None:
+        yhat, lower, upper = (np.clip(a, clip_min, clip_max) for a in (yhat, lower, upper))
+
+    if future_dates is None:
+        freq = panel.index.freq
+        future_dates = pd.date_range(panel.index[-1] + freq, periods=horizon, freq=freq)
+
+    forecast_df = pd.DataFrame({
+        'zip_code': np.repeat(panel.columns.to_numpy(), horizon),
+        'ds': np.tile(future_dates, len(panel.columns)),
+        'yhat': yhat.T.ravel(),
+        'yhat_lower': lower.T.ravel(),
+        'yhat_upper': upper.T.ravel(),
+    })
+
+    metrics_df = _holdout_metrics(Y, model_fn, season_length, train_test_split)
+    metrics_df.index = panel.columns
+
+    return forecast_df, metrics_df
@@ -3,6 +3,10 @@
 # Master script to run all Prophet forecasting models
 # Requirements: 1, 4, 9
 #
+# Usage:
+#   ./run_all_forecasts.sh              # Retrain every ZIP
+#   ./run_all_forecasts.sh --selective  # Retrain only drifted / stale ZIPs
+#
 
 set -e
 
@@ -15,7 +19,7 @@ echo ""
 echo "[0/3] Checking dependencies..."
 if ! python3 -c "import prophet" 2>/dev/null; then
     echo "   ⚠️  Prophet not installed. Installing dependencies..."
-    pip3 install -r requirements.txt
+    pip3 install -r "$(dirname "$0")/../requirements.txt"
 else
     echo "   ✅ Dependencies OK"
 fi
@@ -24,13 +28,13 @@ echo ""
 echo "================================================"
 echo "[1/3] Traffic Volume Forecasting (Req 4 & 9)"
 echo "================================================"
-python3 traffic_volume_forecasting.py
+python3 traffic_volume_forecasting.py "$@"
 
 echo ""
 echo "================================================"
 echo "[2/3] COVID-19 Alert Forecasting (Req 1)"
 echo "================================================"
-python3 covid_alert_forecasting.py
+python3 covid_alert_forecasting.py "$@"
 
 echo ""
 echo "================================================"
@@ -11,12 +11,20 @@ This script:
 5. Writes results back to BigQuery
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from prophet import Prophet
 from google.cloud import bigquery
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from model_metrics import new_run, write_model_metrics
+from prophet_backend import use_inprocess_backend
+from forecast_drift import score_drift, print_drift_report, replace_zip_forecasts
+from model_tiers import (
+    TIER_PROPHET, TIER_EXP_SMOOTHING, TIER_SEASONAL_NAIVE,
+    build_panel, classify_zip_tiers, forecast_cheap_tier
+)
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -26,14 +34,35 @@ DATASET_ID = "gold_data"
 MODEL_VERSION = "v1.1.0"  # Fixed: Now forecasts from full dataset (2025-11-01 onwards)
 FORECAST_DAYS = 90  # 3 months ahead
 TRAIN_TEST_SPLIT = 0.8  # 80% training, 20% testing
+TRAIN_END_DATE = date(2025, 10, 31)  # Full runs; --selective trains through the newest complete day
+
+# Model tier screening (see model_tiers.py): only high-signal ZIPs get Prophet
+TIER_MIN_HISTORY_DAYS = 365   # Prophet needs at least 1 year of data
+TIER_MIN_MEAN_TRIPS = 50      # Average trips/day
+TIER_MAX_ZERO_SHARE = 0.2     # Share of days without trips
+TIER_MIN_CV = 0.05            # Coefficient of variation (flat series)
+SEASON_LENGTH = 7             # Weekly seasonality for the cheap tiers
 
 # BigQuery client
 client = bigquery.Client(project=PROJECT_ID)
 
-def load_training_data():
-    """Load historical taxi trip data aggregated by ZIP code and date"""
+def selective_train_end():
+    """Last day refits train through: the newest complete day (yesterday)"""
+    return date.today() - timedelta(days=1)
+
+def load_training_data(zip_codes=None, train_end=None):
+    """Load historical taxi trip data aggregated by ZIP code and date
+
+    zip_codes restricts the load to the ZIPs being retrained (--selective);
+    they are trained through selective_train_end(), so a refit sees the
+    actuals that triggered it and moves train_end_date. train_end overrides
+    the last day loaded (TRAIN_END_DATE for full runs).
+    """
     print("\n[1/6] Loading training data from BigQuery...")
 
+    zip_filter = "AND pickup_zip IN UNNEST(@zip_codes)" if zip_codes is not None else ""
+    if train_end is None:
+        train_end = selective_train_end() if zip_codes is not None else TRAIN_END_DATE
     query = f"""
     SELECT
       pickup_zip as zip_code,
@@ -42,12 +71,20 @@ def load_training_data():
     FROM `{PROJECT_ID}.{DATASET_ID}.gold_taxi_daily_by_zip`
     WHERE pickup_zip IS NOT NULL
       AND trip_date >= '2020-01-01'
-      AND trip_date <= '2025-10-31'
+      AND trip_date <= @train_end
+      {zip_filter}
     GROUP BY pickup_zip, trip_date
     ORDER BY pickup_zip, trip_date
     """
 
-    df = client.query(query).to_dataframe()
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("train_end", "DATE", train_end),
+        ] + ([
+            bigquery.ArrayQueryParameter("zip_codes", "STRING", sorted(zip_codes)),
+        ] if zip_codes is not None else [])
+    )
+    df = client.query(query, job_config=job_config).to_dataframe()
     print(f"   ✅ Loaded {len(df):,} records")
     print(f"   ✅ Date range: {df['trip_date'].min()} to {df['trip_date'].max()}")
     print(f"   ✅ ZIP codes: {df['zip_code'].nunique()}")
@@ -78,6 +115,7 @@ def train_prophet_model(df_prophet, zip_code):
         daily_seasonality=False
     )
 
+    use_inprocess_backend(model)
     model.fit(train)
 
     # Evaluate on test set
@@ -129,6 +167,7 @@ def process_zip_code(df, zip_code):
             weekly_seasonality=True,
             daily_seasonality=False
         )
+        use_inprocess_backend(model_full)
         model_full.fit(df_prophet)
 
         # Generate forecasts from the FULL dataset end
@@ -180,6 +219,7 @@ def process_zip_code(df, zip_code):
             'seasonality_mode': 'multiplicative',
             'zip_code': zip_code,
             'neighborhood': None,
+            'model_tier': TIER_PROPHET,
             'notes': f'{FORECAST_DAYS}-day forecast'
         }
 
@@ -191,68 +231,178 @@ def process_zip_code(df, zip_code):
         print(f"   ❌ {zip_code}: Error - {str(e)}")
         return None, None
 
-def write_to_bigquery(forecast_records, metrics_records):
-    """Write forecasts and metrics to BigQuery"""
+def process_cheap_tier(panel, tiers, tier):
+    """Forecast all ZIPs of a cheap tier in one vectorized pass"""
+    forecast_df, metrics_df = forecast_cheap_tier(
+        panel, tier, SEASON_LENGTH, FORECAST_DAYS, TRAIN_TEST_SPLIT, clip_min=0
+    )
+
+    trained_date = datetime.now().date()
+    forecast_records = [
+        {
+            'zip_code': row.zip_code,
+            'forecast_date': row.ds.date(),
+            'forecast_type': 'daily',
+            'yhat': row.yhat,
+            'yhat_lower': row.yhat_lower,
+            'yhat_upper': row.yhat_upper,
+            'trend': None,
+            'yearly': None,
+            'weekly': None,
+            'model_trained_date': trained_date,
+            'training_days': int(tiers.at[row.zip_code, 'history']),
+            'model_version': MODEL_VERSION
+        }
+        for row in forecast_df.itertuples(index=False)
+    ]
+
+    metrics_records = []
+    for zip_code, metrics in metrics_df.iterrows():
+        metrics_records.append({
+            'model_name': f'traffic_forecast_zip_{zip_code}',
+            'model_version': MODEL_VERSION,
+            'trained_date': trained_date,
+            'train_start_date': panel[zip_code].first_valid_index().date(),
+            'train_end_date': panel.index[-1].date(),
+            'training_records': int(tiers.at[zip_code, 'history']),
+            'mae': metrics['mae'],
+            'rmse': metrics['rmse'],
+            'mape': metrics['mape'],
+            'r_squared': metrics['r2'],
+            'changepoint_prior_scale': None,
+            'seasonality_prior_scale': None,
+            'seasonality_mode': None,
+            'zip_code': zip_code,
+            'neighborhood': None,
+            'model_tier': tier,
+            'notes': f'{FORECAST_DAYS}-day forecast ({tier}: {tiers.at[zip_code, "reason"]})'
+        })
+        print(f"   ✅ {zip_code} [{tier}]: MAE={metrics['mae']:.0f}, MAPE={metrics['mape']:.1f}%, R²={metrics['r2']:.3f}")
+
+    return forecast_records, metrics_records
+
+def screen_zip_tiers(df):
+    """Build the ZIP panel and assign every ZIP a model tier"""
+    panel = build_panel(df, 'zip_code', 'trip_date', 'trip_count', freq='D')
+    tiers = classify_zip_tiers(
+        panel, TIER_MIN_HISTORY_DAYS, TIER_MIN_MEAN_TRIPS,
+        TIER_MAX_ZERO_SHARE, TIER_MIN_CV, SEASON_LENGTH
+    )
+    print(f"\n   Model tiers: {tiers['tier'].value_counts().to_dict()}")
+    return panel, tiers
+
+def forecast_zips(df, panel, tiers, on_zip=None):
+    """Forecast every ZIP in tiers: Prophet for high-signal ZIPs, cheap tiers for the rest
+
+    tiers is updated in place when a Prophet fit falls back. on_zip, if
+    given, is called with (forecast_records, metrics_record) of each ZIP as
+    soon as it is forecast. Returns (forecast_records, metrics_records).
+    """
+    zip_codes = sorted(tiers.index[tiers['tier'] == TIER_PROPHET])
+
+    print(f"\n[2/6] Training Prophet models for {len(zip_codes)} high-signal ZIP codes...")
+    print("   This may take 5-10 minutes...")
+
+    # Train models for each ZIP code
+    all_forecasts = []
+    all_metrics = []
+
+    for i, zip_code in enumerate(zip_codes, 1):
+        print(f"   [{i}/{len(zip_codes)}] Processing {zip_code}...", end=" ")
+
+        forecast_records, metrics_record = process_zip_code(df, zip_code)
+
+        if forecast_records:
+            all_forecasts.extend(forecast_records)
+            all_metrics.append(metrics_record)
+            if on_zip:
+                on_zip(forecast_records, metrics_record)
+        else:
+            # Fall back to the cheap tiers so every ZIP still gets a forecast
+            tiers.at[zip_code, 'tier'] = TIER_EXP_SMOOTHING
+            tiers.at[zip_code, 'reason'] = 'prophet-fallback'
+
+    # Fast vectorized models for the remaining ZIPs
+    for tier in (TIER_EXP_SMOOTHING, TIER_SEASONAL_NAIVE):
+        tier_zips = sorted(tiers.index[tiers['tier'] == tier])
+        if tier_zips:
+            print(f"\n   Forecasting {len(tier_zips)} ZIP codes with {tier}...")
+            forecast_records, metrics_records = process_cheap_tier(panel[tier_zips], tiers, tier)
+            all_forecasts.extend(forecast_records)
+            all_metrics.extend(metrics_records)
+            if on_zip:
+                for metrics_record in metrics_records:
+                    on_zip([r for r in forecast_records if r['zip_code'] == metrics_record['zip_code']],
+                           metrics_record)
+
+    return all_forecasts, all_metrics
+
+def write_to_bigquery(forecast_records, metrics_records, run_id, run_timestamp, replace_zips=None):
+    """Write forecasts and metrics to BigQuery
+
+    With replace_zips (--selective), only those ZIPs' forecast rows are
+    replaced; every other ZIP keeps its published forecast.
+    """
     print("\n[5/6] Writing forecasts to BigQuery...")
 
     # Write forecasts
     forecast_df = pd.DataFrame(forecast_records)
 
-    job_config = bigquery.LoadJobConfig(
-        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-    )
+    if replace_zips is not None:
+        replace_zip_forecasts(
+            client, PROJECT_ID, DATASET_ID, 'gold_traffic_forecasts_by_zip', forecast_df, replace_zips
+        )
+    else:
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
 
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_traffic_forecasts_by_zip"
-    job = client.load_table_from_dataframe(forecast_df, table_id, job_config=job_config)
-    job.result()
+        table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_traffic_forecasts_by_zip"
+        job = client.load_table_from_dataframe(forecast_df, table_id, job_config=job_config)
+        job.result()
 
     print(f"   ✅ Wrote {len(forecast_df):,} forecast records")
 
-    # Write metrics
+    # Append metrics (history is kept; latest-per-model table is refreshed)
     print("\n[6/6] Writing model metrics to BigQuery...")
-    metrics_df = pd.DataFrame(metrics_records)
-
-    table_id = f"{PROJECT_ID}.{DATASET_ID}.gold_forecast_model_metrics"
-    job = client.load_table_from_dataframe(metrics_df, table_id, job_config=job_config)
-    job.result()
+    written = write_model_metrics(client, PROJECT_ID, DATASET_ID, metrics_records, run_id, run_timestamp)
 
-    print(f"   ✅ Wrote {len(metrics_df):,} metrics records")
+    print(f"   ✅ Appended {written:,} metrics records (run {run_id})")
 
-def main():
+def main(selective=False):
     """Main forecasting pipeline"""
     print("=" * 60)
     print("TRAFFIC VOLUME FORECASTING WITH PROPHET")
     print(f"Requirements: 4 & 9 (Daily/Weekly/Monthly Traffic Patterns)")
     print("=" * 60)
 
-    # Load data
-    df = load_training_data()
-
-    # Get list of ZIP codes
-    zip_codes = sorted(df['zip_code'].unique())
-
-    print(f"\n[2/6] Training Prophet models for {len(zip_codes)} ZIP codes...")
-    print("   This may take 5-10 minutes...")
+    run_id, run_timestamp = new_run('traffic')
 
-    # Train models for each ZIP code
-    all_forecasts = []
-    all_metrics = []
+    # Selective mode: only retrain ZIPs that drifted or aged out
+    retrain_zips = None
+    if selective:
+        print("\n[0/6] Scoring published forecasts against new actuals...")
+        drift = score_drift(client, PROJECT_ID, DATASET_ID, 'traffic')
+        print_drift_report(drift)
+        retrain_zips = sorted(drift.loc[drift['retrain'], 'zip_code'])
+        if not retrain_zips:
+            print("\n✅ No ZIP drifted - published forecasts kept, nothing to retrain")
+            return
 
-    for i, zip_code in enumerate(zip_codes, 1):
-        print(f"   [{i}/{len(zip_codes)}] Processing {zip_code}...", end=" ")
+    # Load data
+    df = load_training_data(retrain_zips)
 
-        forecast_records, metrics_record = process_zip_code(df, zip_code)
+    # Screen every ZIP series at once and pick a model tier
+    panel, tiers = screen_zip_tiers(df)
 
-        if forecast_records:
-            all_forecasts.extend(forecast_records)
-            all_metrics.append(metrics_record)
+    all_forecasts, all_metrics = forecast_zips(df, panel, tiers)
 
     print(f"\n[3/6] Successfully trained {len(all_metrics)} models")
     print(f"[4/6] Generated {len(all_forecasts):,} forecast records ({FORECAST_DAYS} days × {len(all_metrics)} ZIPs)")
 
     # Write to BigQuery
     if all_forecasts and all_metrics:
-        write_to_bigquery(all_forecasts, all_metrics)
+        write_to_bigquery(all_forecasts, all_metrics, run_id, run_timestamp, replace_zips=retrain_zips)
 
         # Summary statistics
         print("\n" + "=" * 60)
@@ -274,4 +424,10 @@ def main():
         print("\n❌ No forecasts generated - check errors above")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Traffic volume forecasting with Prophet")
+    parser.add_argument(
+        "--selective", action="store_true",
+        help="Only retrain ZIPs whose forecasts drifted or whose model aged out (see forecast_drift.py)"
+    )
+    args = parser.parse_args()
+    main(selective=args.selective)
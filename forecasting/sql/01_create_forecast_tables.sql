@@ -148,26 +148,50 @@ CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_
   seasonality_prior_scale FLOAT64,
   holidays_prior_scale FLOAT64,
   seasonality_mode STRING,
+  model_tier STRING,           -- 'prophet', 'exp_smoothing', 'seasonal_naive'
 
   -- Additional metadata
   zip_code STRING,             -- NULL for aggregated models
   neighborhood STRING,         -- NULL for aggregated models
   notes STRING,
+
+  -- Run metadata (every script run appends; history is never truncated)
+  run_id STRING,               -- e.g. 'traffic_20251201T020000Z_1a2b3c4d'
+  run_timestamp TIMESTAMP,     -- When the run started (UTC)
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP()
 )
 PARTITION BY trained_date
 CLUSTER BY model_name, model_version
 OPTIONS(
-  description="Model performance metrics for Prophet forecasting models",
+  description="Model performance metrics for Prophet forecasting models (append-only run history)",
   labels=[("layer", "gold"), ("purpose", "model_monitoring")]
 );
 
+-- ================================================
+-- Table 5: Latest Model Metrics (one row per model)
+-- ================================================
+-- Maintained by forecasting/scripts/model_metrics.py after every run:
+-- the rows of the run just written replace the previous rows of the same
+-- model_name. Dashboards read this table instead of scanning the history.
+
+CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics_latest`
+CLUSTER BY model_name
+OPTIONS(
+  description="Latest metrics per forecasting model (maintained after each forecasting run)",
+  labels=[("layer", "gold"), ("purpose", "model_monitoring")]
+)
+AS
+SELECT * EXCEPT(created_at)
+FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+WHERE FALSE;
+
 -- ================================================
 -- SUMMARY
 -- ================================================
--- Created 4 Gold tables for Prophet forecasting:
+-- Created 5 Gold tables for Prophet forecasting:
 -- 1. gold_traffic_forecasts_by_zip (Req 4 & 9)
 -- 2. gold_covid_risk_forecasts (Req 1)
 -- 3. gold_traffic_forecasts_by_neighborhood (Req 9)
--- 4. gold_forecast_model_metrics (monitoring)
+-- 4. gold_forecast_model_metrics (monitoring, run history)
+-- 5. gold_forecast_model_metrics_latest (monitoring, latest per model)
 -- ================================================
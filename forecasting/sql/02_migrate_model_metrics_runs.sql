@@ -0,0 +1,36 @@
+-- ================================================
+-- MIGRATION: Run-scoped gold_forecast_model_metrics
+-- ================================================
+-- Brings an existing deployment in line with 01_create_forecast_tables.sql
+-- without dropping metrics history:
+--   1. Adds run_id / run_timestamp / model_tier to the history table
+--   2. Creates gold_forecast_model_metrics_latest and seeds it with the
+--      most recent row per model (one-time full scan)
+-- Safe to re-run.
+-- ================================================
+
+ALTER TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+  ADD COLUMN IF NOT EXISTS run_id STRING,
+  ADD COLUMN IF NOT EXISTS run_timestamp TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS model_tier STRING;
+
+-- Rows written before this migration have no run metadata; derive it from
+-- trained_date so the latest-per-model ordering below is well defined.
+UPDATE `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+SET
+  run_id = CONCAT('legacy_', FORMAT_DATE('%Y%m%d', trained_date)),
+  run_timestamp = COALESCE(created_at, TIMESTAMP(trained_date)),
+  model_tier = COALESCE(model_tier, 'prophet')
+WHERE run_id IS NULL;
+
+CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics_latest`
+CLUSTER BY model_name
+OPTIONS(
+  description="Latest metrics per forecasting model (maintained after each forecasting run)",
+  labels=[("layer", "gold"), ("purpose", "model_monitoring")]
+)
+AS
+SELECT * EXCEPT(created_at)
+FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+WHERE TRUE
+QUALIFY ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY trained_date DESC, run_timestamp DESC) = 1;
@@ -189,7 +189,7 @@ SELECT
   train_start_date,
   train_end_date,
   notes
-FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics`
+FROM `chicago-bi-app-msds-432-476520.gold_data.gold_forecast_model_metrics_latest`
 WHERE model_name LIKE 'covid_risk_forecast%'
 ORDER BY mae ASC;
 
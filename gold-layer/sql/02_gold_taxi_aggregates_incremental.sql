@@ -0,0 +1,215 @@
+-- =====================================================
+-- Gold Layer: Incremental Taxi Aggregations and Top Routes
+-- =====================================================
+-- Purpose: Maintain gold_taxi_hourly_by_zip, gold_taxi_daily_by_zip and
+--          gold_route_pairs from the silver_trips_enriched partitions that
+--          changed since the last run, instead of re-aggregating every trip
+-- Source: silver_data.silver_trips_enriched
+-- Run by: transformations/permits/scripts/run_pipeline.py --manifest trips
+--
+-- Parameters (resolved by the pipeline, see TRIPS_GOLD_WATERMARK in
+-- pipeline_manifests.py):
+--   @trip_dates    ARRAY<DATE>  silver partitions modified since the last run
+--
+-- gold_route_totals holds the totals per route (trip count, fare and miles as
+-- NUMERIC, exact), summed from the daily aggregates' total_fare and
+-- total_miles after their changed partitions are replaced: a few million
+-- daily rows instead of every trip. Every statement is idempotent, so a run
+-- that fails part-way is simply run again. The top 10 are then ranked from
+-- the totals, a few thousand rows.
+--
+-- 02_gold_taxi_hourly_by_zip.sql, 03_gold_taxi_daily_by_zip.sql and
+-- 04_gold_route_pairs.sql remain the one-shot full builds.
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_hourly_by_zip` (
+  pickup_zip STRING,
+  dropoff_zip STRING,
+  trip_date DATE,
+  trip_hour INT64,
+  trip_count INT64,
+  avg_miles FLOAT64,
+  avg_fare FLOAT64,
+  created_at TIMESTAMP
+)
+PARTITION BY trip_date
+CLUSTER BY pickup_zip, dropoff_zip, trip_hour;
+
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip` (
+  pickup_zip STRING,
+  dropoff_zip STRING,
+  trip_date DATE,
+  trip_count INT64,
+  avg_miles FLOAT64,
+  avg_fare FLOAT64,
+  created_at TIMESTAMP,
+  total_fare NUMERIC,
+  total_miles NUMERIC
+)
+PARTITION BY trip_date
+CLUSTER BY pickup_zip, dropoff_zip;
+
+-- Exact sums per route and day (tables built by 03_gold_taxi_daily_by_zip.sql
+-- lack them; they are filled by the initial full rebuild)
+ALTER TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip`
+  ADD COLUMN IF NOT EXISTS total_fare NUMERIC;
+
+ALTER TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip`
+  ADD COLUMN IF NOT EXISTS total_miles NUMERIC;
+
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.gold_data.gold_route_totals` (
+  pickup_zip STRING,
+  dropoff_zip STRING,
+  trip_count INT64,
+  total_fare NUMERIC,
+  total_miles NUMERIC,
+  updated_at TIMESTAMP
+)
+CLUSTER BY pickup_zip, dropoff_zip;
+
+-- =====================================================
+-- Daily aggregates: replace the changed partitions
+-- (the target filter in ON and DELETE limits the MERGE to those partitions)
+-- =====================================================
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip` AS target
+USING (
+  SELECT
+    pickup_zip,
+    dropoff_zip,
+    trip_date,
+    COUNT(*) as trip_count,
+    ROUND(AVG(trip_miles), 2) as avg_miles,
+    ROUND(AVG(fare), 2) as avg_fare,
+    SUM(CAST(fare AS NUMERIC)) as total_fare,
+    SUM(CAST(trip_miles AS NUMERIC)) as total_miles
+  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched`
+  WHERE trip_date IN UNNEST(@trip_dates)
+    AND pickup_zip IS NOT NULL
+    AND dropoff_zip IS NOT NULL
+  GROUP BY pickup_zip, dropoff_zip, trip_date
+) AS source
+ON target.trip_date IN UNNEST(@trip_dates)
+  AND target.trip_date = source.trip_date
+  AND target.pickup_zip = source.pickup_zip
+  AND target.dropoff_zip = source.dropoff_zip
+
+WHEN MATCHED THEN
+  UPDATE SET
+    trip_count = source.trip_count,
+    avg_miles = source.avg_miles,
+    avg_fare = source.avg_fare,
+    total_fare = source.total_fare,
+    total_miles = source.total_miles,
+    created_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED THEN
+  INSERT (pickup_zip, dropoff_zip, trip_date, trip_count, avg_miles, avg_fare, created_at, total_fare, total_miles)
+  VALUES (source.pickup_zip, source.dropoff_zip, source.trip_date, source.trip_count, source.avg_miles,
+          source.avg_fare, CURRENT_TIMESTAMP(), source.total_fare, source.total_miles)
+
+WHEN NOT MATCHED BY SOURCE AND target.trip_date IN UNNEST(@trip_dates) THEN
+  DELETE;
+
+-- =====================================================
+-- Route totals: summed from the daily aggregates, not adjusted by deltas,
+-- so rerunning after a failure at any statement gives the same totals
+-- =====================================================
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_route_totals` AS target
+USING (
+  SELECT
+    pickup_zip,
+    dropoff_zip,
+    SUM(trip_count) as trip_count,
+    SUM(total_fare) as total_fare,
+    SUM(total_miles) as total_miles
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip`
+  GROUP BY pickup_zip, dropoff_zip
+) AS source
+ON target.pickup_zip = source.pickup_zip
+  AND target.dropoff_zip = source.dropoff_zip
+
+WHEN MATCHED AND (target.trip_count != source.trip_count
+                  OR target.total_fare IS DISTINCT FROM source.total_fare
+                  OR target.total_miles IS DISTINCT FROM source.total_miles) THEN
+  UPDATE SET
+    trip_count = source.trip_count,
+    total_fare = source.total_fare,
+    total_miles = source.total_miles,
+    updated_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED THEN
+  INSERT (pickup_zip, dropoff_zip, trip_count, total_fare, total_miles, updated_at)
+  VALUES (source.pickup_zip, source.dropoff_zip, source.trip_count, source.total_fare, source.total_miles,
+          CURRENT_TIMESTAMP())
+
+-- Route without trips left
+WHEN NOT MATCHED BY SOURCE THEN
+  DELETE;
+
+-- =====================================================
+-- Top 10 routes, ranked from the running totals
+-- =====================================================
+CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data.gold_route_pairs`
+AS
+WITH ranked_routes AS (
+  SELECT
+    pickup_zip,
+    dropoff_zip,
+    trip_count,
+    ROUND(CAST(total_fare AS FLOAT64) / trip_count, 2) as avg_fare,
+    ROUND(CAST(total_miles AS FLOAT64) / trip_count, 2) as avg_miles,
+    ROUND(CAST(total_fare AS FLOAT64), 2) as total_revenue,
+    RANK() OVER (ORDER BY trip_count DESC) as rank
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_route_totals`
+)
+SELECT
+  pickup_zip,
+  dropoff_zip,
+  trip_count,
+  avg_fare,
+  avg_miles,
+  total_revenue,
+  rank,
+  CURRENT_TIMESTAMP() as created_at
+FROM ranked_routes
+WHERE rank <= 10;
+
+-- =====================================================
+-- Hourly aggregates: replace the changed partitions
+-- =====================================================
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_hourly_by_zip` AS target
+USING (
+  SELECT
+    pickup_zip,
+    dropoff_zip,
+    trip_date,
+    trip_hour,
+    COUNT(*) as trip_count,
+    ROUND(AVG(trip_miles), 2) as avg_miles,
+    ROUND(AVG(fare), 2) as avg_fare
+  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched`
+  WHERE trip_date IN UNNEST(@trip_dates)
+    AND pickup_zip IS NOT NULL
+    AND dropoff_zip IS NOT NULL
+  GROUP BY pickup_zip, dropoff_zip, trip_date, trip_hour
+) AS source
+ON target.trip_date IN UNNEST(@trip_dates)
+  AND target.trip_date = source.trip_date
+  AND target.trip_hour = source.trip_hour
+  AND target.pickup_zip = source.pickup_zip
+  AND target.dropoff_zip = source.dropoff_zip
+
+WHEN MATCHED THEN
+  UPDATE SET
+    trip_count = source.trip_count,
+    avg_miles = source.avg_miles,
+    avg_fare = source.avg_fare,
+    created_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED THEN
+  INSERT (pickup_zip, dropoff_zip, trip_date, trip_hour, trip_count, avg_miles, avg_fare, created_at)
+  VALUES (source.pickup_zip, source.dropoff_zip, source.trip_date, source.trip_hour, source.trip_count,
+          source.avg_miles, source.avg_fare, CURRENT_TIMESTAMP())
+
+WHEN NOT MATCHED BY SOURCE AND target.trip_date IN UNNEST(@trip_dates) THEN
+  DELETE;
@@ -2,7 +2,7 @@
 -- Gold Layer: COVID Hotspots with Mobility Risk Scoring
 -- =====================================================
 -- Purpose: Combine COVID data with mobility patterns and vulnerability
--- Source: silver_data.silver_covid_weekly_historical + silver_trips_enriched + silver_ccvi_high_risk
+-- Source: silver_data.silver_covid_weekly_historical + gold_mobility_weekly_by_zip + silver_ccvi_high_risk
 -- Granularity: zip_code, week_start (time series - 219 weeks × ~60 ZIPs)
 -- Created: 2025-11-13
 -- =====================================================
@@ -12,52 +12,16 @@ PARTITION BY week_start
 CLUSTER BY zip_code, risk_category
 AS
 WITH
--- Step 1: Get trip counts by ZIP and week
-trip_counts_by_week AS (
-  SELECT
-    DATE_TRUNC(trip_date, WEEK) as week_start,
-    pickup_zip,
-    dropoff_zip,
-    COUNT(*) as trip_count,
-    COUNTIF(trips_pooled > 0) as pooled_trip_count
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched`
-  WHERE pickup_zip IS NOT NULL AND dropoff_zip IS NOT NULL
-  GROUP BY week_start, pickup_zip, dropoff_zip
-),
-
--- Step 2: Aggregate trips FROM and TO each ZIP by week
-mobility_by_zip_week AS (
-  SELECT
-    week_start,
-    pickup_zip as zip_code,
-    SUM(trip_count) as total_trips_from_zip,
-    0 as total_trips_to_zip,
-    0 as total_pooled_trips_to_zip
-  FROM trip_counts_by_week
-  GROUP BY week_start, zip_code
-
-  UNION ALL
-
-  SELECT
-    week_start,
-    dropoff_zip as zip_code,
-    0 as total_trips_from_zip,
-    SUM(trip_count) as total_trips_to_zip,
-    SUM(pooled_trip_count) as total_pooled_trips_to_zip
-  FROM trip_counts_by_week
-  GROUP BY week_start, zip_code
-),
-
--- Step 3: Consolidate mobility metrics by ZIP and week
+-- Steps 1-3: Trips FROM and TO each ZIP by week, maintained incrementally in
+-- gold_mobility_weekly_by_zip (09_gold_mobility_weekly_by_zip.sql)
 mobility_consolidated AS (
   SELECT
     week_start,
     zip_code,
-    SUM(total_trips_from_zip) as total_trips_from_zip,
-    SUM(total_trips_to_zip) as total_trips_to_zip,
-    SUM(total_pooled_trips_to_zip) as total_pooled_trips_to_zip
-  FROM mobility_by_zip_week
-  GROUP BY week_start, zip_code
+    total_trips_from_zip,
+    total_trips_to_zip,
+    total_pooled_trips_to_zip
+  FROM `chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip`
 ),
 
 -- Step 4: Join COVID data with mobility data
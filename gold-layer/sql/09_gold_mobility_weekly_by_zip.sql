@@ -0,0 +1,110 @@
+-- =====================================================
+-- Gold Layer: Weekly Mobility by ZIP (incremental)
+-- =====================================================
+-- Purpose: Trips from/to each ZIP per week, shared by gold_covid_hotspots and
+--          the COVID forecasting scripts instead of each re-aggregating
+--          every trip in silver_trips_enriched
+-- Source: silver_data.silver_trips_enriched
+-- Granularity: zip_code, week_start (weeks start on Sunday)
+-- Run by: transformations/permits/scripts/run_pipeline.py --manifest trips
+--
+-- Parameters (resolved by the pipeline, see TRIPS_GOLD_WATERMARK in
+-- pipeline_manifests.py):
+--   @week_dates    ARRAY<DATE>  every day of the weeks containing a silver
+--                               partition modified since the last run
+--   @full_rebuild  BOOL         initial load: drop weeks no longer in silver
+--
+-- Only the touched weeks are recomputed (whole weeks, so the totals stay
+-- exact): a daily run reads one week of trips.
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip` (
+  zip_code STRING,
+  week_start DATE,
+  total_trips_from_zip INT64,
+  total_trips_to_zip INT64,
+  total_pooled_trips_to_zip INT64,
+  updated_at TIMESTAMP
+)
+PARTITION BY week_start
+CLUSTER BY zip_code;
+
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip` AS target
+USING (
+  WITH
+  -- Step 1: Trip counts by route and week
+  trip_counts_by_week AS (
+    SELECT
+      DATE_TRUNC(trip_date, WEEK) as week_start,
+      pickup_zip,
+      dropoff_zip,
+      COUNT(*) as trip_count,
+      COUNTIF(trips_pooled > 0) as pooled_trip_count
+    FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched`
+    WHERE trip_date IN UNNEST(@week_dates)
+      AND pickup_zip IS NOT NULL AND dropoff_zip IS NOT NULL
+    GROUP BY week_start, pickup_zip, dropoff_zip
+  ),
+
+  -- Step 2: Trips FROM and TO each ZIP by week
+  mobility_by_zip_week AS (
+    SELECT
+      week_start,
+      pickup_zip as zip_code,
+      SUM(trip_count) as total_trips_from_zip,
+      0 as total_trips_to_zip,
+      0 as total_pooled_trips_to_zip
+    FROM trip_counts_by_week
+    GROUP BY week_start, zip_code
+
+    UNION ALL
+
+    SELECT
+      week_start,
+      dropoff_zip as zip_code,
+      0 as total_trips_from_zip,
+      SUM(trip_count) as total_trips_to_zip,
+      SUM(pooled_trip_count) as total_pooled_trips_to_zip
+    FROM trip_counts_by_week
+    GROUP BY week_start, zip_code
+  )
+
+  -- Step 3: Consolidate by ZIP and week
+  SELECT
+    week_start,
+    zip_code,
+    SUM(total_trips_from_zip) as total_trips_from_zip,
+    SUM(total_trips_to_zip) as total_trips_to_zip,
+    SUM(total_pooled_trips_to_zip) as total_pooled_trips_to_zip
+  FROM mobility_by_zip_week
+  GROUP BY week_start, zip_code
+) AS source
+ON target.week_start IN UNNEST(@week_dates)
+  AND target.week_start = source.week_start
+  AND target.zip_code = source.zip_code
+
+WHEN MATCHED THEN
+  UPDATE SET
+    total_trips_from_zip = source.total_trips_from_zip,
+    total_trips_to_zip = source.total_trips_to_zip,
+    total_pooled_trips_to_zip = source.total_pooled_trips_to_zip,
+    updated_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED THEN
+  INSERT (zip_code, week_start, total_trips_from_zip, total_trips_to_zip, total_pooled_trips_to_zip, updated_at)
+  VALUES (source.zip_code, source.week_start, source.total_trips_from_zip, source.total_trips_to_zip,
+          source.total_pooled_trips_to_zip, CURRENT_TIMESTAMP())
+
+WHEN NOT MATCHED BY SOURCE AND (target.week_start IN UNNEST(@week_dates) OR @full_rebuild) THEN
+  DELETE;
+
+-- =====================================================
+-- Verification Query
+-- =====================================================
+-- SELECT
+--   COUNT(*) as total_records,
+--   COUNT(DISTINCT zip_code) as unique_zips,
+--   MIN(week_start) as earliest_week,
+--   MAX(week_start) as latest_week,
+--   SUM(total_trips_from_zip) as total_trips
+-- FROM `chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip`;
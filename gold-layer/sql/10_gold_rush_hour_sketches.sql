@@ -0,0 +1,74 @@
+-- =====================================================
+-- Gold Layer: Rush-Hour Trip Counts and Fare Sketches by ZIP (incremental)
+-- =====================================================
+-- Purpose: One compact row per pickup ZIP, day and hour for the rush-hour
+--          dashboard and its IQR analysis (dashboards/queries/
+--          rush_hour_iqr_analysis.sql), so color scales and percentiles over
+--          any date range no longer rescan the trips
+-- Source: silver_data.silver_trips_enriched
+-- Granularity: zip_code, trip_date, trip_hour
+-- Run by: transformations/permits/scripts/run_pipeline.py --manifest trips
+--
+-- Parameters (resolved by the pipeline, see TRIPS_GOLD_WATERMARK in
+-- pipeline_manifests.py):
+--   @trip_dates    ARRAY<DATE>  silver partitions modified since the last run
+--   @full_rebuild  BOOL         initial load: drop days no longer in silver
+--
+-- trip_count is exact and additive: sum it over any date range. fare_sketch
+-- is a KLL quantile sketch of the trips' fares; sketches merge across days,
+-- hours and ZIPs, e.g.
+--   KLL_QUANTILES.MERGE_POINT_FLOAT64(fare_sketch, 0.75)
+-- is the approximate third fare quartile of the rows aggregated (precision
+-- 1000, BigQuery's default). A sketch cannot be updated in place, so the
+-- changed days are replaced whole.
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches` (
+  zip_code STRING,
+  trip_date DATE,
+  trip_hour INT64,
+  day_type STRING,
+  trip_count INT64,
+  fare_sketch BYTES,
+  updated_at TIMESTAMP
+)
+PARTITION BY trip_date
+CLUSTER BY zip_code, trip_hour;
+
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches` AS target
+USING (
+  SELECT
+    pickup_zip as zip_code,
+    trip_date,
+    trip_hour,
+    IF(EXTRACT(DAYOFWEEK FROM trip_date) IN (1, 7), 'Weekend', 'Weekday') as day_type,
+    COUNT(*) as trip_count,
+    KLL_QUANTILES.INIT_FLOAT64(fare, 1000) as fare_sketch
+  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched`
+  WHERE trip_date IN UNNEST(@trip_dates)
+    AND pickup_zip IS NOT NULL
+  GROUP BY zip_code, trip_date, trip_hour
+) AS source
+-- Changed days are replaced whole: insert every source row, delete the
+-- days' old rows
+ON FALSE
+
+WHEN NOT MATCHED THEN
+  INSERT (zip_code, trip_date, trip_hour, day_type, trip_count, fare_sketch, updated_at)
+  VALUES (source.zip_code, source.trip_date, source.trip_hour, source.day_type,
+          source.trip_count, source.fare_sketch, CURRENT_TIMESTAMP())
+
+WHEN NOT MATCHED BY SOURCE AND (target.trip_date IN UNNEST(@trip_dates) OR @full_rebuild) THEN
+  DELETE;
+
+-- =====================================================
+-- Verification Query
+-- =====================================================
+-- SELECT
+--   COUNT(*) as total_records,
+--   COUNT(DISTINCT zip_code) as unique_zips,
+--   MIN(trip_date) as earliest_date,
+--   MAX(trip_date) as latest_date,
+--   SUM(trip_count) as total_trips,
+--   KLL_QUANTILES.MERGE_FLOAT64(fare_sketch, 4) as fare_quartiles
+-- FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`;
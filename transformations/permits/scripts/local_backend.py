@@ -0,0 +1,704 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Local DuckDB backend
+Purpose: Run the pipeline SQL offline, without BigQuery, for testing SQL
+         changes and benchmarking at realistic volumes
+
+DuckDBClient stands in for the subset of google.cloud.bigquery.Client the
+pipeline uses (query, get_job, list_jobs, get_table). Every statement is translated
+from BigQuery SQL to DuckDB before it runs:
+
+  `project.dataset.table`          dataset.table (one DuckDB schema per dataset)
+  STRING/INT64/FLOAT64/BYTES       VARCHAR/BIGINT/DOUBLE/BLOB
+  TIMESTAMP/GEOGRAPHY              TIMESTAMPTZ/GEOMETRY (spatial extension)
+  PARTITION BY/CLUSTER BY/OPTIONS  dropped from CREATE TABLE (and ... AS SELECT)
+  MERGE t                          MERGE INTO t
+  DATE(x)                          CAST(x AS DATE)
+  ST_GEOGPOINT, PERCENTILE_CONT,   ST_Point, quantile_cont,
+  COUNTIF, * EXCEPT (...)          count_if, * EXCLUDE (...)
+  @param                           $param
+  x IN UNNEST(@array)              x IN $array (also valid in MERGE ... ON)
+  FROM UNNEST(...) AS x            FROM UNNEST(...) AS x(x)
+  DATE_TRUNC(x, WEEK)              date_trunc_week(x) (Sunday, as BigQuery)
+  DATE_TRUNC(x, MONTH), ...        date_trunc('month', x) (also YEAR, WEEK(MONDAY))
+  MERGE ... INSERT ROW             MERGE ... INSERT *
+  EXTRACT(DAYOFWEEK FROM x)        ... + 1 (Sunday is 1, as BigQuery)
+  KLL_QUANTILES.INIT_FLOAT64       the sorted values, as a BLOB
+  KLL_QUANTILES.MERGE_POINT_...    quantile_disc of the merged values (exact)
+  _SESSION.name                    temp.name (temp table)
+  dataset.INFORMATION_SCHEMA       local_meta.partitions rows of the dataset
+    .PARTITIONS
+
+Query jobs with a partition-decorated destination (table$YYYYMMDD,
+WRITE_TRUNCATE, time_partitioning.field) replace that partition's rows and
+record it in local_meta.partitions; partitions written by other statements
+are not tracked. PARSE_DATE, SAFE_DIVIDE, DATE_ADD, DATE_SUB and
+date_trunc_week are macros. The client has one connection, so its temp
+tables live as long as a BigQuery session would: creating a session returns
+a placeholder id and BQ.ABORT_SESSION() drops the temp tables.
+Anything else must already be valid in both dialects. Source tables are
+loaded from Parquet fixtures laid out as <dir>/<dataset>/<table>.parquet (WKT
+`geometry` columns become geometries) when their file changed. Table
+last-modified times are kept in local_meta.tables so skipping unchanged layers
+works across runs.
+
+Generate synthetic fixtures:
+    python3 local_backend.py fixtures fixtures/ --permits 500000
+    python3 local_backend.py fixtures fixtures/ --until 2025-11-20   # one day less
+
+Requires duckdb and its spatial extension (pip install -r requirements-local.txt).
+"""
+
+import os
+import re
+import glob
+import uuid
+import argparse
+import threading
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from google.api_core.exceptions import BadRequest, Conflict, NotFound
+
+from pipeline_dag import split_sql_statements, statement_keyword, statement_tables
+
+META_TABLE = "local_meta.tables"
+PARTITIONS_TABLE = "local_meta.partitions"
+
+TYPES = {
+    'STRING': 'VARCHAR',
+    'INT64': 'BIGINT',
+    'FLOAT64': 'DOUBLE',
+    'BYTES': 'BLOB',
+    'TIMESTAMP': 'TIMESTAMPTZ',
+    'GEOGRAPHY': 'GEOMETRY',
+}
+
+FUNCTIONS = {
+    'ST_GEOGPOINT': 'ST_Point',
+    'PERCENTILE_CONT': 'quantile_cont',
+    'COUNTIF': 'count_if',
+}
+
+STATEMENT_TYPES = {
+    'CREATE': 'CREATE_TABLE',
+    'WITH': 'SELECT',
+    'BEGIN': 'BEGIN_TRANSACTION',
+    'COMMIT': 'COMMIT_TRANSACTION',
+}
+
+DML = ('INSERT', 'MERGE', 'DELETE', 'UPDATE')
+
+LITERAL_OR_COMMENT = re.compile(r"'(?:[^'\\]|\\.)*'|--[^\n]*")
+TABLE_NAME = re.compile(r'`[\w-]+\.(\w+)\.(\w+)`')
+PARTITIONS_VIEW = re.compile(r'`[\w-]+\.(\w+)\.INFORMATION_SCHEMA\.PARTITIONS`', re.IGNORECASE)
+
+
+# ============================================================================
+# SQL translation
+# ============================================================================
+
+def _rewrite_date_calls(sql):
+    """DATE(x) -> CAST(x AS DATE), keeping nested parentheses intact"""
+    match = re.search(r'\bDATE\s*\(', sql, re.IGNORECASE)
+    if not match:
+        return sql
+    depth = 1
+    i = match.end()
+    while depth and i < len(sql):
+        depth += {'(': 1, ')': -1}.get(sql[i], 0)
+        i += 1
+    inner = _rewrite_date_calls(sql[match.end():i - 1])
+    return f"{sql[:match.start()]}CAST({inner} AS DATE){_rewrite_date_calls(sql[i:])}"
+
+
+def translate_sql(statement):
+    """Translate one BigQuery statement to DuckDB SQL"""
+    literals = []
+
+    def keep(match):
+        if match.group(0).startswith('--'):
+            return ''
+        literals.append(match.group(0))
+        return f"\x00{len(literals) - 1}\x00"
+
+    sql = LITERAL_OR_COMMENT.sub(keep, statement)
+    sql = PARTITIONS_VIEW.sub(rf"(SELECT * FROM {PARTITIONS_TABLE} WHERE table_schema = '\1')", sql)
+    sql = TABLE_NAME.sub(r'\1.\2', sql)
+    sql = re.sub(r'`(\w+)`', r'"\1"', sql)
+    sql = re.sub(r'\b_SESSION\.(\w+)', r'temp.\1', sql, flags=re.IGNORECASE)
+
+    if statement_keyword(sql) == 'CREATE':
+        sql = re.sub(r'^(\s*CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?[\w.]+)\s+'
+                     r'(?:PARTITION\s+BY|CLUSTER\s+BY|OPTIONS)\b[\s\S]*?\bAS\b', r'\1 AS', sql, flags=re.IGNORECASE)
+        sql = re.sub(r'\)\s*(?:PARTITION\s+BY|CLUSTER\s+BY|OPTIONS)\b[\s\S]*$', ')', sql, flags=re.IGNORECASE)
+    for bigquery_type, duckdb_type in TYPES.items():
+        sql = re.sub(rf'\b{bigquery_type}\b(?!\s*\()', duckdb_type, sql, flags=re.IGNORECASE)
+    for bigquery_function, duckdb_function in FUNCTIONS.items():
+        sql = re.sub(rf'\b{bigquery_function}\s*\(', f'{duckdb_function}(', sql, flags=re.IGNORECASE)
+
+    sql = re.sub(r'^\s*MERGE\s+(?!INTO\b)', 'MERGE INTO ', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\b(CURRENT_TIMESTAMP|CURRENT_DATE)\s*\(\s*\)', r'\1', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\*\s*EXCEPT\s*\(', '* EXCLUDE (', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bIN\s+UNNEST\s*\(\s*@(\w+)\s*\)', r'IN @\1', sql, flags=re.IGNORECASE)  # list membership
+    sql = re.sub(r'\b(UNNEST\s*\([^()]*\))\s+AS\s+(\w+)', r'\1 AS \2(\2)', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bDATE_TRUNC\s*\(((?:(?!\bDATE_TRUNC\b).)*?),\s*WEEK\s*\)', r'date_trunc_week(\1)', sql,
+                 flags=re.IGNORECASE | re.DOTALL)
+    sql = re.sub(r'\bDATE_TRUNC\s*\(((?:(?!\bDATE_TRUNC\b).)*?),\s*(WEEK\s*\(\s*MONDAY\s*\)|MONTH|YEAR)\s*\)',
+                 lambda m: f"CAST(date_trunc('{m.group(2).split('(')[0].strip().lower()}', CAST({m.group(1)} AS DATE)) AS DATE)",
+                 sql, flags=re.IGNORECASE | re.DOTALL)
+    sql = re.sub(r'\bINSERT\s+ROW\b', 'INSERT *', sql, flags=re.IGNORECASE)
+    sql = re.sub(r'\bEXTRACT\s*\(\s*DAYOFWEEK\s+FROM\s+([^()]+)\)', r'(EXTRACT(DAYOFWEEK FROM \1) + 1)', sql,
+                 flags=re.IGNORECASE)
+    # KLL sketches: the sorted values themselves, as a BLOB (exact quantiles)
+    sql = re.sub(r'\bKLL_QUANTILES\.INIT_FLOAT64\s*\(([^(),]+)(?:,\s*\d+)?\)',
+                 r'encode(CAST(list(\1 ORDER BY \1) FILTER (WHERE \1 IS NOT NULL) AS VARCHAR))', sql,
+                 flags=re.IGNORECASE)
+    sql = re.sub(r'\bKLL_QUANTILES\.MERGE_POINT_FLOAT64\s*\(([^(),]+),\s*([^(),]+)\)',
+                 r"list_aggregate(flatten(list(CAST(decode(\1) AS DOUBLE[]))), 'quantile_disc', \2)", sql,
+                 flags=re.IGNORECASE)
+    sql = re.sub(r'\b(COMMIT|ROLLBACK)\s+TRANSACTION\b', r'\1', sql, flags=re.IGNORECASE)
+    sql = _rewrite_date_calls(sql)
+    sql = re.sub(r'@(\w+)', r'$\1', sql)
+
+    return re.sub(r'\x00(\d+)\x00', lambda match: literals[int(match.group(1))], sql).strip()
+
+
+def _parameter_value(type_, value):
+    """Python value DuckDB binds with the parameter's BigQuery type"""
+    if isinstance(value, str) and type_ == 'DATE':
+        return date.fromisoformat(value)
+    if isinstance(value, str) and type_ == 'TIMESTAMP':
+        return datetime.fromisoformat(value)
+    return value
+
+
+def query_parameters(sql, job_config):
+    """{name: value} of the query parameters a translated statement uses"""
+    parameters = {}
+    for parameter in getattr(job_config, 'query_parameters', None) or []:
+        if not re.search(rf'\${parameter.name}\b', sql):
+            continue
+        if hasattr(parameter, 'values'):
+            parameters[parameter.name] = [_parameter_value(parameter.array_type, v) for v in parameter.values]
+        else:
+            parameters[parameter.name] = _parameter_value(parameter.type_, parameter.value)
+    return parameters
+
+
+# ============================================================================
+# Client
+# ============================================================================
+
+class LocalRow(dict):
+    """Result row readable by column name or position, like bigquery.Row"""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+class LocalRows(list):
+    """Query result with total_rows, like bigquery's RowIterator (rows
+    written to a destination table are counted, not kept)"""
+
+    def __init__(self, rows=(), total_rows=None):
+        super().__init__(rows)
+        self._total_rows = total_rows
+
+    @property
+    def total_rows(self):
+        return len(self) if self._total_rows is None else self._total_rows
+
+
+class LocalJob:
+    """A finished local query with the job attributes the pipeline reads"""
+
+    def __init__(self, query, statement_type, parent_job_id=None, job_id=None):
+        self.job_id = job_id or f"local_{uuid.uuid4().hex}"
+        self.state = 'DONE'
+        self.query = query
+        self.statement_type = statement_type
+        self.parent_job_id = parent_job_id
+        self.created = self.started = self.ended = datetime.now(timezone.utc)
+        self.rows = LocalRows()
+        self.num_dml_affected_rows = None
+        self.error_result = None
+        self.total_bytes_processed = None
+        self.total_bytes_billed = None
+        self.session_info = None
+        self.slot_millis = None
+        self.cache_hit = False
+        self.query_plan = []
+
+    def result(self):
+        if self.error_result:
+            error = NotFound if self.error_result['reason'] == 'notFound' else BadRequest
+            raise error(self.error_result['message'])
+        return self.rows
+
+
+class LocalTable:
+    """Table metadata, like bigquery.Table"""
+
+    def __init__(self, table_id, num_rows, modified):
+        self.table_id = table_id
+        self.num_rows = num_rows
+        self.modified = modified
+
+
+def _load_spatial(conn, duckdb):
+    """Load the spatial extension: installed, from the duckdb-extension-spatial
+    package, or downloaded"""
+    try:
+        conn.execute("LOAD spatial")
+        return
+    except duckdb.Error:
+        pass
+    try:
+        import duckdb_extension_spatial
+        pattern = os.path.join(os.path.dirname(duckdb_extension_spatial.__file__), 'extensions',
+                               f"v{duckdb.__version__}", 'spatial.duckdb_extension')
+        conn.execute(f"INSTALL '{glob.glob(pattern)[0]}'")
+    except (ImportError, IndexError):
+        conn.execute("INSTALL spatial")
+    conn.execute("LOAD spatial")
+
+
+class DuckDBClient:
+    """Runs the pipeline's BigQuery SQL against a local DuckDB database
+
+    Jobs run one at a time (a lock serializes the DAG's threads); DuckDB
+    parallelizes each query itself. Jobs finish inside query(), and failed
+    jobs raise from result() like BigQuery jobs.
+    """
+
+    backend = "duckdb"
+
+    def __init__(self, database, project="local"):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError("The duckdb backend needs duckdb: pip install -r requirements-local.txt")
+
+        self._duckdb = duckdb
+        self.project = project
+        self.database = database
+        self.conn = duckdb.connect(database)
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._children = {}
+        self.conn.execute("SET TimeZone = 'UTC'")
+        _load_spatial(self.conn, duckdb)
+        self.conn.execute("CREATE SCHEMA IF NOT EXISTS local_meta")
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {META_TABLE} (
+              table_id VARCHAR PRIMARY KEY, modified TIMESTAMPTZ, fixture_modified TIMESTAMPTZ
+            )
+        """)
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PARTITIONS_TABLE} (
+              table_schema VARCHAR, table_name VARCHAR, partition_id VARCHAR, total_rows BIGINT,
+              last_modified_time TIMESTAMPTZ, PRIMARY KEY (table_schema, table_name, partition_id)
+            )
+        """)
+        self.conn.execute("CREATE OR REPLACE TEMP MACRO parse_date(format, value) AS CAST(strptime(value, format) AS DATE)")
+        self.conn.execute("""
+            CREATE OR REPLACE TEMP MACRO date_trunc_week(value) AS
+              CAST(value AS DATE) - CAST(dayofweek(CAST(value AS DATE)) AS INTEGER)
+        """)
+        self.conn.execute("CREATE OR REPLACE TEMP MACRO safe_divide(x, y) AS CASE WHEN y = 0 THEN NULL ELSE x / y END")
+        self.conn.execute("CREATE OR REPLACE TEMP MACRO date_add(value, step) AS CAST(value + step AS DATE)")
+        self.conn.execute("CREATE OR REPLACE TEMP MACRO date_sub(value, step) AS CAST(value - step AS DATE)")
+
+    @staticmethod
+    def local_name(table_id):
+        """dataset.table of a project.dataset.table id"""
+        return ".".join(table_id.split(".")[-2:])
+
+    def _exists(self, name):
+        schema, table = name.split(".")
+        return bool(self.conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+            [schema, table]
+        ).fetchone()[0])
+
+    def _touch(self, name, modified=None, fixture_modified=None):
+        """Record a table's last-modified time (and that of its fixture file)"""
+        self.conn.execute(f"""
+            INSERT INTO {META_TABLE} VALUES (?, ?, ?)
+            ON CONFLICT (table_id) DO UPDATE SET
+              modified = excluded.modified,
+              fixture_modified = COALESCE(excluded.fixture_modified, {META_TABLE}.fixture_modified)
+        """, [name, modified or datetime.now(timezone.utc), fixture_modified])
+
+    def _run_statement(self, statement, job_config, parent_job_id=None):
+        """Translate and execute one statement as a (child) job"""
+        keyword = statement_keyword(statement)
+        job = LocalJob(statement, STATEMENT_TYPES.get(keyword, keyword), parent_job_id)
+        _, writes = statement_tables(statement)
+        created = {name for name in map(self.local_name, writes) if keyword == 'CREATE' and not self._exists(name)}
+
+        job.started = datetime.now(timezone.utc)
+        try:
+            sql = translate_sql(statement)
+            for schema in {name.split(".")[0] for name in map(self.local_name, writes)}:
+                self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+            cursor = self.conn.execute(sql, query_parameters(sql, job_config))
+            if keyword in ('SELECT', 'WITH'):
+                columns = [column[0] for column in cursor.description]
+                job.rows = LocalRows(LocalRow(zip(columns, row)) for row in cursor.fetchall())
+            elif keyword in DML:
+                job.num_dml_affected_rows = cursor.fetchone()[0]
+        except Exception as e:
+            reason = 'notFound' if isinstance(e, self._duckdb.CatalogException) else 'invalidQuery'
+            job.error_result = {'reason': reason, 'message': str(e)}
+        job.ended = datetime.now(timezone.utc)
+
+        if not job.error_result:
+            for name in map(self.local_name, writes):
+                if name in created or job.num_dml_affected_rows:
+                    self._touch(name)
+        return job
+
+    def _write_partition(self, statement, job_config):
+        """Run a SELECT whose result replaces one partition of its destination
+
+        Like BigQuery, the job fails if a row falls outside the partition, and
+        the first write creates the table.
+        """
+        table_id, _, decorator = str(job_config.destination).partition('$')
+        name = self.local_name(table_id)
+        column = job_config.time_partitioning.field
+        day = datetime.strptime(decorator, '%Y%m%d').date()
+        job = LocalJob(statement, 'SELECT')
+        try:
+            sql = translate_sql(statement)
+            self.conn.execute(f"CREATE OR REPLACE TEMP TABLE partition_rows AS {sql}", query_parameters(sql, job_config))
+            outside = self.conn.execute(
+                f"SELECT COUNT(*) FROM partition_rows WHERE {column} IS DISTINCT FROM ?", [day]
+            ).fetchone()[0]
+            if outside:
+                raise ValueError(f"{outside} rows do not belong to partition {decorator} of {table_id}")
+            self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {name.split('.')[0]}")
+            self.conn.execute("BEGIN TRANSACTION")
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM partition_rows LIMIT 0")
+            self.conn.execute(f"DELETE FROM {name} WHERE {column} = ?", [day])
+            written = self.conn.execute(f"INSERT INTO {name} SELECT * FROM partition_rows").fetchone()[0]
+            self.conn.execute(f"""
+                INSERT INTO {PARTITIONS_TABLE} VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT DO UPDATE SET
+                  total_rows = excluded.total_rows, last_modified_time = excluded.last_modified_time
+            """, [*name.split('.'), decorator, written, datetime.now(timezone.utc)])
+            self.conn.execute("COMMIT")
+            job.rows = LocalRows(total_rows=written)
+            self._touch(name)
+        except Exception as e:
+            try:
+                self.conn.execute("ROLLBACK")
+            except Exception:
+                pass  # no transaction open
+            reason = 'notFound' if isinstance(e, self._duckdb.CatalogException) else 'invalidQuery'
+            job.error_result = {'reason': reason, 'message': str(e)}
+        job.ended = datetime.now(timezone.utc)
+        return job
+
+    def query(self, sql, job_config=None, location=None, job_id=None):
+        """Run a statement or a script (one child job per statement)
+
+        Dry runs only translate the SQL; they process no bytes. Reusing a
+        job_id of this client raises Conflict, like BigQuery.
+        """
+        statements = split_sql_statements(sql)
+        if getattr(job_config, 'dry_run', False) is True:
+            job = LocalJob(sql, STATEMENT_TYPES.get(statement_keyword(sql), statement_keyword(sql)))
+            job.total_bytes_processed = 0
+            for statement in statements:
+                translate_sql(statement)
+            return job
+
+        with self._lock:
+            if job_id in self._jobs:
+                raise Conflict(f"Already Exists: Job {job_id}")
+            if re.fullmatch(r'\s*CALL\s+BQ\.ABORT_SESSION\s*\(\s*\)\s*;?\s*', sql, re.IGNORECASE):
+                return self._abort_session()
+            if getattr(job_config, 'destination', None):
+                job = self._write_partition(statements[0], job_config)
+                if job_id:
+                    job.job_id = job_id
+                self._jobs[job.job_id] = job
+                return job
+            if len(statements) == 1:
+                job = self._run_statement(statements[0], job_config)
+                if job_id:
+                    job.job_id = job_id
+                if getattr(job_config, 'create_session', False) is True:
+                    job.session_info = SimpleNamespace(session_id=f"local_session_{uuid.uuid4().hex}")
+                self._jobs[job.job_id] = job
+                return job
+
+            job = LocalJob(sql, 'SCRIPT', job_id=job_id)
+            children = []
+            for statement in statements:
+                child = self._run_statement(statement, job_config, parent_job_id=job.job_id)
+                children.append(child)
+                if child.error_result:
+                    job.error_result = child.error_result
+                    try:
+                        self.conn.execute("ROLLBACK")
+                    except Exception:
+                        pass  # no transaction open
+                    break
+            job.ended = datetime.now(timezone.utc)
+            self._jobs[job.job_id] = job
+            self._children[job.job_id] = children
+            return job
+
+    def _abort_session(self):
+        """Drop the temp tables (the session's, as far as BigQuery SQL goes)"""
+        job = LocalJob("CALL BQ.ABORT_SESSION()", 'SCRIPT')
+        for (table,) in self.conn.execute("SELECT table_name FROM duckdb_tables() WHERE temporary").fetchall():
+            self.conn.execute(f'DROP TABLE temp."{table}"')
+        self._jobs[job.job_id] = job
+        return job
+
+    def get_job(self, job_id, location=None):
+        """A job run by this client"""
+        if job_id not in self._jobs:
+            raise NotFound(f"Not found: Job {job_id}")
+        return self._jobs[job_id]
+
+    def list_jobs(self, parent_job=None):
+        """Child jobs of a script job"""
+        return list(self._children.get(parent_job, []))
+
+    def get_table(self, table_id):
+        """Row count and last-modified time of a table"""
+        name = self.local_name(table_id)
+        with self._lock:
+            if not self._exists(name):
+                raise NotFound(f"Not found: Table {table_id}")
+            num_rows = self.conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+            modified = self.conn.execute(f"SELECT modified FROM {META_TABLE} WHERE table_id = ?", [name]).fetchone()
+        return LocalTable(table_id, num_rows, modified[0] if modified else None)
+
+    def load_fixtures(self, directory):
+        """Load <dataset>/<table>.parquet files whose file changed since they
+        were last loaded; return the names of the loaded tables"""
+        loaded = []
+        with self._lock:
+            for path in sorted(glob.glob(os.path.join(directory, '*', '*.parquet'))):
+                schema = os.path.basename(os.path.dirname(path))
+                name = f"{schema}.{os.path.splitext(os.path.basename(path))[0]}"
+                mtime = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+                stored = self.conn.execute(
+                    f"SELECT fixture_modified FROM {META_TABLE} WHERE table_id = ?", [name]
+                ).fetchone()
+                if stored and stored[0] == mtime and self._exists(name):
+                    continue
+
+                columns = dict(row[:2] for row in self.conn.execute(
+                    "DESCRIBE SELECT * FROM read_parquet(?)", [path]
+                ).fetchall())
+                replace = ", ".join(f"ST_GeomFromText({column}) AS {column}"
+                                    for column, type_ in columns.items() if column == 'geometry' and type_ == 'VARCHAR')
+                select = f"* REPLACE ({replace})" if replace else "*"
+                self.conn.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                self.conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT {select} FROM read_parquet('{path}')")
+                self._touch(name, fixture_modified=mtime)
+                loaded.append(name)
+        return loaded
+
+
+# ============================================================================
+# Synthetic fixtures
+# ============================================================================
+
+# Chicago bounding box (matches the bronze coordinate filters)
+MIN_LON, MAX_LON, MIN_LAT, MAX_LAT = -87.95, -87.5, 41.6, 42.1
+
+# Trip start dates of the trips fixtures: the last TRIP_DAYS days
+TRIP_DAYS = 90
+
+PERMIT_TYPES = [
+    'PERMIT - NEW CONSTRUCTION', 'PERMIT - RENOVATION/ALTERATION', 'PERMIT - WRECKING/DEMOLITION',
+    'PERMIT - ELECTRIC WIRING', 'PERMIT - EASY PERMIT PROCESS', 'PERMIT - SIGNS',
+]
+
+
+def _grid(columns, rows):
+    """Query of rectangular WKT polygons covering the bounding box"""
+    return f"""
+        SELECT
+          r * {columns} + c AS cell,
+          printf('POLYGON((%f %f, %f %f, %f %f, %f %f, %f %f))',
+                 x0, y0, x1, y0, x1, y1, x0, y1, x0, y0) AS geometry
+        FROM (
+          SELECT r, c,
+            {MIN_LON} + c * {(MAX_LON - MIN_LON) / columns} AS x0,
+            {MIN_LON} + (c + 1) * {(MAX_LON - MIN_LON) / columns} AS x1,
+            {MIN_LAT} + r * {(MAX_LAT - MIN_LAT) / rows} AS y0,
+            {MIN_LAT} + (r + 1) * {(MAX_LAT - MIN_LAT) / rows} AS y1
+          FROM range({rows}) t(r), range({columns}) u(c)
+        )
+    """
+
+
+def generate_fixtures(directory, permits, until, seed, trips=20000):
+    """Write synthetic source tables (and empty gold tables) as Parquet
+
+    Permit i always gets the same attributes for a given seed (issue dates
+    spread from 2020 to today); until only drops later issue dates, so
+    fixtures for consecutive dates simulate a daily extraction. Bronze taxi
+    and TNP trips (trips of each) start in the last TRIP_DAYS days, likewise
+    cut off at until.
+    """
+    import duckdb
+
+    conn = duckdb.connect()
+    conn.execute("SET TimeZone = 'UTC'")
+    for dataset in ('raw_data', 'reference_data', 'silver_data', 'bronze_data', 'gold_data'):
+        os.makedirs(os.path.join(directory, dataset), exist_ok=True)
+
+    def write(relation_sql, dataset, table, keep_existing=False):
+        path = os.path.join(directory, dataset, f"{table}.parquet")
+        if keep_existing and os.path.exists(path):
+            return
+        conn.execute(f"COPY ({relation_sql}) TO '{path}' (FORMAT PARQUET)")
+        print(f"  ✓ {dataset}.{table}: {conn.execute(f'SELECT COUNT(*) FROM read_parquet(?)', [path]).fetchone()[0]:,} rows")
+
+    h = lambda key: f"CAST(hash(i, {seed}, '{key}') >> 1 AS BIGINT)"
+    days = (date.today() - date(2020, 1, 1)).days + 1
+    permit_types = "[" + ", ".join(f"'{t}'" for t in PERMIT_TYPES) + "]"
+
+    print(f"\n🏗️  Generating fixtures in {directory} ({permits:,} permits through {until})")
+    write(f"""
+        SELECT
+          CAST(3000000 + i AS VARCHAR) AS id,
+          printf('100%07d', i) AS permit_,
+          ['ACTIVE', 'COMPLETE', 'EXPIRED'][1 + {h('status')} % 3] AS permit_status,
+          {permit_types}[1 + {h('type')} % {len(PERMIT_TYPES)}] AS permit_type,
+          CAST(issue_date - INTERVAL (processing_time) DAY AS TIMESTAMP) AS application_start_date,
+          CAST(issue_date AS TIMESTAMP) AS issue_date,
+          processing_time,
+          CAST(100 + {h('number')} % 9900 AS BIGINT) AS street_number,
+          ['N', 'S', 'E', 'W'][1 + {h('direction')} % 4] AS street_direction,
+          printf('STREET %d', {h('street')} % 500) AS street_name,
+          CASE WHEN {h('work')} % 10 = 0 THEN 'NEW CONSTRUCTION' END AS work_type,
+          'SYNTHETIC PERMIT' AS work_description,
+          CAST(NULL AS VARCHAR) AS permit_condition,
+          ROUND(({h('fee')} % 500000) / 100.0, 2) AS total_fee,
+          -- Costs repeat (round amounts), like real declared costs
+          CAST((1 + {h('cost')} % 400) * 250 AS DOUBLE) AS reported_cost,
+          printf('%014d', {h('pin')} % 100000000000000) AS pin_list,
+          CAST(1 + {h('area')} % 77 AS BIGINT) AS community_area,
+          -- 1% of permits have no coordinates (dropped by bronze)
+          CASE WHEN {h('missing')} % 100 > 0
+            THEN {MIN_LAT + 0.05} + ({h('lat')} % 100000) / 100000.0 * {MAX_LAT - MIN_LAT - 0.1} END AS latitude,
+          CASE WHEN {h('missing')} % 100 > 0
+            THEN {MIN_LON + 0.05} + ({h('lon')} % 100000) / 100000.0 * {MAX_LON - MIN_LON - 0.1} END AS longitude
+        FROM (
+          SELECT i,
+            DATE '2020-01-01' + CAST({h('issue')} % {days} AS INTEGER) AS issue_date,
+            CAST({h('processing')} % 120 AS BIGINT) AS processing_time
+          FROM range({permits}) t(i)
+        )
+        WHERE issue_date <= DATE '{until}'
+    """, 'raw_data', 'raw_building_permits')
+
+    for table, shared, pooled in (
+        ('bronze_taxi_trips', "CAST(NULL AS BOOLEAN)", "0"),
+        ('bronze_tnp_trips', f"{h('shared')} % 5 = 0", f"CASE WHEN {h('shared')} % 5 = 0 THEN 2 ELSE 1 END"),
+    ):
+        write(f"""
+            SELECT
+              printf('{table[7:10]}-%09d', i) AS trip_id,
+              trip_start_timestamp,
+              trip_start_timestamp + INTERVAL (trip_seconds) SECOND AS trip_end_timestamp,
+              trip_seconds,
+              ROUND(trip_seconds / 240.0, 2) AS trip_miles,
+              CAST(1 + {h('pickup_area')} % 77 AS BIGINT) AS pickup_community_area,
+              CAST(1 + {h('dropoff_area')} % 77 AS BIGINT) AS dropoff_community_area,
+              ROUND(3.25 + trip_seconds / 60.0 * 0.45, 2) AS fare,
+              {shared} AS shared_trip_authorized,
+              CAST({pooled} AS BIGINT) AS trips_pooled,
+              ROUND({MIN_LAT + 0.05} + ({h('pickup_lat')} % 100000) / 100000.0 * {MAX_LAT - MIN_LAT - 0.1}, 6)
+                AS pickup_centroid_latitude,
+              ROUND({MIN_LON + 0.05} + ({h('pickup_lon')} % 100000) / 100000.0 * {MAX_LON - MIN_LON - 0.1}, 6)
+                AS pickup_centroid_longitude,
+              ROUND({MIN_LAT + 0.05} + ({h('dropoff_lat')} % 100000) / 100000.0 * {MAX_LAT - MIN_LAT - 0.1}, 6)
+                AS dropoff_centroid_latitude,
+              ROUND({MIN_LON + 0.05} + ({h('dropoff_lon')} % 100000) / 100000.0 * {MAX_LON - MIN_LON - 0.1}, 6)
+                AS dropoff_centroid_longitude,
+              CAST(DATE '{until}' AS TIMESTAMPTZ) AS extracted_at
+            FROM (
+              SELECT i,
+                CAST(DATE '{date.today() - timedelta(days=TRIP_DAYS - 1)}' AS TIMESTAMPTZ)
+                  + INTERVAL ({h('start')} % {TRIP_DAYS * 86400}) SECOND AS trip_start_timestamp,
+                CAST(60 + {h('duration')} % 3600 AS BIGINT) AS trip_seconds
+              FROM range({trips}) t(i)
+            )
+            WHERE CAST(trip_start_timestamp AS DATE) <= DATE '{until}'
+        """, 'bronze_data', table)
+
+    write(f"SELECT CAST(60601 + cell AS BIGINT) AS zip, geometry FROM ({_grid(8, 6)})",
+          'reference_data', 'zip_code_boundaries')
+    write(f"SELECT printf('Neighborhood %02d', cell + 1) AS pri_neigh, geometry FROM ({_grid(4, 4)})",
+          'reference_data', 'neighborhood_boundaries')
+
+    write(f"""
+        SELECT
+          CAST(60601 + i AS VARCHAR) AS zip_code,
+          CAST(10000 + {h('population')} % 60000 + w * 10 AS BIGINT) AS population,
+          DATE '2020-03-02' + CAST(w * 7 AS INTEGER) AS week_start
+        FROM range(48) t(i), range(52) u(w)
+    """, 'silver_data', 'silver_covid_weekly_historical')
+    write(f"""
+        SELECT CAST(60601 + (i * 5 + k) % 48 AS VARCHAR) AS zip_code,
+               CAST(i AS BIGINT) AS community_area_number,
+               [0.6, 0.4][k + 1] AS pct_of_zip
+        FROM range(1, 78) t(i), range(2) u(k)
+    """, 'reference_data', 'crosswalk_community_zip')
+    write(f"""
+        SELECT CAST(i AS BIGINT) AS community_area,
+               CAST(12000 + {h('income')} % 70000 AS DOUBLE) AS per_capita_income
+        FROM range(1, 78) t(i)
+    """, 'bronze_data', 'bronze_public_health')
+
+    # Empty gold tables (the gold SQL does not create them); not rewritten when
+    # fixtures are regenerated, which would reset the database's gold tables
+    write("""
+        SELECT CAST(NULL AS VARCHAR) AS zip_code, CAST(NULL AS BIGINT) AS total_permits,
+               CAST(NULL AS DOUBLE) AS total_permit_value, CAST(NULL AS DOUBLE) AS avg_permit_value,
+               CAST(NULL AS TIMESTAMPTZ) AS created_at
+        LIMIT 0
+    """, 'gold_data', 'gold_permits_roi', keep_existing=True)
+    write("""
+        SELECT CAST(NULL AS VARCHAR) AS zip_code, CAST(NULL AS BIGINT) AS population,
+               CAST(NULL AS DOUBLE) AS per_capita_income, CAST(NULL AS DOUBLE) AS inverted_income_index,
+               CAST(NULL AS BIGINT) AS total_permits_new_construction,
+               CAST(NULL AS DOUBLE) AS inverted_new_construction_index,
+               CAST(NULL AS BIGINT) AS total_permits_construction, CAST(NULL AS DOUBLE) AS inverted_permits_index,
+               CAST(NULL AS DOUBLE) AS median_permit_value, CAST(NULL AS DOUBLE) AS permit_value_index,
+               CAST(NULL AS DOUBLE) AS eligibility_index, CAST(NULL AS BOOLEAN) AS is_loan_eligible,
+               CAST(NULL AS TIMESTAMPTZ) AS created_at
+        LIMIT 0
+    """, 'gold_data', 'gold_loan_targets', keep_existing=True)
+    print(f"✅ Fixtures written to {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local DuckDB backend for the permits pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fixtures = subparsers.add_parser("fixtures", help="Generate synthetic Parquet fixtures")
+    fixtures.add_argument("directory", help="Output directory (<dataset>/<table>.parquet)")
+    fixtures.add_argument("--permits", type=int, default=100000, help="Raw permits to generate (default 100000)")
+    fixtures.add_argument("--until", type=date.fromisoformat, default=date.today(),
+                          help="Latest issue date (YYYY-MM-DD, default today)")
+    fixtures.add_argument("--trips", type=int, default=20000,
+                          help="Bronze taxi and TNP trips to generate, each (default 20000)")
+    fixtures.add_argument("--seed", type=int, default=0, help="Random seed (default 0)")
+    args = parser.parse_args()
+
+    generate_fixtures(args.directory, args.permits, args.until, args.seed, args.trips)
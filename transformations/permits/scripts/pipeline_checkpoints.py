@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Checkpoints and resume
+Purpose: Continue a failed run from its first incomplete statement instead of
+         rerunning every layer from the bronze MERGE
+
+While a run executes, the progress of each SQL node is kept in pipeline state
+(kind 'checkpoint', one row per node): run id, statements completed and their
+job ids, the query parameters the node resolved and the fingerprint of its
+input tables when it started. With --resume, the failed run's checkpoints are
+reused for every node whose SQL and inputs are unchanged (and whose inputs no
+earlier node rewrites in this run): completed statements are skipped and the
+rest run with the same parameters (e.g. silver's @enriched_at, which ties its
+staged changes to the MERGE that applies them).
+
+Job ids are deterministic: run id, node, statement index and a hash of the
+SQL, the node's inputs and its parameters. A resubmitted statement whose job
+already exists attaches to it when it is still running or succeeded, so a
+retry never runs the same statement twice; a job that failed is resubmitted
+as <job id>_retry1, _retry2, ...
+"""
+
+import re
+import json
+import logging
+
+from google.api_core.exceptions import Conflict
+
+from pipeline_state import delete_state, load_state, save_state, sql_hash, table_fingerprint
+from pipeline_telemetry import statement_hash
+from pipeline_watermarks import query_parameter
+
+logger = logging.getLogger(__name__)
+
+# Resubmissions of a statement whose previous jobs failed
+MAX_JOB_ATTEMPTS = 5
+
+
+def make_job_id(run_id, node_name, index, statement, salt=""):
+    """Deterministic job id of one statement (or script) of a run"""
+    node = re.sub(r'[^A-Za-z0-9]+', '_', node_name).strip('_').lower()
+    return f"permits_{run_id}_{node}_{index}_{statement_hash(salt + statement)[:8]}"
+
+
+def submit_query(client, sql, job_config, job_id, location):
+    """Start a query under a deterministic job id, attaching to an existing
+    job of that id unless it failed"""
+    for attempt in range(MAX_JOB_ATTEMPTS):
+        candidate = job_id if attempt == 0 else f"{job_id}_retry{attempt}"
+        try:
+            return client.query(sql, job_config=job_config, location=location, job_id=candidate)
+        except Conflict:
+            job = client.get_job(candidate, location=location)
+            if job.state != 'DONE' or not job.error_result:
+                logger.info(f"    ↺ Attached to existing job {candidate} ({job.state})")
+                return job
+    raise RuntimeError(f"Job {job_id} failed {MAX_JOB_ATTEMPTS} times")
+
+
+def node_inputs(node):
+    """Tables a node reads but does not write itself"""
+    return node.reads - node.writes
+
+
+def _parameters_state(parameters):
+    return [
+        {'name': p.name, 'type': f"ARRAY<{p.array_type}>", 'value': list(p.values)} if hasattr(p, 'values')
+        else {'name': p.name, 'type': p.type_, 'value': p.value}
+        for p in parameters or []
+    ]
+
+
+def _parameters(state):
+    return [query_parameter(p['name'], p['type'], p['value']) for p in state]
+
+
+class NodeCheckpoint:
+    """Progress of one SQL node in one run, saved after each completed
+    statement (statement mode) or script job (script mode)"""
+
+    def __init__(self, client, run_id, node, location, stored=None, parameters=None):
+        self.client = client
+        self.run_id = run_id
+        self.node = node
+        self.location = location
+        if stored:
+            self.completed = stored['completed']
+            self.job_ids = list(stored['job_ids'])
+            self.inputs = stored['inputs']
+            self.parameters = _parameters(stored['parameters'])
+        else:
+            self.completed = 0
+            self.job_ids = []
+            self.inputs = {table: table_fingerprint(client, table) for table in sorted(node_inputs(node))}
+            self.parameters = parameters
+
+    @property
+    def first(self):
+        """1-based index of the first statement still to run"""
+        return self.completed + 1
+
+    def job_id(self, index, statement):
+        """Job id of a statement; a node restarted with other inputs or
+        parameters gets new ids instead of attaching to its old jobs"""
+        salt = json.dumps([self.inputs, _parameters_state(self.parameters)], sort_keys=True, default=str)
+        return make_job_id(self.run_id, self.node.name, index, statement, salt)
+
+    def statements_done(self, job_ids):
+        """Record the next len(job_ids) statements as completed"""
+        if not job_ids:
+            return
+        self.completed += len(job_ids)
+        self.job_ids += job_ids
+        try:
+            save_state(self.client, 'checkpoint', self.node.name, {
+                'run_id': self.run_id,
+                'sql': sql_hash(self.node.statements),
+                'completed': self.completed,
+                'job_ids': self.job_ids,
+                'inputs': self.inputs,
+                'parameters': _parameters_state(self.parameters),
+            }, self.location)
+        except Exception as e:
+            logger.warning(f"⚠ Could not save checkpoint of {self.node.name} (a resume reruns it): {str(e)}")
+
+
+def load_checkpoints(client, location):
+    """Return (run id, {node name: checkpoint}) of the last checkpointed run"""
+    checkpoints = load_state(client, 'checkpoint', location)
+    if not checkpoints:
+        return None, {}
+    run_id = max(checkpoint['run_id'] for checkpoint in checkpoints.values())
+    return run_id, {name: checkpoint for name, checkpoint in checkpoints.items() if checkpoint['run_id'] == run_id}
+
+
+def clear_checkpoints(client, location):
+    """Forget the checkpoints of previous runs"""
+    delete_state(client, 'checkpoint', location)
+
+
+def plan_resume(client, nodes, checkpoints):
+    """Checkpoints that are still valid for this run's SQL nodes
+
+    A checkpoint is valid when the node's SQL is unchanged, its input tables
+    match the fingerprint taken when it started, and no earlier node that
+    runs statements in this run writes one of its inputs.
+    """
+    valid = {}
+    written_this_run = set()
+    for node in [node for node in nodes if node.kind == "sql"]:
+        checkpoint = checkpoints.get(node.name)
+        inputs = node_inputs(node)
+        if (
+            checkpoint
+            and checkpoint['sql'] == sql_hash(node.statements)
+            and not inputs & written_this_run
+            and checkpoint['inputs'] == {table: table_fingerprint(client, table) for table in sorted(inputs)}
+        ):
+            valid[node.name] = checkpoint
+        if node.name not in valid or checkpoint['completed'] < len(node.statements):
+            written_this_run |= node.writes
+    return valid
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Dry-run cost estimation
+Purpose: Estimate bytes processed per statement before running the pipeline,
+         and enforce a byte budget
+
+Every statement is dry-run (free, nothing executes). Session temp tables do
+not exist at dry-run time: a statement creating one is estimated by its
+query, and a statement reading one by its text with the temp table replaced
+by that query (an upper bound, the sources are counted again). Statements
+whose tables do not exist yet (first run, before CREATE TABLE IF NOT EXISTS)
+cannot be estimated and are reported as unknown; the budget check warns
+that it does not cover them.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud import bigquery
+
+from pipeline_dag import inline_session_tables, session_tables, statement_keyword
+from pipeline_watermarks import statement_parameters
+
+logger = logging.getLogger(__name__)
+
+
+def format_bytes(num_bytes):
+    """Human-readable byte count (None -> 'unknown')"""
+    if num_bytes is None:
+        return "unknown"
+    value = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if value < 1024 or unit == "TB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.2f} {unit}"
+        value /= 1024
+
+
+def estimate_statement_bytes(client, statement, location, parameters=None):
+    """Dry-run one statement and return its estimated bytes processed
+
+    Returns None if BigQuery cannot plan the statement (e.g. missing table,
+    or a session temp table created by another node).
+    """
+    if session_tables(statement):
+        logger.info("    ⏭ Reads session temp tables of another node, estimate unknown")
+        return None
+    job_config = bigquery.QueryJobConfig(
+        dry_run=True, use_query_cache=False,
+        query_parameters=statement_parameters(statement, parameters)
+    )
+    try:
+        job = client.query(statement, job_config=job_config, location=location)
+        return job.total_bytes_processed or 0
+    except Exception as e:
+        logger.warning(f"    ⚠ Dry run failed, estimate unknown: {str(e).splitlines()[0]}")
+        return None
+
+
+def estimate_nodes(client, nodes, location, max_concurrency):
+    """Dry-run every statement of every node concurrently
+
+    Returns {node name: [estimated bytes per statement]}. Statements are
+    dry-run with their node's (plan-time) query parameters, with the node's
+    session temp tables inlined.
+    """
+    work = [(node, statement) for node in nodes for statement in inline_session_tables(node.statements)]
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        estimates = list(pool.map(
+            lambda item: estimate_statement_bytes(client, item[1], location, item[0].parameters), work
+        ))
+
+    by_node = {node.name: [] for node in nodes}
+    for (node, _), estimate in zip(work, estimates):
+        by_node[node.name].append(estimate)
+    return by_node
+
+
+def report_estimates(nodes, estimates, layer_names):
+    """Log estimates per statement and per layer; return the known total and
+    the number of statements that could not be estimated"""
+    logger.info("Estimated bytes processed (dry run):")
+    for layer_name in layer_names:
+        layer_total = 0
+        for node in [n for n in nodes if n.layer == layer_name]:
+            for i, (statement, estimate) in enumerate(zip(node.statements, estimates[node.name]), 1):
+                logger.info(f"  {node.name} statement {i} ({statement_keyword(statement)}): {format_bytes(estimate)}")
+                layer_total += estimate or 0
+        logger.info(f"  → {layer_name} total: {format_bytes(layer_total)}")
+
+    total = sum(estimate or 0 for node_estimates in estimates.values() for estimate in node_estimates)
+    unknown = sum(estimate is None for node_estimates in estimates.values() for estimate in node_estimates)
+    logger.info(f"  → PIPELINE total: {format_bytes(total)}" + (f" ({unknown} not estimable)" if unknown else ""))
+    return total, unknown
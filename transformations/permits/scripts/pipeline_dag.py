@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Dependency-aware executor
+Purpose: Run pipeline statements and stats queries concurrently where the
+         tables they read and write allow it
+
+Every node declares the tables it reads and writes (SQL nodes infer them from
+their backtick-quoted table references). A node depends on every earlier node
+it conflicts with:
+
+  write-after-write   both write the same table
+  read-after-write    it reads a table the earlier node writes
+  write-after-read    it writes a table the earlier node reads
+
+so declaration order is kept wherever it matters, and everything else (stats
+queries, independent gold aggregates, other datasets, forecasting scripts)
+runs in parallel up to a global concurrency limit and, optionally, a limit
+per pipeline (manifest).
+
+One asyncio event loop schedules the nodes: a node whose run is a coroutine
+function (a script run as a subprocess) is awaited on the loop, any other
+runs in a worker thread (the BigQuery client blocks on its jobs). A node
+starts as soon as the nodes it depends on finish, so the run takes about as
+long as its longest dependency chain.
+
+Session temp tables (_SESSION.<name>, see pipeline_sessions.py) are not
+tables of the DAG: the statements of a layer that share one are grouped into
+one node, and the session runs them one job at a time. An intermediate that
+statements of different chains read (e.g. the ZIPs both gold permits MERGEs
+recompute) is a staging table instead: CREATE OR REPLACE TABLE with an
+expiration_timestamp option. Its readers are separate nodes that depend on
+the node creating it, so they still run concurrently.
+"""
+
+import re
+import asyncio
+import inspect
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+TABLE_REF = re.compile(r'`([\w-]+\.\w+\.\w+)`')
+WRITE_TARGET = re.compile(
+    r'^\s*(?:CREATE\s+(?:OR\s+REPLACE\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+    r'|MERGE\s+(?:INTO\s+)?'
+    r'|INSERT\s+(?:INTO\s+)?'
+    r'|DELETE\s+(?:FROM\s+)?'
+    r'|UPDATE\s+'
+    r'|TRUNCATE\s+TABLE\s+)'
+    r'`([^`]+)`',
+    re.IGNORECASE
+)
+SESSION_TABLE_REF = re.compile(r'\b_SESSION\.(\w+)', re.IGNORECASE)
+TEMP_TABLE_TARGET = re.compile(
+    r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?TEMP(?:ORARY)?\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+    r'_SESSION\.(\w+)\s+AS\s+',
+    re.IGNORECASE
+)
+STAGING_TABLE_TARGET = re.compile(
+    r'^\s*CREATE\s+OR\s+REPLACE\s+TABLE\s+`([^`]+)`(?:(?!\bAS\b)[\s\S])*?\bexpiration_timestamp\b',
+    re.IGNORECASE
+)
+
+# Kinds of nodes that do a layer's work; stats and state nodes report on it
+WORK_KINDS = ("sql", "command")
+
+
+@dataclass
+class Node:
+    """One unit of work in the pipeline DAG (kind: sql, command, stats or
+    state); pipeline names the manifest it belongs to"""
+    name: str
+    layer: str
+    run: callable
+    kind: str = "sql"
+    reads: set = field(default_factory=set)
+    writes: set = field(default_factory=set)
+    statements: list = field(default_factory=list)
+    command: list = field(default_factory=list)
+    parameters: list = field(default_factory=list)
+    depends_on: set = field(default_factory=set)
+    pipeline: str = None
+    result: object = None
+
+
+class UnschedulableNodesError(Exception):
+    """Nodes left pending with nothing running: a dependency is not in the DAG
+    (e.g. pruned) or the dependencies form a cycle"""
+
+    def __init__(self, pending, completed):
+        done_names = {node.name for node in completed}
+        waits = "; ".join(
+            f"{node.name} (waits for {', '.join(sorted(node.depends_on - done_names))})" for node in pending
+        )
+        super().__init__(f"{len(pending)} nodes can never start: {waits}")
+        self.pending = pending
+
+
+class DagExecutionError(Exception):
+    """Raised when a node fails; carries the failed node and completed nodes"""
+
+    def __init__(self, node, error, completed):
+        super().__init__(f"{node.name} failed: {error}")
+        self.node = node
+        self.error = error
+        self.completed = completed
+
+
+def split_sql_statements(sql_content):
+    """Split a SQL file into statements on top-level semicolons
+
+    Tokenizes the file so semicolons inside string literals (including
+    triple-quoted and raw strings), quoted identifiers and comments do not
+    split a statement. Statements that are only comments are dropped.
+    """
+    statements = []
+    current = []
+    has_code = False
+    i = 0
+    n = len(sql_content)
+
+    while i < n:
+        ch = sql_content[i]
+        two = sql_content[i:i + 2]
+
+        # Line comments: -- and #
+        if two == '--' or ch == '#':
+            end = sql_content.find('\n', i)
+            end = n if end == -1 else end
+            current.append(sql_content[i:end])
+            i = end
+            continue
+
+        # Block comments
+        if two == '/*':
+            end = sql_content.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            current.append(sql_content[i:end])
+            i = end
+            continue
+
+        # String literals and quoted identifiers
+        if ch in ("'", '"', '`'):
+            three = sql_content[i:i + 3]
+            quote = three if three in ("'" * 3, '"' * 3) else ch
+            j = i + len(quote)
+            while j < n and not sql_content.startswith(quote, j):
+                # A backslash always keeps the next character inside the
+                # literal (raw strings keep the backslash but the same rule holds)
+                j += 2 if sql_content[j] == '\\' else 1
+            end = min(j + len(quote), n)
+            current.append(sql_content[i:end])
+            has_code = True
+            i = end
+            continue
+
+        if ch == ';':
+            if has_code:
+                statements.append(''.join(current).strip())
+            current = []
+            has_code = False
+            i += 1
+            continue
+
+        current.append(ch)
+        has_code = has_code or not ch.isspace()
+        i += 1
+
+    if has_code:
+        statements.append(''.join(current).strip())
+
+    return statements
+
+
+def statement_keyword(statement):
+    """First SQL keyword of a statement, skipping leading comments"""
+    for line in statement.splitlines():
+        line = line.strip()
+        if line and not line.startswith(('--', '#')):
+            return line.split()[0].upper().rstrip('(')
+    return ''
+
+
+def _code_lines(statement):
+    """Statement text without full-line comments"""
+    return '\n'.join(
+        line for line in statement.splitlines()
+        if not line.strip().startswith(('--', '#'))
+    )
+
+
+def statement_tables(statement):
+    """Return (reads, writes) table sets of one SQL statement"""
+    code = _code_lines(statement)
+    target = WRITE_TARGET.match(code)
+    writes = {target.group(1)} if target else set()
+    reads = set(TABLE_REF.findall(code[target.end():] if target else code))
+    return reads, writes
+
+
+def session_tables(statement):
+    """Names of the session temp tables a statement creates or reads"""
+    return set(SESSION_TABLE_REF.findall(_code_lines(statement)))
+
+
+def temp_table_query(statement):
+    """Query of a CREATE TEMP TABLE _SESSION.<name> AS statement (else None)"""
+    code = _code_lines(statement)
+    target = TEMP_TABLE_TARGET.match(code)
+    return code[target.end():] if target else None
+
+
+def inline_session_tables(statements):
+    """Statements of one node with each read of a temp table it creates
+    replaced by the table's query, for dry runs; a CREATE TEMP TABLE becomes
+    its query. Temp tables created elsewhere are left as _SESSION.<name>.
+    """
+    queries = {}
+    inlined = []
+    for statement in statements:
+        code = _code_lines(statement)
+        target = TEMP_TABLE_TARGET.match(code)
+        code = SESSION_TABLE_REF.sub(
+            lambda ref: f"(\n{queries[ref.group(1)]}\n)" if ref.group(1) in queries else ref.group(0),
+            code[target.end():] if target else code
+        )
+        if target:
+            queries[target.group(1)] = code
+        inlined.append(code)
+    return inlined
+
+
+def staging_table(statement):
+    """Table a CREATE OR REPLACE TABLE ... OPTIONS (expiration_timestamp = ...)
+    AS statement stages for later statements (else None)"""
+    target = STAGING_TABLE_TARGET.match(_code_lines(statement))
+    return target.group(1) if target else None
+
+
+def tables_conflict(reads_a, writes_a, reads_b, writes_b):
+    """True if two units touch a common table and at least one writes it"""
+    return bool(writes_a & (reads_b | writes_b) or writes_b & reads_a)
+
+
+def conflicts(earlier, later):
+    """True if later must wait for earlier"""
+    return tables_conflict(earlier.reads, earlier.writes, later.reads, later.writes)
+
+
+def build_dependencies(nodes):
+    """Set depends_on for nodes given in declaration order"""
+    for i, node in enumerate(nodes):
+        node.depends_on = {earlier.name for earlier in nodes[:i] if conflicts(earlier, node)}
+    return nodes
+
+
+def group_statements(statements):
+    """Group a layer's statements into independent chains
+
+    Statements that (transitively) touch a table one of them writes, or share
+    a session temp table, end up in one group, in file order; different
+    groups can run concurrently. Reading a staging table another group
+    creates does not join that group (the reader's node depends on it), so
+    the readers of one staging table stay independent of each other. Returns
+    a list of (statements, reads, writes).
+    """
+    order = {statement: i for i, statement in enumerate(statements)}
+    groups = []
+    for statement in statements:
+        reads, writes = statement_tables(statement)
+        group = {'statements': [statement], 'reads': set(reads), 'writes': set(writes),
+                 'session': session_tables(statement), 'staging': {staging_table(statement)} - {None}}
+
+        while True:
+            others = [g for g in groups if _joins(group, g, order)]
+            if not others:
+                break
+            for other in others:
+                groups.remove(other)
+                group['statements'] = other['statements'] + group['statements']
+                for key in ('reads', 'writes', 'session', 'staging'):
+                    group[key] |= other[key]
+        groups.append(group)
+
+    # Restore file order inside and across groups
+    for group in groups:
+        group['statements'].sort(key=order.get)
+    groups.sort(key=lambda group: order[group['statements'][0]])
+    return [(group['statements'], group['reads'], group['writes']) for group in groups]
+
+
+def _joins(group, other, order):
+    """True if group must be merged into one chain with the earlier other
+
+    Reads of other's staging tables are left out of the conflict check unless
+    group starts before other (its node could not wait for other's).
+    """
+    reads = group['reads']
+    if min(map(order.get, group['statements'])) > min(map(order.get, other['statements'])):
+        reads = reads - other['staging']
+    return bool(tables_conflict(other['reads'], other['writes'], reads, group['writes'])
+                or other['session'] & group['session'])
+
+
+def run_dag(nodes, max_concurrency, pipeline_concurrency=None):
+    """Run nodes respecting depends_on, at most max_concurrency at a time and,
+    if given, at most pipeline_concurrency of any one pipeline
+
+    On the first failure no new nodes are started; running nodes are allowed
+    to finish, then DagExecutionError is raised. Nodes that can never start
+    (a dependency not in nodes, or a cycle) also raise it, with an
+    UnschedulableNodesError listing them.
+    """
+    return asyncio.run(_run_dag(nodes, max_concurrency, pipeline_concurrency))
+
+
+async def _run_node(node, pool):
+    """Await a coroutine node on the loop, run any other in a worker thread"""
+    if inspect.iscoroutinefunction(node.run):
+        return await node.run()
+    return await asyncio.get_running_loop().run_in_executor(pool, node.run)
+
+
+async def _run_dag(nodes, max_concurrency, pipeline_concurrency):
+    """Scheduling loop of run_dag"""
+    pending = list(nodes)
+    running = {}
+    running_per_pipeline = Counter()
+    completed = []
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        while pending or running:
+            if failure is None:
+                done_names = {node.name for node in completed}
+                for node in [n for n in pending if n.depends_on <= done_names]:
+                    if len(running) >= max_concurrency:
+                        break
+                    if pipeline_concurrency and running_per_pipeline[node.pipeline] >= pipeline_concurrency:
+                        continue
+                    pending.remove(node)
+                    running_per_pipeline[node.pipeline] += 1
+                    running[asyncio.ensure_future(_run_node(node, pool))] = node
+
+            if not running:
+                if failure is None:
+                    failure = (pending[0], UnschedulableNodesError(pending, completed))
+                    logger.error(f"✗ {failure[1]}")
+                break
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                node = running.pop(task)
+                running_per_pipeline[node.pipeline] -= 1
+                try:
+                    node.result = task.result()
+                    completed.append(node)
+                except Exception as e:
+                    logger.error(f"✗ {node.name} failed: {str(e)}")
+                    failure = failure or (node, e)
+
+    if failure:
+        raise DagExecutionError(failure[0], failure[1], completed)
+    return completed
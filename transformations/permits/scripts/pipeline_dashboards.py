@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Dashboard materialization
+Purpose: Serve the Looker Studio views over silver_trips_enriched from
+         partitioned, clustered tables refreshed by the pipeline, so tile
+         loads no longer scan the whole trip history
+
+The view definitions stay in dashboards/queries/*.sql. A manifest layer with
+a 'views' list generates its SQL from them; each entry has:
+
+  view        View id, as created by its file
+  sql         The file creating it (repository path)
+  table       Table the view's rows are materialized into
+  partition   Optional: {'column', 'grain', 'source', 'source_column'}.
+              The table is partitioned by column, a DATE whose values are
+              source_column truncated to grain (DAY, WEEK or WEEK(MONDAY));
+              source is the partitioned table the view reads trips from
+  clustering  Optional clustering columns
+
+A partitioned view is refreshed by one MERGE that replaces the partitions of
+the changed trip dates (the layer's watermark resolves them, see
+GRAIN_PARAMETERS) with the view's rows computed from those dates of its
+source only. Other views are rebuilt with CREATE OR REPLACE TABLE; all-time
+totals should read a partitioned view of partial aggregates (e.g.
+v_ccvi_trip_pairs_weekly) rather than the trips, so the rebuild is small. Both
+publish atomically. The view is then replaced by SELECT * FROM the table, so
+dashboards keep their data sources; references between materialized views
+read the tables. Re-running a dashboards/queries file restores the live view
+until the next refresh.
+"""
+
+import re
+
+from pipeline_dag import split_sql_statements
+
+VIEW_TARGET = re.compile(r'^\s*CREATE\s+(?:OR\s+REPLACE\s+)?VIEW\s+`([^`]+)`\s+AS\s+', re.IGNORECASE)
+
+# Trailing ORDER BY of a view (tables have no order)
+TRAILING_ORDER_BY = re.compile(r'\s+ORDER\s+BY\s+[^()]*$', re.IGNORECASE)
+
+# Partition grain → (parameter with the source dates to read, parameter with
+# the partitions they replace); resolved by the layer's watermark
+GRAIN_PARAMETERS = {
+    'DAY': ('trip_dates', 'trip_dates'),
+    'WEEK': ('week_dates', 'weeks'),
+    'WEEK(MONDAY)': ('monday_week_dates', 'monday_weeks'),
+}
+
+
+def view_definitions(sql_content):
+    """{view id: query} of the CREATE VIEW statements of a SQL file"""
+    definitions = {}
+    for statement in split_sql_statements(sql_content):
+        code = '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+        target = VIEW_TARGET.match(code)
+        if target:
+            definitions[target.group(1)] = TRAILING_ORDER_BY.sub('', code[target.end():].strip())
+    return definitions
+
+
+def restrict_source(query, source, condition):
+    """The query with its source table's rows filtered by condition"""
+    reference = f"`{source}`"
+    if reference not in query:
+        raise ValueError(f"Materialized view does not read its partition source {source}")
+    return query.replace(reference, f"(SELECT * FROM {reference} WHERE {condition})")
+
+
+def partitioned_statements(spec, query):
+    """Create the table empty if missing, then replace the changed partitions"""
+    partition = spec['partition']
+    dates, buckets = GRAIN_PARAMETERS[partition['grain']]
+    clustering = f"\nCLUSTER BY {', '.join(spec['clustering'])}" if spec.get('clustering') else ""
+    empty = restrict_source(query, partition['source'], "FALSE")
+    changed = restrict_source(query, partition['source'], f"{partition['source_column']} IN UNNEST(@{dates})")
+    return [
+        f"CREATE TABLE IF NOT EXISTS `{spec['table']}`\n"
+        f"PARTITION BY {partition['column']}{clustering}\nAS\n{empty}",
+
+        f"MERGE `{spec['table']}` AS target\nUSING (\n{changed}\n) AS source\nON FALSE\n"
+        f"WHEN NOT MATCHED THEN\n  INSERT ROW\n"
+        f"WHEN NOT MATCHED BY SOURCE AND target.{partition['column']} IN UNNEST(@{buckets}) THEN\n  DELETE",
+    ]
+
+
+def materialization_statements(views, read_sql):
+    """Statements materializing a layer's views, in list order
+
+    read_sql(path) returns the content of a dashboards/queries file.
+    """
+    tables = {spec['view']: spec['table'] for spec in views}
+    definitions = {}
+    statements = []
+    for spec in views:
+        if spec['sql'] not in definitions:
+            definitions[spec['sql']] = view_definitions(read_sql(spec['sql']))
+        query = definitions[spec['sql']].get(spec['view'])
+        if query is None:
+            raise ValueError(f"{spec['sql']} does not create view {spec['view']}")
+        for view, table in tables.items():
+            query = query.replace(f"`{view}`", f"`{table}`")
+
+        if spec.get('partition'):
+            statements += partitioned_statements(spec, query)
+        else:
+            clustering = f"\nCLUSTER BY {', '.join(spec['clustering'])}" if spec.get('clustering') else ""
+            statements.append(f"CREATE OR REPLACE TABLE `{spec['table']}`{clustering}\nAS\n{query}")
+        statements.append(f"CREATE OR REPLACE VIEW `{spec['view']}` AS\nSELECT * FROM `{spec['table']}`")
+    return statements
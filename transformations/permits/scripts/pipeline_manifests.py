@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Dataset manifests
+Purpose: Declare the layers of every dataset run_pipeline.py can run, so
+         trips, COVID, CCVI and the dashboards get the same skipping,
+         watermarks, telemetry, checkpoints and concurrency as permits
+
+A manifest lists its layers in run order. Each layer has:
+
+  name       Unique across manifests; keys the layer's fingerprint,
+             watermark and statistics in pipeline state (the permits layers
+             keep their original BRONZE/SILVER/GOLD names)
+  sql        SQL files relative to the repository root, run in order. Their
+             statements are grouped into independent nodes by the tables
+             they touch (see pipeline_dag.py). In the container image the
+             files sit next to the scripts and are found by file name.
+  watermark  Optional high-water mark spec (see pipeline_watermarks.py)
+  partitions Optional: run the SQL once per date partition of a table (see
+             pipeline_partitions.py); the dates start at the watermark
+  stats      Optional: a partition statistics spec (see pipeline_stats.py)
+             or a read-only SQL query, run after the layer
+  command    Instead of sql: a Python script (path relative to the
+             repository root, then its arguments) run as a subprocess, e.g.
+             a forecasting stage. It runs against BigQuery only.
+  reads      With command: the tables the script reads and writes, which
+  writes     place it in the DAG and key its fingerprint
+  views      Instead of sql: dashboard views to materialize into tables
+             (see pipeline_dashboards.py)
+  rebuild_on Optional: reference tables whose change since the layer's last
+             run makes it ignore its watermark (a full refresh)
+  summary    One line for the run summary
+
+Several manifests can run in one invocation; their layers form one DAG, so
+e.g. the COVID hotspots wait for the trips silver layer they read, and each
+forecast starts as soon as the gold tables it reads are done.
+"""
+
+import os
+
+from pipeline_stats import LAYER_STATS
+from pipeline_watermarks import WATERMARKS
+
+# transformations/permits/scripts → repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+PERMITS_GOLD_STATS = """
+    SELECT
+        'GOLD - Permits ROI' as layer,
+        COUNT(*) as total_zip_codes,
+        SUM(total_permits) as total_permits,
+        ROUND(SUM(total_permit_value), 2) as total_value,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi`
+
+    UNION ALL
+
+    SELECT
+        'GOLD - Loan Targets' as layer,
+        COUNT(*) as total_zip_codes,
+        SUM(CAST(is_loan_eligible AS INT64)) as eligible_zips,
+        ROUND(AVG(eligibility_index), 2) as avg_eligibility,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets`
+"""
+
+TRIPS_GOLD_STATS = """
+    SELECT
+        'TRIPS GOLD - Hourly by ZIP' as layer,
+        COUNT(*) as total_rows,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_hourly_by_zip`
+
+    UNION ALL
+
+    SELECT
+        'TRIPS GOLD - Daily by ZIP' as layer,
+        COUNT(*) as total_rows,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip`
+
+    UNION ALL
+
+    SELECT
+        'TRIPS GOLD - Route Pairs' as layer,
+        COUNT(*) as total_rows,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_route_pairs`
+
+    UNION ALL
+
+    SELECT
+        'TRIPS GOLD - Route Totals' as layer,
+        COUNT(*) as total_rows,
+        MAX(updated_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_route_totals`
+
+    UNION ALL
+
+    SELECT
+        'TRIPS GOLD - Weekly Mobility by ZIP' as layer,
+        COUNT(*) as total_rows,
+        MAX(updated_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip`
+
+    UNION ALL
+
+    SELECT
+        'TRIPS GOLD - Rush-Hour Sketches by ZIP' as layer,
+        COUNT(*) as total_rows,
+        MAX(updated_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches`
+"""
+
+TRIPS_SILVER_TABLE = "chicago-bi-app-msds-432-476520.silver_data.silver_trips_enriched"
+
+# Newest trip_date written (looked up in the last 30 days' partitions only);
+# the next run rewrites it, since its day may have been incomplete
+TRIPS_SILVER_WATERMARK = {
+    'parameter': 'since_trip_date',
+    'type': 'DATE',
+    'targets': [TRIPS_SILVER_TABLE],
+    'initial': '2020-01-01',
+    'derive': f"SELECT MAX(trip_date) FROM `{TRIPS_SILVER_TABLE}`",
+    'processed': f"""
+        SELECT MAX(trip_date) FROM `{TRIPS_SILVER_TABLE}`
+        WHERE trip_date >= DATE(CURRENT_TIMESTAMP() - INTERVAL 30 DAY)
+    """,
+    'resolved': {},
+}
+
+TRIPS_GOLD_TABLES = [
+    "chicago-bi-app-msds-432-476520.gold_data.gold_taxi_hourly_by_zip",
+    "chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip",
+    "chicago-bi-app-msds-432-476520.gold_data.gold_route_totals",
+    "chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip",
+    "chicago-bi-app-msds-432-476520.gold_data.gold_rush_hour_sketches",
+]
+
+# Silver partitions modified since gold's last run (partition metadata, no
+# scan), plus gold days whose silver partition no longer exists (BigQuery
+# drops emptied partitions); an initial load takes every partition and
+# rebuilds the route totals
+TRIPS_GOLD_WATERMARK = {
+    'parameter': 'since_partition_modified',
+    'type': 'TIMESTAMP',
+    'targets': TRIPS_GOLD_TABLES,
+    'initial': '1970-01-01T00:00:00+00:00',
+    'derive': None,  # gold does not record which partitions it applied
+    'processed': """
+        SELECT MAX(last_modified_time)
+        FROM `chicago-bi-app-msds-432-476520.silver_data.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name = 'silver_trips_enriched'
+    """,
+    'resolved': {
+        'trip_dates': ('ARRAY<DATE>', """
+            WITH silver AS (
+                SELECT partition_id, last_modified_time
+                FROM `chicago-bi-app-msds-432-476520.silver_data.INFORMATION_SCHEMA.PARTITIONS`
+                WHERE table_name = 'silver_trips_enriched'
+                  AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+            ),
+            changed AS (
+                SELECT partition_id FROM silver
+                WHERE last_modified_time > @since_partition_modified
+
+                UNION DISTINCT
+
+                SELECT partition_id
+                FROM `chicago-bi-app-msds-432-476520.gold_data.INFORMATION_SCHEMA.PARTITIONS`
+                WHERE table_name = 'gold_taxi_daily_by_zip'
+                  AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+                  AND partition_id NOT IN (SELECT partition_id FROM silver)
+            )
+            SELECT ARRAY_AGG(PARSE_DATE('%Y%m%d', partition_id) ORDER BY partition_id)
+            FROM changed
+        """),
+        # Every day of the weeks with a changed date (weekly mobility)
+        'week_dates': ('ARRAY<DATE>', """
+            SELECT ARRAY_AGG(week_date ORDER BY week_date)
+            FROM (
+                SELECT DISTINCT DATE(DATE_ADD(DATE_TRUNC(trip_date, WEEK), INTERVAL (weekday) DAY)) as week_date
+                FROM UNNEST(@trip_dates) AS trip_date
+                CROSS JOIN UNNEST([0, 1, 2, 3, 4, 5, 6]) AS weekday
+            )
+        """),
+        'full_rebuild': ('BOOL', "SELECT @since_partition_modified = TIMESTAMP '1970-01-01 00:00:00+00'"),
+    },
+}
+
+COVID_SILVER_STATS = """
+    SELECT
+        'COVID SILVER - Weekly Historical' as layer,
+        COUNT(*) as total_records,
+        COUNT(DISTINCT zip_code) as unique_zips,
+        MAX(week_start) as newest_week,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.silver_data.silver_covid_weekly_historical`
+
+    UNION ALL
+
+    SELECT
+        'COVID SILVER - Latest Week' as layer,
+        COUNT(*) as total_records,
+        COUNT(DISTINCT zip_code) as unique_zips,
+        MAX(latest_week_end) as newest_week,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.silver_data.silver_covid_latest`
+"""
+
+COVID_GOLD_STATS = """
+    SELECT
+        'COVID GOLD - Hotspots' as layer,
+        COUNT(*) as total_records,
+        COUNT(DISTINCT zip_code) as unique_zips,
+        MAX(week_start) as newest_week
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_covid_hotspots`
+"""
+
+CCVI_SILVER_STATS = """
+    SELECT
+        'CCVI SILVER - High Risk' as layer,
+        COUNT(*) as total_records,
+        COUNTIF(geography_type = 'ZIP') as zip_areas,
+        MAX(created_at) as last_update
+    FROM `chicago-bi-app-msds-432-476520.silver_data.silver_ccvi_high_risk`
+"""
+
+FORECAST_SCRIPTS_DIR = "forecasting/scripts"
+
+GOLD_DATASET = "chicago-bi-app-msds-432-476520.gold_data"
+AIRPORT_VIEWS_SQL = "dashboards/queries/create_airport_views.sql"
+CCVI_VIEWS_SQL = "dashboards/queries/create_dashboard_3_views.sql"
+
+# Dashboard views over the trips, served from tables; partitioned ones are
+# refreshed for the changed trip dates only
+DASHBOARD_VIEWS = [
+    {
+        'view': f"{GOLD_DATASET}.v_airport_trips",
+        'sql': AIRPORT_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_airport_trips",
+        'partition': {'column': 'trip_date', 'grain': 'DAY', 'source': TRIPS_SILVER_TABLE,
+                      'source_column': 'trip_date'},
+        'clustering': ['airport_destination', 'dropoff_zip'],
+    },
+    {
+        'view': f"{GOLD_DATASET}.v_airport_covid_overlay",
+        'sql': AIRPORT_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_airport_covid_overlay",
+        'partition': {'column': 'week_start', 'grain': 'WEEK(MONDAY)',
+                      'source': f"{GOLD_DATASET}.dash_airport_trips", 'source_column': 'trip_date'},
+        'clustering': ['airport_destination'],
+    },
+    # Weekly partial aggregates; the all-time CCVI views below total them
+    # instead of rescanning the trips
+    {
+        'view': f"{GOLD_DATASET}.v_ccvi_trip_pairs_weekly",
+        'sql': CCVI_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_ccvi_trip_pairs_weekly",
+        'partition': {'column': 'week_start', 'grain': 'WEEK', 'source': TRIPS_SILVER_TABLE,
+                      'source_column': 'trip_date'},
+        'clustering': ['pickup_community_area', 'dropoff_community_area'],
+    },
+    {
+        'view': f"{GOLD_DATASET}.v_ccvi_trip_activity",
+        'sql': CCVI_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_ccvi_trip_activity",
+        'clustering': ['community_area'],
+    },
+    {
+        'view': f"{GOLD_DATASET}.v_ccvi_trip_trends",
+        'sql': CCVI_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_ccvi_trip_trends",
+        'partition': {'column': 'week_start', 'grain': 'WEEK', 'source': TRIPS_SILVER_TABLE,
+                      'source_column': 'trip_date'},
+    },
+    {
+        'view': f"{GOLD_DATASET}.v_ccvi_pooled_rides",
+        'sql': CCVI_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_ccvi_pooled_rides",
+        'clustering': ['community_area'],
+    },
+    {
+        'view': f"{GOLD_DATASET}.v_ccvi_dashboard_summary",
+        'sql': CCVI_VIEWS_SQL,
+        'table': f"{GOLD_DATASET}.dash_ccvi_dashboard_summary",
+    },
+]
+
+# Tables the partitioned views join besides the trips; when one changes,
+# every partition is rebuilt
+DASHBOARD_REFERENCE_TABLES = [
+    "chicago-bi-app-msds-432-476520.silver_data.silver_ccvi_high_risk",
+    f"{GOLD_DATASET}.gold_covid_hotspots",
+]
+
+# Silver partitions modified since the last refresh, plus days of
+# dash_airport_trips whose silver partition was dropped; an initial load (or
+# a missing table) takes every partition. Week grains re-read every day of a
+# changed week.
+DASHBOARDS_WATERMARK = {
+    'parameter': 'since_partition_modified',
+    'type': 'TIMESTAMP',
+    'targets': [spec['table'] for spec in DASHBOARD_VIEWS if spec.get('partition')],
+    'initial': '1970-01-01T00:00:00+00:00',
+    'derive': None,  # the tables do not record which partitions they applied
+    'processed': """
+        SELECT MAX(last_modified_time)
+        FROM `chicago-bi-app-msds-432-476520.silver_data.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name = 'silver_trips_enriched'
+    """,
+    'resolved': {
+        'trip_dates': ('ARRAY<DATE>', """
+            WITH silver AS (
+                SELECT partition_id, last_modified_time
+                FROM `chicago-bi-app-msds-432-476520.silver_data.INFORMATION_SCHEMA.PARTITIONS`
+                WHERE table_name = 'silver_trips_enriched'
+                  AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+            ),
+            changed AS (
+                SELECT partition_id FROM silver
+                WHERE last_modified_time > @since_partition_modified
+
+                UNION DISTINCT
+
+                SELECT partition_id
+                FROM `chicago-bi-app-msds-432-476520.gold_data.INFORMATION_SCHEMA.PARTITIONS`
+                WHERE table_name = 'dash_airport_trips'
+                  AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+                  AND partition_id NOT IN (SELECT partition_id FROM silver)
+            )
+            SELECT ARRAY_AGG(PARSE_DATE('%Y%m%d', partition_id) ORDER BY partition_id)
+            FROM changed
+        """),
+        'week_dates': ('ARRAY<DATE>', """
+            SELECT ARRAY_AGG(week_date ORDER BY week_date)
+            FROM (
+                SELECT DISTINCT DATE(DATE_ADD(DATE_TRUNC(trip_date, WEEK), INTERVAL (weekday) DAY)) as week_date
+                FROM UNNEST(@trip_dates) AS trip_date
+                CROSS JOIN UNNEST([0, 1, 2, 3, 4, 5, 6]) AS weekday
+            )
+        """),
+        'weeks': ('ARRAY<DATE>', """
+            SELECT ARRAY_AGG(week ORDER BY week)
+            FROM (SELECT DISTINCT DATE_TRUNC(trip_date, WEEK) as week FROM UNNEST(@trip_dates) AS trip_date)
+        """),
+        'monday_week_dates': ('ARRAY<DATE>', """
+            SELECT ARRAY_AGG(week_date ORDER BY week_date)
+            FROM (
+                SELECT DISTINCT DATE(DATE_ADD(DATE_TRUNC(trip_date, WEEK(MONDAY)), INTERVAL (weekday) DAY)) as week_date
+                FROM UNNEST(@trip_dates) AS trip_date
+                CROSS JOIN UNNEST([0, 1, 2, 3, 4, 5, 6]) AS weekday
+            )
+        """),
+        'monday_weeks': ('ARRAY<DATE>', """
+            SELECT ARRAY_AGG(week ORDER BY week)
+            FROM (SELECT DISTINCT DATE_TRUNC(trip_date, WEEK(MONDAY)) as week FROM UNNEST(@trip_dates) AS trip_date)
+        """),
+    },
+}
+
+# In dependency order: a manifest only reads tables of earlier manifests
+MANIFESTS = {
+    "permits": [
+        {
+            'name': "BRONZE",
+            'sql': ["transformations/permits/sql/01_bronze_permits_incremental.sql"],
+            'watermark': WATERMARKS["BRONZE"],
+            'stats': LAYER_STATS["BRONZE"],
+            'summary': "Incremental merge from raw",
+        },
+        {
+            'name': "SILVER",
+            'sql': ["transformations/permits/sql/02_silver_permits_incremental.sql"],
+            'watermark': WATERMARKS["SILVER"],
+            'stats': LAYER_STATS["SILVER"],
+            'summary': "Spatial enrichment (ZIP, neighborhood)",
+        },
+        {
+            'name': "GOLD",
+            'sql': ["transformations/permits/sql/03_gold_permits_aggregates.sql"],
+            'watermark': WATERMARKS["GOLD"],
+            'stats': PERMITS_GOLD_STATS,
+            'summary': "Aggregates of changed ZIPs (permits ROI, loan targets)",
+        },
+    ],
+    "trips": [
+        {
+            'name': "TRIPS SILVER",
+            'sql': ["silver-layer/sql/02_silver_trips_enriched_partition.sql"],
+            'watermark': TRIPS_SILVER_WATERMARK,
+            'partitions': {
+                'table': TRIPS_SILVER_TABLE,
+                'column': 'trip_date',
+                'parameter': 'trip_date',
+                'clustering': ['source_dataset', 'pickup_community_area', 'dropoff_community_area'],
+            },
+            'stats': {
+                'table': TRIPS_SILVER_TABLE,
+                'entity': 'trip',
+                'id_column': 'trip_id',
+                'partition_column': 'trip_date',
+                'timestamp_column': 'enriched_at',
+                'zip_column': 'pickup_zip',
+            },
+            'summary': "Taxi + TNP trips with spatial enrichment (new trip_date partitions)",
+        },
+        {
+            'name': "TRIPS GOLD",
+            'sql': [
+                "gold-layer/sql/02_gold_taxi_aggregates_incremental.sql",
+                "gold-layer/sql/09_gold_mobility_weekly_by_zip.sql",
+                "gold-layer/sql/10_gold_rush_hour_sketches.sql",
+            ],
+            'watermark': TRIPS_GOLD_WATERMARK,
+            'stats': TRIPS_GOLD_STATS,
+            'summary': "ZIP aggregates, weekly mobility and rush-hour sketches of changed trip dates, "
+                       "top routes from running totals",
+        },
+    ],
+    "ccvi": [
+        {
+            'name': "CCVI SILVER",
+            'sql': ["silver-layer/sql/05_silver_ccvi_high_risk.sql"],
+            'stats': CCVI_SILVER_STATS,
+            'summary': "High vulnerability areas",
+        },
+    ],
+    "covid": [
+        {
+            'name': "COVID SILVER",
+            'sql': [
+                "silver-layer/sql/04_silver_covid_weekly_historical.sql",
+                "silver-layer/sql/04_silver_covid_latest.sql",
+            ],
+            'stats': COVID_SILVER_STATS,
+            'summary': "Weekly history and latest week with risk categories",
+        },
+        {
+            'name': "COVID GOLD",
+            'sql': ["gold-layer/sql/06_gold_covid_hotspots.sql"],
+            'stats': COVID_GOLD_STATS,
+            'summary': "Hotspots from cases, mobility and CCVI",
+        },
+    ],
+    # --selective: only ZIPs whose forecasts drifted or aged out are refit.
+    # Both append to gold_forecast_model_metrics (rows keyed by run id); it
+    # is not declared, so they run concurrently.
+    "forecasts": [
+        {
+            'name': "TRAFFIC FORECAST",
+            'command': [f"{FORECAST_SCRIPTS_DIR}/traffic_volume_forecasting.py", "--selective"],
+            'reads': ["chicago-bi-app-msds-432-476520.gold_data.gold_taxi_daily_by_zip"],
+            'writes': ["chicago-bi-app-msds-432-476520.gold_data.gold_traffic_forecasts_by_zip"],
+            'summary': "Prophet traffic forecasts of drifted ZIPs",
+        },
+        {
+            'name': "COVID FORECAST",
+            'command': [f"{FORECAST_SCRIPTS_DIR}/covid_alert_forecasting.py", "--selective"],
+            'reads': [
+                "chicago-bi-app-msds-432-476520.gold_data.gold_covid_hotspots",
+                "chicago-bi-app-msds-432-476520.gold_data.gold_mobility_weekly_by_zip",
+            ],
+            'writes': ["chicago-bi-app-msds-432-476520.gold_data.gold_covid_risk_forecasts"],
+            'summary': "Prophet COVID alert forecasts of drifted ZIPs",
+        },
+    ],
+    "dashboards": [
+        {
+            'name': "DASHBOARDS",
+            'views': DASHBOARD_VIEWS,
+            'watermark': DASHBOARDS_WATERMARK,
+            'rebuild_on': DASHBOARD_REFERENCE_TABLES,
+            'summary': "Dashboard views materialized (partitions of changed trip dates)",
+        },
+    ],
+}
+
+LAYER_NAMES = [layer['name'] for layers in MANIFESTS.values() for layer in layers]
+LAYER_MANIFESTS = {layer['name']: name for name, layers in MANIFESTS.items() for layer in layers}
+
+
+def manifest_layers(names):
+    """Layers of the named manifests, in manifest order"""
+    unknown = set(names) - set(MANIFESTS)
+    if unknown:
+        raise ValueError(f"Unknown manifests: {', '.join(sorted(unknown))} (known: {', '.join(MANIFESTS)})")
+    return [layer for name, layers in MANIFESTS.items() if name in names for layer in layers]
+
+
+def sql_path(path, script_dir):
+    """Location of a manifest SQL file (or script): next to the scripts
+    (container image) or in the repository checkout"""
+    flat = os.path.join(script_dir, os.path.basename(path))
+    return flat if os.path.exists(flat) else os.path.join(REPO_ROOT, path)
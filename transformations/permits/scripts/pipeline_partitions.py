@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Partition-incremental layers
+Purpose: Replace only the date partitions of a table that have new data,
+         one job per partition, instead of rebuilding the whole table
+
+A manifest layer with a 'partitions' spec runs its SQL (a SELECT of one
+partition's rows, filtered on the @<parameter> date) once per date, writing
+each result to <table>$YYYYMMDD with WRITE_TRUNCATE. A partition is replaced
+atomically, and partition writes are not DML, so many run in parallel
+(--partition-concurrency).
+
+  table       Partitioned target table
+  column      Its DATE partitioning column
+  parameter   Query parameter holding the partition date
+  clustering  Clustering columns, used if the first write creates the table
+
+The dates come from the layer's watermark (the newest partition written,
+which is rewritten because its day may have been incomplete) through today,
+plus the dates that failed in the previous run; --dates START[:END] replaces
+that range, e.g. for a backfill. Each partition's job id is deterministic
+(run id, date, SQL and input fingerprints), so --resume attaches to the
+partitions that already succeeded. Transient errors are retried with backoff;
+a failed partition does not stop the others. The failed dates of the last
+run are kept in pipeline state (kind 'partitions').
+"""
+
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+from google.api_core.exceptions import ServerError, TooManyRequests
+from google.cloud import bigquery
+from google.cloud.exceptions import GoogleCloudError
+
+from pipeline_checkpoints import make_job_id, node_inputs, submit_query
+from pipeline_state import save_state, table_fingerprint
+from pipeline_watermarks import statement_parameters
+
+logger = logging.getLogger(__name__)
+
+# Attempts per partition, and the delay before the first retry (doubled after
+# each failure)
+MAX_PARTITION_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 10
+
+# Error reasons BigQuery reports for transient failures
+RETRYABLE_REASONS = {'backendError', 'internalError', 'rateLimitExceeded', 'jobRateLimitExceeded'}
+
+
+def parse_date_range(text):
+    """(first, last) ISO dates of 'START[:END]' (END defaults to START)"""
+    first, _, last = text.partition(':')
+    first, last = date.fromisoformat(first), date.fromisoformat(last or first)
+    if last < first:
+        raise ValueError(f"Date range {text} ends before it starts")
+    return first.isoformat(), last.isoformat()
+
+
+def date_range(first, last):
+    """ISO dates from first through last"""
+    start = date.fromisoformat(str(first)[:10])
+    return [(start + timedelta(days=i)).isoformat() for i in range((date.fromisoformat(last) - start).days + 1)]
+
+
+def plan_partitions(watermark, stored=None, dates=None):
+    """Dates to replace: the given (first, last) range, or the watermark's
+    date through today (UTC) plus the dates that failed last time"""
+    if dates:
+        return date_range(*dates)
+    today = datetime.now(timezone.utc).date().isoformat()
+    failed = (stored or {}).get('failed', [])
+    return sorted(set(date_range(watermark, today)) | set(failed))
+
+
+def is_retryable(error):
+    """True for errors worth retrying (server errors, rate limits)"""
+    reasons = {e.get('reason') for e in getattr(error, 'errors', None) or []}
+    return isinstance(error, (ServerError, TooManyRequests)) or bool(reasons & RETRYABLE_REASONS)
+
+
+def partition_job_config(spec, day, parameters):
+    """Query job config writing one partition of the spec's table"""
+    return bigquery.QueryJobConfig(
+        destination=f"{spec['table']}${day.replace('-', '')}",
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+        time_partitioning=bigquery.TimePartitioning(field=spec['column']),
+        clustering_fields=spec.get('clustering'),
+        query_parameters=parameters,
+    )
+
+
+def run_partition(client, node, spec, statement, day, parameters, run_id, salt, location, telemetry=None):
+    """Replace one partition, retrying transient errors; returns rows written"""
+    label = f"{node.name} {day}"
+    parameters = statement_parameters(statement, list(parameters) + [
+        bigquery.ScalarQueryParameter(spec['parameter'], 'DATE', day)
+    ])
+    job_config = partition_job_config(spec, day, parameters)
+    job_id = make_job_id(run_id, node.name, day.replace('-', ''), statement, salt)
+
+    for attempt in range(1, MAX_PARTITION_ATTEMPTS + 1):
+        job = submit_query(client, statement, job_config, job_id, location)
+        rows = None
+        try:
+            rows = job.result().total_rows
+            logger.info(f"    ✓ {label}: {rows} rows")
+            return rows
+        except GoogleCloudError as e:
+            if attempt == MAX_PARTITION_ATTEMPTS or not is_retryable(e):
+                logger.error(f"    ✗ {label} failed: {str(e)}")
+                raise
+            delay = RETRY_DELAY_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"    ⚠ {label}: attempt {attempt} failed, retrying in {delay}s: {str(e)}")
+            time.sleep(delay)
+        finally:
+            if telemetry:
+                telemetry.record(job, label, 1, statement=statement, rows_returned=rows)
+
+
+def run_partitions(client, node, layer_name, spec, dates, parameters, run_id, location, max_concurrency,
+                   telemetry=None):
+    """Replace the node's partitions for all dates, max_concurrency at a time
+
+    Every date is attempted; the failed ones are stored in pipeline state
+    and raised together.
+    """
+    statement, = node.statements
+    inputs = {table: table_fingerprint(client, table) for table in sorted(node_inputs(node))}
+    salt = json.dumps(inputs, sort_keys=True, default=str)
+
+    if dates:
+        logger.info(f"▶ Executing {node.name}: {len(dates)} partitions ({dates[0]} … {dates[-1]}), "
+                    f"{max_concurrency} concurrent...")
+    else:
+        logger.info(f"▶ Executing {node.name}: no partitions to replace")
+
+    def replace(day):
+        try:
+            return day, run_partition(client, node, spec, statement, day, parameters, run_id, salt, location,
+                                      telemetry), None
+        except Exception as e:
+            return day, None, e
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        results = list(pool.map(replace, dates))
+
+    failed = {day: str(error) for day, _, error in results if error}
+    rows = sum(rows for _, rows, error in results if not error)
+    try:
+        save_state(client, 'partitions', layer_name, {'run_id': run_id, 'failed': sorted(failed)}, location)
+    except Exception as e:
+        logger.warning(f"⚠ Could not record the partitions of {layer_name}: {str(e)}")
+
+    if failed:
+        raise RuntimeError(f"{len(failed)}/{len(dates)} partitions failed: {', '.join(sorted(failed))}")
+    logger.info(f"✓ {node.name} completed successfully ({len(dates)} partitions, {rows} rows)")
+    return [{'partition': day, 'rows': rows} for day, rows, _ in results]
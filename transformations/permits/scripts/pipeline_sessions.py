@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Run-scoped BigQuery session
+Purpose: Materialize intermediates a layer reads several times (the changed
+         permits with their ZIP and neighborhood) once per run as session
+         temp tables, instead of re-deriving them in every statement that
+         needs them
+
+Layer SQL creates them with CREATE OR REPLACE TEMP TABLE _SESSION.<name> AS
+and reads them as _SESSION.<name>. The runner opens one BigQuery session for
+the run when the first node that uses one starts, runs those nodes in it one
+at a time, and aborts the session when the run ends, which drops its temp
+tables. Statements sharing a temp table are one node (see
+pipeline_dag.group_statements); temp tables are not part of layer
+fingerprints or checkpoint inputs. Jobs in a session run one at a time, so
+intermediates read by concurrent nodes (the ZIPs gold recomputes) are staging
+tables instead.
+
+A resumed node first rebuilds the temp tables its completed statements
+created (the failed run's session is gone). Dry runs cannot see temp tables:
+a statement creating one is estimated by its query, a statement reading one
+with the temp table inlined (see pipeline_costs.py).
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineSession:
+    """BigQuery session shared by the nodes of one run that use temp tables"""
+
+    def __init__(self, client, location):
+        self.client = client
+        self.location = location
+        self.session_id = None
+        self._lock = threading.RLock()
+
+    def _open(self):
+        job = self.client.query(
+            "SELECT 1", job_config=bigquery.QueryJobConfig(create_session=True), location=self.location
+        )
+        job.result()
+        self.session_id = job.session_info.session_id
+        logger.info(f"✓ Session opened: {self.session_id}")
+
+    def _connection_properties(self):
+        return [bigquery.ConnectionProperty('session_id', self.session_id)]
+
+    @contextmanager
+    def use(self):
+        """Hold the session (opened on first use) and yield the connection
+        properties that run a job in it; one node uses it at a time"""
+        with self._lock:
+            if self.session_id is None:
+                self._open()
+            yield self._connection_properties()
+
+    def close(self):
+        """Abort the session, dropping its temp tables"""
+        with self._lock:
+            if self.session_id is None:
+                return
+            try:
+                job_config = bigquery.QueryJobConfig(connection_properties=self._connection_properties())
+                self.client.query("CALL BQ.ABORT_SESSION()", job_config=job_config, location=self.location).result()
+                logger.info(f"✓ Session closed: {self.session_id}")
+            except Exception as e:
+                logger.warning(f"⚠ Could not close session {self.session_id} (it expires when idle): {str(e)}")
+            self.session_id = None
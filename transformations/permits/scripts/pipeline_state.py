@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Persistent pipeline state
+Purpose: Keep per-layer state between runs (the Cloud Run job is stateless)
+
+State lives in one small BigQuery table keyed by (kind, layer), each value a
+JSON document:
+
+  fingerprint   Tables read and written (last modified, row count) and SQL
+                hash of the layer's last successful run; unchanged = skip
+  watermark     High-water mark of an incremental layer (pipeline_watermarks.py)
+  checkpoint    Progress of each SQL node of the current or last failed run,
+                keyed by node name (pipeline_checkpoints.py)
+  partitions    Dates a partitioned layer failed to replace in its last run
+                (pipeline_partitions.py)
+"""
+
+import json
+import hashlib
+import logging
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+STATE_TABLE = "chicago-bi-app-msds-432-476520.reference_data.permits_pipeline_state"
+
+
+def ensure_state_table(client, location):
+    """Create the state table on first use"""
+    client.query(f"""
+        CREATE TABLE IF NOT EXISTS `{STATE_TABLE}` (
+          kind STRING NOT NULL,
+          layer STRING NOT NULL,
+          value STRING,
+          updated_at TIMESTAMP
+        )
+        CLUSTER BY kind, layer
+    """, location=location).result()
+
+
+def load_state(client, kind, location):
+    """Return {layer: value} for one kind of state"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("kind", "STRING", kind)]
+    )
+    rows = client.query(
+        f"SELECT layer, value FROM `{STATE_TABLE}` WHERE kind = @kind",
+        job_config=job_config, location=location
+    ).result()
+    return {row['layer']: json.loads(row['value']) for row in rows}
+
+
+def save_state(client, kind, layer, value, location):
+    """Upsert the state of one layer"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("kind", "STRING", kind),
+            bigquery.ScalarQueryParameter("layer", "STRING", layer),
+            bigquery.ScalarQueryParameter("value", "STRING", json.dumps(value, sort_keys=True, default=str)),
+        ]
+    )
+    client.query(f"""
+        MERGE `{STATE_TABLE}` AS target
+        USING (SELECT @kind AS kind, @layer AS layer, @value AS value) AS source
+        ON target.kind = source.kind AND target.layer = source.layer
+        WHEN MATCHED THEN
+          UPDATE SET value = source.value, updated_at = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN
+          INSERT (kind, layer, value, updated_at)
+          VALUES (source.kind, source.layer, source.value, CURRENT_TIMESTAMP())
+    """, job_config=job_config, location=location).result()
+
+
+def delete_state(client, kind, location):
+    """Remove all state of one kind"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("kind", "STRING", kind)]
+    )
+    client.query(
+        f"DELETE FROM `{STATE_TABLE}` WHERE kind = @kind",
+        job_config=job_config, location=location
+    ).result()
+
+
+def sql_hash(statements):
+    """Stable hash of a layer's SQL text"""
+    return hashlib.sha256("\n;\n".join(statements).encode()).hexdigest()
+
+
+def table_fingerprint(client, table_id):
+    """Last-modified time and row count of a table (None if it doesn't exist)
+
+    Read from table metadata, so it costs no bytes.
+    """
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        return None
+    return {
+        'modified': table.modified.isoformat() if table.modified else None,
+        'rows': table.num_rows,
+    }
+
+
+def tables_hash(client, table_ids):
+    """Stable hash of the fingerprints of some tables (changes when any of
+    them is modified, created or dropped)"""
+    fingerprints = {table_id: table_fingerprint(client, table_id) for table_id in sorted(table_ids)}
+    return hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode()).hexdigest()
+
+
+def layer_fingerprint(statements, table_fingerprints):
+    """Fingerprint of one layer: SQL hash plus the fingerprint of each table it
+    reads or writes (outputs are included so a dropped or externally modified
+    output table is rebuilt)"""
+    return {
+        'sql': sql_hash(statements),
+        'tables': dict(sorted(table_fingerprints.items())),
+    }
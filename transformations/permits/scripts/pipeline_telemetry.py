@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Job telemetry
+Purpose: Record the statistics of every BigQuery job the pipeline runs, and
+         report the slowest and most expensive statements across runs
+
+One record per statement job (statement mode) or script child job (script
+mode): run id, node, statement index/type/hash, job id, timings, bytes
+processed and billed, slot milliseconds, cache hit, affected/returned rows,
+the dry-run estimate and per-stage timings of the query plan. Records are
+appended to a local JSON lines file (PIPELINE_TELEMETRY_FILE) and, if
+PIPELINE_RUNS_TABLE is set, loaded into that BigQuery table at the end of the
+run (a free batch load, not streaming).
+
+Report:
+    python3 pipeline_telemetry.py report                  # local JSON lines
+    python3 pipeline_telemetry.py report --bigquery       # PIPELINE_RUNS_TABLE
+    python3 pipeline_telemetry.py report --runs 5 --top 10
+"""
+
+import os
+import sys
+import json
+import uuid
+import hashlib
+import argparse
+import logging
+import threading
+from datetime import datetime, timezone
+
+from google.cloud import bigquery
+
+from pipeline_costs import format_bytes
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_FILE = os.environ.get("PIPELINE_TELEMETRY_FILE", "pipeline_runs.jsonl")
+
+# Optional BigQuery destination, e.g.
+# chicago-bi-app-msds-432-476520.reference_data.pipeline_runs
+RUNS_TABLE = os.environ.get("PIPELINE_RUNS_TABLE", "")
+
+RUNS_SCHEMA = [
+    bigquery.SchemaField("run_id", "STRING"),
+    bigquery.SchemaField("run_started_at", "TIMESTAMP"),
+    bigquery.SchemaField("node", "STRING"),
+    bigquery.SchemaField("statement_index", "INT64"),
+    bigquery.SchemaField("statement_type", "STRING"),
+    bigquery.SchemaField("statement_hash", "STRING"),
+    bigquery.SchemaField("job_id", "STRING"),
+    bigquery.SchemaField("parent_job_id", "STRING"),
+    bigquery.SchemaField("state", "STRING"),
+    bigquery.SchemaField("error", "STRING"),
+    bigquery.SchemaField("created", "TIMESTAMP"),
+    bigquery.SchemaField("started", "TIMESTAMP"),
+    bigquery.SchemaField("ended", "TIMESTAMP"),
+    bigquery.SchemaField("queued_ms", "INT64"),
+    bigquery.SchemaField("duration_ms", "INT64"),
+    bigquery.SchemaField("estimated_bytes", "INT64"),
+    bigquery.SchemaField("bytes_processed", "INT64"),
+    bigquery.SchemaField("bytes_billed", "INT64"),
+    bigquery.SchemaField("slot_ms", "INT64"),
+    bigquery.SchemaField("cache_hit", "BOOL"),
+    bigquery.SchemaField("rows_affected", "INT64"),
+    bigquery.SchemaField("rows_returned", "INT64"),
+    bigquery.SchemaField("stages", "STRING"),  # JSON array
+]
+
+
+def statement_hash(statement):
+    """Short stable hash identifying a statement across runs"""
+    return hashlib.sha256((statement or "").strip().encode()).hexdigest()[:16]
+
+
+def _ms(start, end):
+    return int((end - start).total_seconds() * 1000) if start and end else None
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def job_record(job, node, statement_index, statement=None, estimated_bytes=None, rows_returned=None):
+    """Telemetry record of one finished (or failed) query job"""
+    stages = [
+        {
+            'name': stage.name,
+            'duration_ms': _ms(stage.start, stage.end),
+            'slot_ms': stage.slot_ms,
+            'records_read': stage.records_read,
+            'records_written': stage.records_written,
+        }
+        for stage in (getattr(job, 'query_plan', None) or [])
+    ]
+    error = getattr(job, 'error_result', None)
+    return {
+        'node': node,
+        'statement_index': statement_index,
+        'statement_type': getattr(job, 'statement_type', None),
+        'statement_hash': statement_hash(statement if statement is not None else getattr(job, 'query', None)),
+        'job_id': job.job_id,
+        'parent_job_id': getattr(job, 'parent_job_id', None),
+        'state': 'ERROR' if error else 'DONE',
+        'error': error.get('message') if error else None,
+        'created': _iso(job.created),
+        'started': _iso(job.started),
+        'ended': _iso(job.ended),
+        'queued_ms': _ms(job.created, job.started),
+        'duration_ms': _ms(job.started, job.ended),
+        'estimated_bytes': estimated_bytes,
+        'bytes_processed': job.total_bytes_processed,
+        'bytes_billed': job.total_bytes_billed,
+        'slot_ms': job.slot_millis,
+        'cache_hit': job.cache_hit,
+        'rows_affected': job.num_dml_affected_rows,
+        'rows_returned': rows_returned,
+        'stages': stages,
+    }
+
+
+class TelemetryRecorder:
+    """Collects job records of one pipeline run (thread-safe)"""
+
+    def __init__(self, path=TELEMETRY_FILE, runs_table=RUNS_TABLE):
+        self.run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.run_started_at = datetime.now(timezone.utc).isoformat()
+        self.path = path
+        self.runs_table = runs_table
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, job, node, statement_index, **kwargs):
+        """Record one job; telemetry must never fail the pipeline"""
+        try:
+            record = dict(run_id=self.run_id, run_started_at=self.run_started_at,
+                          **job_record(job, node, statement_index, **kwargs))
+        except Exception as e:
+            logger.warning(f"⚠ Could not record telemetry for job {getattr(job, 'job_id', '?')}: {str(e)}")
+            return
+        with self._lock:
+            self.records.append(record)
+
+    def flush(self, client, location):
+        """Append the records to the JSON lines file and the runs table"""
+        if not self.records:
+            return
+        try:
+            with open(self.path, 'a') as f:
+                for record in self.records:
+                    f.write(json.dumps(record, default=str) + "\n")
+            logger.info(f"✓ Telemetry: {len(self.records)} jobs of run {self.run_id} → {self.path}")
+        except Exception as e:
+            logger.warning(f"⚠ Could not write telemetry file {self.path}: {str(e)}")
+
+        if self.runs_table:
+            try:
+                job_config = bigquery.LoadJobConfig(
+                    schema=RUNS_SCHEMA,
+                    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                    create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+                    time_partitioning=bigquery.TimePartitioning(field="run_started_at"),
+                )
+                rows = [dict(record, stages=json.dumps(record['stages'])) for record in self.records]
+                client.load_table_from_json(
+                    rows, self.runs_table, job_config=job_config, location=location
+                ).result()
+                logger.info(f"✓ Telemetry: {len(rows)} jobs loaded into {self.runs_table}")
+            except Exception as e:
+                logger.warning(f"⚠ Could not load telemetry into {self.runs_table}: {str(e)}")
+
+
+# ============================================================================
+# Report
+# ============================================================================
+
+def read_records(path):
+    """Records from a JSON lines telemetry file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def query_records(client, runs_table, runs):
+    """Records of the last `runs` runs from the BigQuery runs table"""
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter("runs", "INT64", runs)]
+    )
+    rows = client.query(f"""
+        SELECT * EXCEPT (stages)
+        FROM `{runs_table}`
+        WHERE run_id IN (
+          SELECT run_id FROM `{runs_table}`
+          WHERE run_started_at >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 90 DAY)
+          GROUP BY run_id
+          ORDER BY MAX(run_started_at) DESC
+          LIMIT @runs
+        )
+    """, job_config=job_config).result()
+    return [dict(row) for row in rows]
+
+
+def summarize(records, runs):
+    """Aggregate records of the last `runs` runs per (node, statement)"""
+    started = {}
+    for record in records:
+        started[record['run_id']] = str(record['run_started_at'])
+    recent = set(sorted(started, key=started.get)[-runs:])
+
+    groups = {}
+    for record in records:
+        if record['run_id'] not in recent:
+            continue
+        key = (record['node'], record['statement_index'], record['statement_hash'])
+        group = groups.setdefault(key, {
+            'node': record['node'], 'statement': record['statement_index'],
+            'type': record['statement_type'], 'hash': record['statement_hash'],
+            'jobs': 0, 'duration_ms': 0, 'bytes_billed': 0, 'slot_ms': 0, 'max_duration_ms': 0,
+        })
+        group['jobs'] += 1
+        group['duration_ms'] += record['duration_ms'] or 0
+        group['max_duration_ms'] = max(group['max_duration_ms'], record['duration_ms'] or 0)
+        group['bytes_billed'] += record['bytes_billed'] or 0
+        group['slot_ms'] += record['slot_ms'] or 0
+    return len(recent), list(groups.values())
+
+
+def print_report(records, runs, top):
+    """Print the slowest and most expensive statements"""
+    run_count, groups = summarize(records, runs)
+    print(f"\n📊 Pipeline telemetry: {run_count} most recent runs, {sum(g['jobs'] for g in groups)} jobs")
+
+    rankings = [
+        ("⏱  Slowest statements (avg duration)", lambda g: g['duration_ms'] / g['jobs']),
+        ("💰 Most expensive statements (total bytes billed)", lambda g: g['bytes_billed']),
+        ("🔥 Most slot time (total slot seconds)", lambda g: g['slot_ms']),
+    ]
+    for title, key in rankings:
+        print(f"\n{title}")
+        print(f"  {'node':<48} {'stmt':>4} {'type':<8} {'runs':>4} {'avg s':>7} {'max s':>7} "
+              f"{'billed':>10} {'slot s':>8}")
+        for g in sorted(groups, key=key, reverse=True)[:top]:
+            print(f"  {g['node'][:48]:<48} {g['statement']:>4} {(g['type'] or '')[:8]:<8} {g['jobs']:>4} "
+                  f"{g['duration_ms'] / g['jobs'] / 1000:>7.1f} {g['max_duration_ms'] / 1000:>7.1f} "
+                  f"{format_bytes(g['bytes_billed']):>10} {g['slot_ms'] / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Permits pipeline job telemetry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report = subparsers.add_parser("report", help="Slowest and most expensive statements across recent runs")
+    report.add_argument("--runs", type=int, default=10, help="Number of most recent runs (default 10)")
+    report.add_argument("--top", type=int, default=10, help="Statements per ranking (default 10)")
+    report.add_argument("--file", default=TELEMETRY_FILE, help="JSON lines telemetry file")
+    report.add_argument("--bigquery", action="store_true", help="Read PIPELINE_RUNS_TABLE instead of the file")
+    args = parser.parse_args()
+
+    if args.bigquery:
+        if not RUNS_TABLE:
+            print("❌ PIPELINE_RUNS_TABLE is not set")
+            sys.exit(1)
+        records = query_records(bigquery.Client(project=RUNS_TABLE.split('.')[0]), RUNS_TABLE, args.runs)
+    elif os.path.exists(args.file):
+        records = read_records(args.file)
+    else:
+        print(f"❌ No telemetry file at {args.file}")
+        sys.exit(1)
+
+    if not records:
+        print("No telemetry recorded yet")
+        sys.exit(0)
+    print_report(records, args.runs, args.top)
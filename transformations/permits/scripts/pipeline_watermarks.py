@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Incremental high-water marks
+Purpose: Pass each incremental layer the point up to which its source has
+         already been processed, instead of re-merging a fixed 30-day window
+
+  BRONZE   @since_issue_date    Latest raw issue_date merged into bronze (the
+                                raw table has no load timestamp; the extractor
+                                appends one issue date per run). Raw is
+                                re-read from 30 days before it, so days loaded
+                                late or backfilled behind it are kept.
+  SILVER   @since_extracted_at  Latest bronze extracted_at enriched into silver
+           @min_issue_date      Earliest issue_date among those bronze rows,
+                                resolved when the layer starts; prunes the
+                                bronze scan (silver is matched by id alone)
+           @enriched_at         Start of the layer; tags the run's rows in
+                                silver_permits_changes
+           @boundaries_fingerprint
+                                Hash of the ZIP and neighborhood boundary
+                                tables' fingerprints; geography cache entries
+                                resolved against other boundaries are dropped
+  GOLD     @since_enriched_at   Latest silver_permits_changes enriched_at
+                                applied to gold (its ZIPs are recomputed)
+           @full_rebuild        Recompute every ZIP: initial load, or a mark
+                                older than the change log keeps its rows
+
+Values under 'resolved' are queried when the layer starts; those under
+'fingerprints' hash table metadata (tables_hash), so they cost no bytes.
+
+WATERMARKS holds the specs of the permits layers; other datasets declare
+theirs in their manifest (pipeline_manifests.py). The watermark is read from
+pipeline state (kind 'watermark'). If a target table is missing or empty the
+layer gets its initial-load value instead; if the targets have rows but no
+watermark was stored yet (first run after this change) it is derived from the
+target table, or starts from the initial-load value if it cannot be (gold).
+"""
+
+import re
+import logging
+
+from google.cloud import bigquery
+
+from pipeline_state import table_fingerprint, tables_hash
+
+logger = logging.getLogger(__name__)
+
+BRONZE_TABLE = "chicago-bi-app-msds-432-476520.bronze_data.bronze_building_permits"
+SILVER_TABLE = "chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched"
+CHANGES_TABLE = "chicago-bi-app-msds-432-476520.silver_data.silver_permits_changes"
+ZIP_BOUNDARIES_TABLE = "chicago-bi-app-msds-432-476520.reference_data.zip_code_boundaries"
+NEIGHBORHOOD_BOUNDARIES_TABLE = "chicago-bi-app-msds-432-476520.reference_data.neighborhood_boundaries"
+GOLD_TABLES = [
+    "chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi",
+    "chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets",
+]
+
+# partition_expiration_days of silver_permits_changes
+CHANGES_RETENTION_DAYS = 30
+
+WATERMARKS = {
+    "BRONZE": {
+        'parameter': 'since_issue_date',
+        'type': 'DATE',
+        'targets': [BRONZE_TABLE],
+        'initial': '2020-01-01',
+        'derive': f"SELECT MAX(issue_date) FROM `{BRONZE_TABLE}`",
+        'processed': f"SELECT MAX(issue_date) FROM `{BRONZE_TABLE}`",
+        'resolved': {},
+    },
+    "SILVER": {
+        'parameter': 'since_extracted_at',
+        'type': 'TIMESTAMP',
+        'targets': [SILVER_TABLE],
+        'initial': '1970-01-01T00:00:00+00:00',
+        'derive': f"SELECT MAX(enriched_at) FROM `{SILVER_TABLE}`",
+        'processed': f"SELECT MAX(extracted_at) FROM `{BRONZE_TABLE}`",
+        'resolved': {
+            'min_issue_date': ('DATE', f"""
+                SELECT MIN(issue_date) FROM `{BRONZE_TABLE}`
+                WHERE extracted_at > @since_extracted_at
+            """),
+            'enriched_at': ('TIMESTAMP', "SELECT CURRENT_TIMESTAMP()"),
+        },
+        'fingerprints': {
+            'boundaries_fingerprint': [ZIP_BOUNDARIES_TABLE, NEIGHBORHOOD_BOUNDARIES_TABLE],
+        },
+    },
+    "GOLD": {
+        'parameter': 'since_enriched_at',
+        'type': 'TIMESTAMP',
+        'targets': GOLD_TABLES,
+        'initial': '1970-01-01T00:00:00+00:00',
+        'derive': None,  # gold does not record which changes it applied
+        'processed': f"SELECT MAX(enriched_at) FROM `{CHANGES_TABLE}`",
+        'resolved': {
+            'full_rebuild': ('BOOL', f"""
+                SELECT @since_enriched_at < CURRENT_TIMESTAMP() - INTERVAL {CHANGES_RETENTION_DAYS - 1} DAY
+            """),
+        },
+    },
+}
+
+
+def _to_json(value):
+    """Query result value as a parameter/state string"""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _scalar(client, sql, location, parameters=None):
+    """First column of the first row of a query"""
+    job_config = bigquery.QueryJobConfig(query_parameters=statement_parameters(sql, parameters))
+    rows = list(client.query(sql, job_config=job_config, location=location).result())
+    return _to_json(rows[0][0]) if rows else None
+
+
+def resolve_watermark(client, layer_name, spec, stored, location, full_refresh=False):
+    """Return (watermark, source) for a layer with watermark spec
+
+    source is 'initial load', 'stored' or 'derived'.
+    """
+    targets = [table_fingerprint(client, table) for table in spec['targets']]
+    if full_refresh or any(target is None or not target['rows'] for target in targets):
+        return spec['initial'], 'initial load'
+    if stored.get(layer_name) is not None:
+        return stored[layer_name], 'stored'
+
+    derived = _scalar(client, spec['derive'], location) if spec['derive'] else None
+    if derived is None:
+        return spec['initial'], 'initial load'
+    return derived, 'derived'
+
+
+def query_parameter(name, type_, value):
+    """Scalar or ARRAY<type> query parameter (a NULL array is empty)"""
+    array = re.fullmatch(r'ARRAY<(\w+)>', type_)
+    if array:
+        return bigquery.ArrayQueryParameter(name, array.group(1), [_to_json(v) for v in value or []])
+    return bigquery.ScalarQueryParameter(name, type_, value)
+
+
+def layer_parameters(client, spec, watermark, location):
+    """Query parameters for a layer's SQL, resolving dependent values now"""
+    parameters = [bigquery.ScalarQueryParameter(spec['parameter'], spec['type'], watermark)]
+    for name, (type_, sql) in spec['resolved'].items():
+        value = _scalar(client, sql, location, parameters)
+        parameters.append(query_parameter(name, type_, value))
+    for name, tables in spec.get('fingerprints', {}).items():
+        parameters.append(bigquery.ScalarQueryParameter(name, 'STRING', tables_hash(client, tables)))
+    return parameters
+
+
+def processed_watermark(client, spec, location):
+    """Watermark reached by a layer that just completed"""
+    return _scalar(client, spec['processed'], location)
+
+
+def statement_parameters(statement, parameters):
+    """The parameters a single statement references (outside line comments)"""
+    code = re.sub(r'--[^\n]*', '', statement)
+    return [p for p in parameters or [] if re.search(rf'@{p.name}\b', code)]
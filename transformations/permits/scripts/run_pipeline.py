@@ -2,30 +2,77 @@
 """
 Building Permits Data Pipeline - Orchestration Script
 Purpose: Run incremental transformations from raw → bronze → silver → gold
+         for the datasets declared in pipeline_manifests.py (permits by
+         default; trips, COVID, CCVI and the forecasts with --manifest)
 Author: Claude Code
 Created: November 21, 2025
 """
 
 import os
 import sys
+import shlex
+import asyncio
+import argparse
 import logging
 from datetime import datetime
+from functools import partial
 from google.cloud import bigquery
-from google.cloud.exceptions import GoogleCloudError
+from google.cloud.exceptions import GoogleCloudError, NotFound
+
+from pipeline_checkpoints import NodeCheckpoint, clear_checkpoints, load_checkpoints, plan_resume, submit_query
+from pipeline_dag import (
+    WORK_KINDS, Node, DagExecutionError, build_dependencies, group_statements, run_dag,
+    session_tables, split_sql_statements, statement_keyword, statement_tables, temp_table_query
+)
+from pipeline_costs import estimate_nodes, format_bytes, report_estimates
+from pipeline_dashboards import materialization_statements
+from pipeline_telemetry import RUNS_TABLE, TelemetryRecorder
+from pipeline_manifests import LAYER_MANIFESTS, LAYER_NAMES, MANIFESTS, manifest_layers, sql_path
+from pipeline_partitions import parse_date_range, plan_partitions, run_partitions
+from pipeline_sessions import PipelineSession
+from pipeline_stats import STATS_TABLE, compute_layer_stats
+from pipeline_state import (
+    ensure_state_table, layer_fingerprint, load_state, save_state, table_fingerprint
+)
+from pipeline_watermarks import layer_parameters, processed_watermark, resolve_watermark, statement_parameters
+from local_backend import DuckDBClient
 
 # Configuration
 PROJECT_ID = "chicago-bi-app-msds-432-476520"
 LOCATION = "us-central1"
 
-# SQL file paths
-SQL_FILES = [
-    "01_bronze_permits_incremental.sql",
-    "02_silver_permits_incremental.sql",
-    "03_gold_permits_aggregates.sql"
-]
+# Manifests run when none are given (comma-separated)
+DEFAULT_MANIFESTS = os.environ.get("PIPELINE_MANIFESTS", "permits").split(",")
+
+# How each layer file is submitted:
+#   script      - whole file as one BigQuery scripting job (one round trip)
+#   statements  - split into statements, one job each (fallback)
+EXECUTION_MODES = ["script", "statements"]
+DEFAULT_EXECUTION_MODE = os.environ.get("PIPELINE_EXECUTION_MODE", "script")
+
+# Where the SQL runs:
+#   bigquery  - the production project
+#   duckdb    - a local DuckDB database loaded from Parquet fixtures (offline
+#               testing and benchmarks, see local_backend.py)
+BACKENDS = ["bigquery", "duckdb"]
+DEFAULT_BACKEND = os.environ.get("PIPELINE_BACKEND", "bigquery")
+DEFAULT_LOCAL_DATABASE = os.environ.get("PIPELINE_LOCAL_DATABASE", "permits_local.duckdb")
 
-# Layer names for logging
-LAYER_NAMES = ["BRONZE", "SILVER", "GOLD"]
+# Maximum BigQuery jobs (and forecasting scripts) in flight at once
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("PIPELINE_MAX_CONCURRENCY", "4"))
+
+# Maximum of those per manifest, so one dataset cannot hold every slot when
+# several run together (0 = only the global limit)
+DEFAULT_MANIFEST_CONCURRENCY = int(os.environ.get("PIPELINE_MANIFEST_CONCURRENCY", "0"))
+
+# Maximum partition jobs in flight at once per partitioned layer (e.g. trips
+# silver); they are query jobs, not DML, so they do not queue on the table
+DEFAULT_PARTITION_CONCURRENCY = int(os.environ.get("PIPELINE_PARTITION_CONCURRENCY", "8"))
+
+# Abort if the dry-run estimate of all statements exceeds this (unless --force).
+# An incremental run processes well under 1 GB; the initial-load branches of
+# the bronze/silver MERGEs scan everything.
+DEFAULT_BYTE_BUDGET_GB = float(os.environ.get("PIPELINE_BYTE_BUDGET_GB", "5"))
 
 # Setup logging
 logging.basicConfig(
@@ -53,41 +100,76 @@ def read_sql_file(filepath):
         raise
 
 
-def execute_sql(client, sql_content, layer_name):
-    """Execute SQL query and return results"""
+def statement_estimate(estimates, i):
+    """Dry-run estimate of the i-th (1-based) statement, if known"""
+    return estimates[i - 1] if estimates and i <= len(estimates) else None
+
+
+def log_bytes(layer_name, i, estimate, actual):
+    """Log a statement's dry-run estimate next to its actual bytes processed"""
+    if estimate is not None or actual:
+        logger.info(f"      {layer_name}: statement {i} bytes: estimated {format_bytes(estimate)}, "
+                    f"actual {format_bytes(actual)}")
+
+
+def execute_sql(client, sql_content, layer_name, estimates=None, parameters=None, telemetry=None, checkpoint=None,
+                session=None):
+    """Execute SQL query and return results
+
+    estimates (dry-run bytes per statement) are logged next to the actual
+    bytes processed. Each statement gets the query parameters it references.
+    Every job's statistics are passed to telemetry, if given. With a
+    checkpoint, sql_content holds the node's statements from checkpoint.first
+    on; they run under deterministic job ids and each is checkpointed when it
+    completes. session holds the connection properties of the run's session
+    for SQL using temp tables.
+    """
     try:
         logger.info(f"▶ Executing {layer_name} transformation...")
 
-        # Split SQL into individual statements (separated by semicolons)
-        statements = [s.strip() for s in sql_content.split(';') if s.strip() and not s.strip().startswith('--')]
+        statements = split_sql_statements(sql_content)
+        first = checkpoint.first if checkpoint else 1
 
         results = []
-        for i, statement in enumerate(statements, 1):
-            # Skip pure comment statements
-            if statement.replace('\n', '').strip().startswith('--'):
-                continue
-
-            logger.info(f"  Running statement {i}/{len(statements)}...")
+        for i, statement in enumerate(statements, first):
+            logger.info(f"  {layer_name}: running statement {i}/{first - 1 + len(statements)}...")
 
+            query_job = None
+            row_count = None
             try:
-                query_job = client.query(statement, location=LOCATION)
+                job_config = bigquery.QueryJobConfig(
+                    query_parameters=statement_parameters(statement, parameters),
+                    connection_properties=session or []
+                )
+                if checkpoint:
+                    query_job = submit_query(client, statement, job_config, checkpoint.job_id(i, statement), LOCATION)
+                else:
+                    query_job = client.query(statement, job_config=job_config, location=LOCATION)
                 result = query_job.result()  # Wait for completion
 
                 # If it's a SELECT query, get row count
-                if statement.strip().upper().startswith('SELECT'):
+                if statement_keyword(statement) in ('SELECT', 'WITH'):
                     row_count = result.total_rows
                     results.append({
                         'statement': i,
                         'rows': row_count
                     })
-                    logger.info(f"    ✓ Statement {i} completed: {row_count} rows")
+                    logger.info(f"    ✓ {layer_name}: statement {i} completed: {row_count} rows")
                 else:
-                    logger.info(f"    ✓ Statement {i} completed")
+                    logger.info(f"    ✓ {layer_name}: statement {i} completed")
+                log_bytes(layer_name, i, statement_estimate(estimates, i), query_job.total_bytes_processed)
+                if checkpoint:
+                    checkpoint.statements_done([query_job.job_id])
 
             except GoogleCloudError as e:
-                logger.error(f"    ✗ Statement {i} failed: {str(e)}")
+                logger.error(f"    ✗ {layer_name}: statement {i} failed: {str(e)}")
                 raise
 
+            finally:
+                if telemetry and query_job is not None:
+                    telemetry.record(query_job, layer_name, i, statement=statement,
+                                     estimated_bytes=statement_estimate(estimates, i), rows_returned=row_count)
+
         logger.info(f"✓ {layer_name} transformation completed successfully")
         return results
 
@@ -96,57 +178,88 @@ def execute_sql(client, sql_content, layer_name):
         raise
 
 
-def get_layer_stats(client, layer_name):
-    """Get statistics for a data layer"""
-    queries = {
-        "BRONZE": """
-            SELECT
-                'BRONZE' as layer,
-                COUNT(*) as total_records,
-                COUNT(DISTINCT id) as unique_ids,
-                MIN(issue_date) as oldest_permit,
-                MAX(issue_date) as newest_permit,
-                MAX(extracted_at) as last_update
-            FROM `chicago-bi-app-msds-432-476520.bronze_data.bronze_building_permits`
-        """,
-        "SILVER": """
-            SELECT
-                'SILVER' as layer,
-                COUNT(*) as total_records,
-                COUNT(DISTINCT id) as unique_ids,
-                COUNT(DISTINCT zip_code) as unique_zips,
-                COUNTIF(zip_code IS NULL) as missing_zip,
-                MIN(issue_date) as oldest_permit,
-                MAX(issue_date) as newest_permit,
-                MAX(enriched_at) as last_update
-            FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched`
-        """,
-        "GOLD": """
-            SELECT
-                'GOLD - Permits ROI' as layer,
-                COUNT(*) as total_zip_codes,
-                SUM(total_permits) as total_permits,
-                ROUND(SUM(total_permit_value), 2) as total_value,
-                MAX(created_at) as last_update
-            FROM `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi`
-
-            UNION ALL
-
-            SELECT
-                'GOLD - Loan Targets' as layer,
-                COUNT(*) as total_zip_codes,
-                SUM(CAST(is_loan_eligible AS INT64)) as eligible_zips,
-                ROUND(AVG(eligibility_index), 2) as avg_eligibility,
-                MAX(created_at) as last_update
-            FROM `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets`
-        """
-    }
-
-    if layer_name not in queries:
+def execute_sql_script(client, sql_content, layer_name, estimates=None, parameters=None, telemetry=None,
+                       checkpoint=None, session=None):
+    """Execute a whole SQL file as one BigQuery scripting job
+
+    BigQuery runs each statement of the script as a child job; their status,
+    affected rows, SELECT row counts and bytes processed are read back from
+    the child jobs so the log matches statement mode (and passed to
+    telemetry, if given). With a checkpoint, sql_content holds the node's
+    statements from checkpoint.first on; the script runs under a
+    deterministic job id and its successful child jobs are checkpointed, even
+    if it fails part-way. session holds the connection properties of the
+    run's session for SQL using temp tables.
+    """
+    try:
+        logger.info(f"▶ Executing {layer_name} transformation (script job)...")
+
+        first = checkpoint.first if checkpoint else 1
+        job_config = bigquery.QueryJobConfig(query_parameters=parameters or [], connection_properties=session or [])
+        if checkpoint:
+            script_job = submit_query(client, sql_content, job_config, checkpoint.job_id(first, sql_content), LOCATION)
+        else:
+            script_job = client.query(sql_content, job_config=job_config, location=LOCATION)
+        try:
+            script_job.result()  # Wait for the whole script
+        finally:
+            # Child jobs exist even if the script failed part-way; a single
+            # statement runs as a plain query job without children
+            child_jobs = sorted(
+                client.list_jobs(parent_job=script_job.job_id),
+                key=lambda job: job.created
+            ) or [script_job]
+            if checkpoint:
+                succeeded = []
+                for job in child_jobs:
+                    if job.error_result:
+                        break
+                    succeeded.append(job.job_id)
+                checkpoint.statements_done(succeeded)
+
+        results = []
+        for i, job in enumerate(child_jobs, first):
+            statement_type = job.statement_type or 'UNKNOWN'
+            row_count = None
+            if job.error_result:
+                logger.error(f"    ✗ {layer_name}: statement {i} ({statement_type}) failed: {job.error_result.get('message')}")
+            elif statement_type == 'SELECT':
+                row_count = job.result().total_rows
+                results.append({
+                    'statement': i,
+                    'rows': row_count
+                })
+                logger.info(f"    ✓ {layer_name}: statement {i} ({statement_type}) completed: {row_count} rows")
+            elif job.num_dml_affected_rows is not None:
+                logger.info(f"    ✓ {layer_name}: statement {i} ({statement_type}) completed: {job.num_dml_affected_rows} rows affected")
+            else:
+                logger.info(f"    ✓ {layer_name}: statement {i} ({statement_type}) completed")
+            log_bytes(layer_name, i, statement_estimate(estimates, i), job.total_bytes_processed)
+            if telemetry:
+                telemetry.record(job, layer_name, i, estimated_bytes=statement_estimate(estimates, i),
+                                 rows_returned=row_count)
+
+        logger.info(f"✓ {layer_name} transformation completed successfully ({len(child_jobs)} statements, 1 job, "
+                    f"{format_bytes(script_job.total_bytes_processed)} processed)")
+        return results
+
+    except Exception as e:
+        logger.error(f"✗ {layer_name} transformation failed: {str(e)}")
+        raise
+
+
+def get_layer_stats(client, layer):
+    """Get statistics for a data layer (its manifest's stats spec or query)"""
+    layer_name = layer['name']
+    spec = layer.get('stats')
+    if not spec:
         return None
 
     try:
-        query_job = client.query(queries[layer_name], location=LOCATION)
+        if isinstance(spec, dict):
+            return compute_layer_stats(client, layer_name, spec, LOCATION)
+
+        query_job = client.query(spec, location=LOCATION)
         results = query_job.result()
 
         stats = []
@@ -159,69 +272,548 @@ def get_layer_stats(client, layer_name):
         return None
 
 
-def run_pipeline():
-    """Main pipeline execution"""
+def log_layer_stats(layer_name, stats):
+    """Log the statistics returned by get_layer_stats"""
+    if stats:
+        logger.info(f"\n📊 {layer_name} Layer Statistics:")
+        for stat in stats:
+            for key, value in stat.items():
+                logger.info(f"  {key}: {value}")
+
+
+def run_parameters(client, layer, watermarks):
+    """Query parameters of a layer's SQL, resolved when it starts (None if the
+    layer takes no watermark)"""
+    if layer['name'] not in watermarks:
+        return None
+    return layer_parameters(client, layer['watermark'], watermarks[layer['name']], LOCATION)
+
+
+def run_sql_node(client, node, layer, mode, estimates, watermarks, resume, telemetry=None, session=None):
+    """Run a SQL node from its first incomplete statement
+
+    resume holds the run id the node's job ids and checkpoint belong to and
+    the valid checkpoints of the run being resumed, if any. A node using
+    temp tables runs in the run's session; resumed, it first rebuilds the
+    temp tables of its completed statements.
+    """
+    stored = resume['checkpoints'].get(node.name)
+    if stored and stored['completed'] >= len(node.statements):
+        logger.info(f"⏭ {node.name} completed in run {resume['run_id']}")
+        return []
+
+    if stored:
+        checkpoint = NodeCheckpoint(client, resume['run_id'], node, LOCATION, stored=stored)
+        logger.info(f"↺ {node.name}: resuming run {resume['run_id']} at statement "
+                    f"{checkpoint.first}/{len(node.statements)}")
+    else:
+        checkpoint = NodeCheckpoint(client, resume['run_id'], node, LOCATION,
+                                    parameters=run_parameters(client, layer, watermarks))
+
+    execute = execute_sql_script if mode == "script" else execute_sql
+    sql = ";\n\n".join(node.statements[checkpoint.first - 1:]) + ";"
+    if not any(session_tables(statement) for statement in node.statements):
+        return execute(client, sql, node.name, estimates.get(node.name), checkpoint.parameters, telemetry, checkpoint)
+
+    with session.use() as properties:
+        rebuild = [statement for statement in node.statements[:checkpoint.first - 1] if temp_table_query(statement)]
+        if rebuild:
+            logger.info(f"↺ {node.name}: rebuilding {len(rebuild)} session temp tables")
+            execute(client, ";\n\n".join(rebuild) + ";", f"{node.name} [temp tables]",
+                    parameters=checkpoint.parameters, telemetry=telemetry, session=properties)
+        return execute(client, sql, node.name, estimates.get(node.name), checkpoint.parameters, telemetry, checkpoint,
+                       properties)
+
+
+async def run_command_node(client, node, script_dir):
+    """Run a command layer's script as a subprocess, logging its output as it
+    arrives; a non-zero exit status fails the node"""
+    if isinstance(client, DuckDBClient):
+        logger.info(f"⏭ {node.name}: scripts run against BigQuery only - skipped on the duckdb backend")
+        return None
+
+    script, *args = node.command
+    logger.info(f"▶ Executing {node.name}: {shlex.join([os.path.basename(script), *args])}")
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, sql_path(script, script_dir), *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    async for line in process.stdout:
+        logger.info(f"  {node.name}: {line.decode(errors='replace').rstrip()}")
+    returncode = await process.wait()
+    if returncode != 0:
+        logger.error(f"✗ {node.name} exited with status {returncode}")
+        raise RuntimeError(f"{os.path.basename(script)} exited with status {returncode}")
+
+    logger.info(f"✓ {node.name} completed successfully")
+    return returncode
+
+
+def run_partition_node(client, node, layer, partitions, watermarks, resume, max_concurrency, telemetry=None):
+    """Replace the planned date partitions of a partitioned layer
+
+    partitions holds the dates planned for each partitioned layer. Partition
+    job ids belong to resume's run id, so a resumed run attaches to the
+    partitions that already succeeded.
+    """
+    return run_partitions(
+        client, node, layer['name'], layer['partitions'], partitions.get(layer['name'], []),
+        run_parameters(client, layer, watermarks) or [], resume['run_id'], LOCATION, max_concurrency, telemetry
+    )
+
+
+def build_pipeline_nodes(client, layers, script_dir, mode, estimates, watermarks, resume, telemetry=None,
+                         partitions=None, partition_concurrency=DEFAULT_PARTITION_CONCURRENCY, session=None):
+    """Build the pipeline DAG from the manifest layers' SQL files and stats
+
+    Each layer's files are split into statements and grouped into independent
+    chains (e.g. the two gold aggregates); each chain is one node, run as one
+    script job or statement by statement depending on mode. A partitioned
+    layer is one node that runs its SELECT once per date partition, a command
+    layer one node that runs its script. A views layer's statements are
+    generated from the dashboard view definitions. Each layer's stats are a
+    read-only node. estimates (filled in by the dry run), watermarks,
+    partitions and resume (resolved after planning) are read by
+    the SQL nodes when they run; their jobs are recorded in telemetry. Nodes
+    using temp tables run in session.
+    """
+    if partitions is None:
+        partitions = {}
+    nodes = []
+    for layer in layers:
+        layer_name = layer['name']
+        if layer.get('command'):
+            nodes.append(Node(
+                name=f"{layer_name} [{os.path.basename(layer['command'][0])}]", layer=layer_name, run=None,
+                kind="command", reads=set(layer['reads']), writes=set(layer['writes']), command=layer['command']
+            ))
+            nodes[-1].run = partial(run_command_node, client, nodes[-1], script_dir)
+            continue
+
+        if layer.get('views'):
+            layer_statements = materialization_statements(
+                layer['views'], lambda path: read_sql_file(sql_path(path, script_dir))
+            )
+        else:
+            layer_statements = [
+                statement for sql_file in layer['sql']
+                for statement in split_sql_statements(read_sql_file(sql_path(sql_file, script_dir)))
+            ]
+
+        partition_spec = layer.get('partitions')
+        if partition_spec:
+            if len(layer_statements) != 1:
+                raise ValueError(f"{layer_name}: a partitioned layer's SQL must be one SELECT")
+            reads, _ = statement_tables(layer_statements[0])
+            groups = [(layer_statements, reads, {partition_spec['table']})]
+        else:
+            groups = group_statements(layer_statements)
+
+        for statements, reads, writes in groups:
+            tables = ", ".join(sorted(table.split('.')[-1] for table in writes)) or "select"
+            label = f"{layer_name} [{tables}{' partitions' if partition_spec else ''}]"
+
+            node = Node(name=label, layer=layer_name, run=None, reads=reads, writes=writes, statements=statements)
+            if partition_spec:
+                node.run = lambda node=node, layer=layer: run_partition_node(
+                    client, node, layer, partitions, watermarks, resume, partition_concurrency, telemetry
+                )
+            else:
+                node.run = lambda node=node, layer=layer: run_sql_node(
+                    client, node, layer, mode, estimates, watermarks, resume, telemetry, session
+                )
+            nodes.append(node)
+
+        spec = layer.get('stats')
+        run = lambda layer=layer: log_layer_stats(layer['name'], get_layer_stats(client, layer))
+        if isinstance(spec, dict):
+            nodes.append(Node(
+                name=f"{layer_name} [stats]", layer=layer_name, run=run, kind="stats",
+                reads={spec['table']}, writes={STATS_TABLE}
+            ))
+        elif spec:
+            reads, _ = statement_tables(spec)
+            nodes.append(Node(
+                name=f"{layer_name} [stats]", layer=layer_name, run=run, kind="stats", reads=reads,
+                statements=[spec]
+            ))
+
+    for node in nodes:
+        node.pipeline = LAYER_MANIFESTS[node.layer]
+    return build_dependencies(nodes)
+
+
+def count_completed_layers(nodes, completed, layer_names):
+    """Number of layers whose SQL (or command) nodes all completed"""
+    done = {node.name for node in completed}
+    return sum(
+        all(node.name in done for node in nodes if node.layer == layer_name and node.kind in WORK_KINDS)
+        for layer_name in layer_names
+    )
+
+
+def layer_tables(nodes, layer_name):
+    """Return (inputs, outputs) of a layer's SQL (or command) nodes
+
+    Inputs are the tables the layer reads but does not write itself.
+    """
+    work_nodes = [node for node in nodes if node.layer == layer_name and node.kind in WORK_KINDS]
+    reads = set().union(*(node.reads for node in work_nodes))
+    writes = set().union(*(node.writes for node in work_nodes))
+    return reads - writes, writes
+
+
+def plan_layer_skips(client, nodes, stored, layer_names):
+    """Decide which layers can be skipped because nothing they depend on changed
+
+    A layer is skipped when its SQL and every table it reads or writes (last
+    modified, row count) match the fingerprint stored after its last
+    successful run, and no earlier layer that runs in this pipeline writes one
+    of its inputs.
+    Returns (skipped layer names, {layer: fingerprint at plan time}).
+    """
+    tables = {layer_name: layer_tables(nodes, layer_name) for layer_name in layer_names}
+    snapshot = {table: table_fingerprint(client, table)
+                for inputs, outputs in tables.values() for table in inputs | outputs}
+
+    skipped = []
+    fingerprints = {}
+    written_this_run = set()
+    for layer_name in layer_names:
+        work_nodes = [node for node in nodes if node.layer == layer_name and node.kind in WORK_KINDS]
+        statements = ([s for node in work_nodes for s in node.statements]
+                      + [shlex.join(node.command) for node in work_nodes if node.command])
+        inputs, outputs = tables[layer_name]
+        fingerprints[layer_name] = layer_fingerprint(
+            statements, {table: snapshot[table] for table in inputs | outputs}
+        )
+
+        if stored.get(layer_name) == fingerprints[layer_name] and not inputs & written_this_run:
+            skipped.append(layer_name)
+        else:
+            written_this_run |= outputs
+
+    return skipped, fingerprints
+
+
+def plan_reference_rebuilds(layers, skipped, stored, fingerprints):
+    """Layers that run and declare reference tables (rebuild_on) changed since
+    their last successful run; returns {layer: changed tables}"""
+    rebuilds = {}
+    for layer in [layer for layer in layers if layer.get('rebuild_on') and layer['name'] not in skipped]:
+        previous = stored.get(layer['name'], {}).get('tables', {})
+        current = fingerprints[layer['name']]['tables']
+        changed = [table for table in layer['rebuild_on'] if table in previous and previous[table] != current.get(table)]
+        if changed:
+            rebuilds[layer['name']] = changed
+    return rebuilds
+
+
+def record_layer_state(client, layer, fingerprint, refresh):
+    """Store a layer's fingerprint and watermark after it ran successfully
+
+    Tables written in this run (refresh) are re-read so the next run compares
+    against their post-run state. Failures are only logged: a missing
+    fingerprint costs a skip next time, a stale watermark reprocesses more.
+    """
+    layer_name = layer['name']
+    tables = dict(fingerprint['tables'])
+    for table in tables.keys() & refresh:
+        tables[table] = table_fingerprint(client, table)
+
+    try:
+        save_state(client, 'fingerprint', layer_name, dict(fingerprint, tables=tables), LOCATION)
+        logger.info(f"✓ {layer_name} fingerprint recorded")
+    except Exception as e:
+        logger.warning(f"⚠ Could not record {layer_name} fingerprint (it will rerun next time): {str(e)}")
+
+    if layer.get('watermark'):
+        try:
+            watermark = processed_watermark(client, layer['watermark'], LOCATION)
+            if watermark is not None:
+                save_state(client, 'watermark', layer_name, watermark, LOCATION)
+                logger.info(f"✓ {layer_name} watermark advanced to {watermark}")
+        except Exception as e:
+            logger.warning(f"⚠ Could not record {layer_name} watermark (next run reprocesses more): {str(e)}")
+
+
+def apply_layer_skips(client, nodes, layers, skipped, fingerprints):
+    """Drop the nodes of skipped layers and add a state node per running layer
+
+    Each state node waits for all SQL (or command) nodes of its layer. Dependencies on
+    dropped nodes are removed, so a running layer does not wait for a
+    skipped one forever.
+    """
+    nodes = [node for node in nodes if node.layer not in skipped]
+    remaining = {node.name for node in nodes}
+    for node in nodes:
+        node.depends_on &= remaining
+    written = set().union(*(node.writes for node in nodes))
+
+    for layer in [layer for layer in layers if layer['name'] not in skipped]:
+        layer_name = layer['name']
+        work_nodes = {node.name for node in nodes if node.layer == layer_name and node.kind in WORK_KINDS}
+        run = lambda layer=layer: record_layer_state(
+            client, layer, fingerprints[layer['name']], written
+        )
+        nodes.append(Node(
+            name=f"{layer_name} [state]", layer=layer_name, run=run, kind="state", depends_on=work_nodes,
+            pipeline=LAYER_MANIFESTS[layer_name]
+        ))
+
+    return nodes
+
+
+def run_pipeline(mode=DEFAULT_EXECUTION_MODE, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 byte_budget_gb=DEFAULT_BYTE_BUDGET_GB, force=False, estimate_only=False, skip_unchanged=True,
+                 full_refresh=(), backend=DEFAULT_BACKEND, fixtures=None, database=DEFAULT_LOCAL_DATABASE,
+                 resume_failed=False, manifests=DEFAULT_MANIFESTS, dates=None,
+                 partition_concurrency=DEFAULT_PARTITION_CONCURRENCY,
+                 manifest_concurrency=DEFAULT_MANIFEST_CONCURRENCY):
+    """Main pipeline execution
+
+    manifests names the datasets to run (see pipeline_manifests.py);
+    full_refresh names the layers that ignore their watermark and reprocess
+    all data (they are never skipped). dates, a (first, last) pair, replaces
+    the planned date range of partitioned layers (they are never skipped).
+    manifest_concurrency caps the nodes of one manifest running at once.
+    """
     start_time = datetime.now()
+    local = backend == "duckdb"
+    telemetry = TelemetryRecorder(runs_table="" if local else RUNS_TABLE)
 
     logger.info("=" * 80)
     logger.info("BUILDING PERMITS DATA PIPELINE - INCREMENTAL UPDATE")
     logger.info("=" * 80)
     logger.info(f"Start time: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    logger.info(f"Project: {PROJECT_ID}")
-    logger.info(f"Location: {LOCATION}")
+    logger.info(f"Run id: {telemetry.run_id}")
+    logger.info(f"Manifests: {', '.join(manifests)}")
+    if local:
+        logger.info(f"Backend: duckdb ({database})")
+    else:
+        logger.info(f"Project: {PROJECT_ID}")
+        logger.info(f"Location: {LOCATION}")
+    logger.info(f"Execution mode: {mode}")
+    logger.info(f"Max concurrency: {max_concurrency}"
+                + (f", {manifest_concurrency} per manifest" if manifest_concurrency else "")
+                + f" ({partition_concurrency} partitions per partitioned layer)")
+    logger.info(f"Byte budget: {byte_budget_gb:g} GB" + (" (--force)" if force else ""))
+    logger.info(f"Skip unchanged layers: {'yes' if skip_unchanged else 'no'}")
+    if full_refresh:
+        logger.info(f"Full refresh: {', '.join(full_refresh)} ignore their watermarks and reprocess all data")
+    if dates:
+        logger.info(f"Dates: partitioned layers replace {dates[0]} … {dates[1]}")
+    if resume_failed:
+        logger.info("Resume: continue the last failed run from its checkpoints")
     logger.info("")
 
-    # Initialize BigQuery client
+    # Initialize BigQuery client (or the local stand-in)
     try:
-        client = bigquery.Client(project=PROJECT_ID, location=LOCATION)
-        logger.info("✓ BigQuery client initialized")
+        if local:
+            client = DuckDBClient(database, project=PROJECT_ID)
+            logger.info(f"✓ DuckDB client initialized: {database}")
+            if fixtures:
+                loaded = client.load_fixtures(fixtures)
+                logger.info(f"✓ Fixtures from {fixtures}: {len(loaded)} tables (re)loaded")
+        else:
+            client = bigquery.Client(project=PROJECT_ID, location=LOCATION)
+            logger.info("✓ BigQuery client initialized")
     except Exception as e:
-        logger.error(f"✗ Failed to initialize BigQuery client: {str(e)}")
+        logger.error(f"✗ Failed to initialize {backend} client: {str(e)}")
         return 1
 
-    # Get script directory
+    # Get script directory (the SQL files sit next to it in the container;
+    # manifests name their paths in a repository checkout)
     script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Execute each transformation layer
-    success_count = 0
-    for i, (sql_file, layer_name) in enumerate(zip(SQL_FILES, LAYER_NAMES), 1):
-        logger.info("")
-        logger.info("-" * 80)
-        logger.info(f"STEP {i}/{len(SQL_FILES)}: {layer_name} LAYER")
-        logger.info("-" * 80)
+    # Plan: statement groups and stats queries with their table dependencies
+    estimates = {}
+    watermarks = {}
+    partitions = {}
+    resume = {'run_id': telemetry.run_id, 'checkpoints': {}}
+    session = PipelineSession(client, LOCATION)
+    try:
+        layers = manifest_layers(manifests)
+        layer_names = [layer['name'] for layer in layers]
+        nodes = build_pipeline_nodes(client, layers, script_dir, mode, estimates, watermarks, resume, telemetry,
+                                     partitions, partition_concurrency, session)
+    except Exception as e:
+        logger.error(f"✗ Failed to plan pipeline: {str(e)}")
+        return 1
+
+    # Load fingerprints, watermarks and (with --resume) checkpoints of previous runs
+    stored = {}
+    stored_fingerprints = {}
+    stored_watermarks = {}
+    stored_partitions = {}
+    checkpoints = {}
+    partitioned = {layer['name'] for layer in layers if layer.get('partitions')}
+    try:
+        ensure_state_table(client, LOCATION)
+        stored_fingerprints = load_state(client, 'fingerprint', LOCATION)
+        if skip_unchanged:
+            stored = {layer_name: fingerprint
+                      for layer_name, fingerprint in stored_fingerprints.items()
+                      if layer_name not in full_refresh and not (dates and layer_name in partitioned)}
+        stored_watermarks = load_state(client, 'watermark', LOCATION)
+        if partitioned:
+            stored_partitions = load_state(client, 'partitions', LOCATION)
+        if resume_failed:
+            resumed_run_id, checkpoints = load_checkpoints(client, LOCATION)
+            if resumed_run_id:
+                resume['run_id'] = resumed_run_id
+    except Exception as e:
+        logger.warning(f"⚠ Could not read pipeline state, running all layers: {str(e)}")
 
+    # Compare each layer's inputs and SQL with its last successful run
+    skipped, fingerprints = plan_layer_skips(client, nodes, stored, layer_names)
+
+    logger.info("")
+    for layer_name in skipped:
+        logger.info(f"⏭ {layer_name} skipped: SQL and tables unchanged since its last run")
+    nodes = apply_layer_skips(client, nodes, layers, skipped, fingerprints)
+
+    # A changed reference table invalidates every partition of the layers
+    # joining it
+    rebuilds = plan_reference_rebuilds(layers, skipped, stored_fingerprints, fingerprints)
+    for layer_name, tables in rebuilds.items():
+        logger.info(f"↺ {layer_name}: {', '.join(table.split('.')[-1] for table in tables)} changed "
+                    f"- full refresh")
+    full_refresh = set(full_refresh) | set(rebuilds)
+
+    # Resolve the high-water marks of the incremental layers that run; the
+    # plan-time parameters are only used for the dry run
+    for layer in [layer for layer in layers if layer.get('watermark') and layer['name'] not in skipped]:
+        layer_name, spec = layer['name'], layer['watermark']
         try:
-            # Read SQL file
-            sql_path = os.path.join(script_dir, sql_file)
-            sql_content = read_sql_file(sql_path)
+            watermarks[layer_name], source = resolve_watermark(
+                client, layer_name, spec, stored_watermarks, LOCATION, layer_name in full_refresh
+            )
+            try:
+                parameters = layer_parameters(client, spec, watermarks[layer_name], LOCATION)
+            except NotFound:
+                parameters = []  # source not created yet; resolved when the layer starts
+        except Exception as e:
+            logger.error(f"✗ Failed to resolve {layer_name} watermark: {str(e)}")
+            return 1
 
-            # Execute transformation
-            results = execute_sql(client, sql_content, layer_name)
+        logger.info(f"▶ {layer_name} watermark: @{spec['parameter']} = "
+                    f"{watermarks[layer_name]} ({source})")
+        for node in nodes:
+            if node.layer == layer_name and node.kind == "sql":
+                node.parameters = parameters
+
+        # Partitioned layers: dates to replace; the dry run estimates the first
+        if layer.get('partitions'):
+            partition_spec = layer['partitions']
+            partitions[layer_name] = plan_partitions(
+                watermarks[layer_name], stored_partitions.get(layer_name), dates
+            )
+            planned = partitions[layer_name]
+            logger.info(f"▶ {layer_name} partitions: {len(planned)} dates"
+                        + (f" ({planned[0]} … {planned[-1]})" if planned else ""))
+            for node in nodes:
+                if node.layer == layer_name and node.kind == "sql" and planned:
+                    node.parameters = list(parameters) + [
+                        bigquery.ScalarQueryParameter(partition_spec['parameter'], 'DATE', planned[0])
+                    ]
+
+    # Continue nodes of the failed run whose SQL and inputs are unchanged
+    if resume_failed:
+        logger.info("")
+        if not checkpoints:
+            logger.info("⚠ No checkpoints to resume from - running normally")
+        else:
+            resume['checkpoints'] = plan_resume(client, nodes, checkpoints)
+            logger.info(f"↺ Resuming run {resume['run_id']}:")
+            for node in [node for node in nodes if node.kind == "sql"]:
+                checkpoint = resume['checkpoints'].get(node.name)
+                if checkpoint:
+                    logger.info(f"  {node.name}: {checkpoint['completed']}/{len(node.statements)} statements done")
+                elif node.name in checkpoints:
+                    logger.info(f"  {node.name}: SQL or inputs changed since the checkpoint - rerun from statement 1")
 
-            # Get layer statistics
-            stats = get_layer_stats(client, layer_name)
-            if stats:
-                logger.info(f"\n📊 {layer_name} Layer Statistics:")
-                for stat in stats:
-                    for key, value in stat.items():
-                        logger.info(f"  {key}: {value}")
+    logger.info("")
+    logger.info("-" * 80)
+    logger.info(f"EXECUTION PLAN ({len(nodes)} nodes, max {max_concurrency} concurrent)")
+    logger.info("-" * 80)
+    for node in nodes:
+        after = ", ".join(sorted(node.depends_on)) or "start"
+        logger.info(f"  {node.name}  ← {after}")
+    logger.info("")
 
-            success_count += 1
+    # Dry-run every statement and enforce the byte budget (no bytes are
+    # billed locally)
+    logger.info("-" * 80)
+    logger.info("COST ESTIMATE")
+    logger.info("-" * 80)
+    if local:
+        logger.info("⏭ Skipped: dry runs and the byte budget apply to BigQuery only")
+        estimated_total, unknown = 0, 0
+    else:
+        estimates.update(estimate_nodes(client, nodes, LOCATION, max_concurrency))
+        for node in [node for node in nodes if node.layer in partitions and node.kind == "sql"]:
+            # One partition was dry-run; the others scan about as much
+            estimates[node.name] = [
+                None if estimate is None else estimate * len(partitions[node.layer])
+                for estimate in estimates[node.name]
+            ]
+        estimated_total, unknown = report_estimates(nodes, estimates, layer_names)
+    budget_bytes = byte_budget_gb * 1024 ** 3
+    logger.info("")
 
-        except Exception as e:
-            logger.error(f"✗ Pipeline failed at {layer_name} layer")
-            logger.error(f"Error: {str(e)}")
-
-            # Calculate duration
-            duration = datetime.now() - start_time
-            logger.info("")
-            logger.info("=" * 80)
-            logger.info(f"PIPELINE FAILED after {duration}")
-            logger.info(f"Successfully completed: {success_count}/{len(SQL_FILES)} layers")
-            logger.info("=" * 80)
+    if estimate_only:
+        logger.info("✓ Estimate only (--estimate) - nothing executed")
+        return 0
+
+    if unknown:
+        logger.warning(f"⚠ {unknown} statements could not be estimated and are not counted toward the "
+                       f"byte budget ({format_bytes(estimated_total)} estimated of {byte_budget_gb:g} GB)")
+    if estimated_total > budget_bytes:
+        if not force:
+            logger.error(f"✗ Estimated {format_bytes(estimated_total)} exceeds the byte budget "
+                         f"of {byte_budget_gb:g} GB - aborting (rerun with --force to proceed)")
             return 1
+        logger.warning(f"⚠ Estimated {format_bytes(estimated_total)} exceeds the byte budget "
+                       f"of {byte_budget_gb:g} GB - continuing because of --force")
+
+    # Progress of earlier runs is obsolete unless this run resumes it
+    if not resume['checkpoints']:
+        try:
+            clear_checkpoints(client, LOCATION)
+        except Exception as e:
+            logger.warning(f"⚠ Could not clear old checkpoints: {str(e)}")
+
+    # Execute the DAG (the session, if a node opened one, ends with it)
+    try:
+        try:
+            run_dag(nodes, max_concurrency, manifest_concurrency)
+        finally:
+            session.close()
+        success_count = len(layer_names) - len(skipped)
+    except DagExecutionError as e:
+        success_count = count_completed_layers(nodes, e.completed, layer_names) - len(skipped)
+        telemetry.flush(client, LOCATION)
+
+        logger.error(f"✗ Pipeline failed at {e.node.layer} layer ({e.node.name})")
+        logger.error(f"Error: {str(e.error)}")
+
+        # Calculate duration
+        duration = datetime.now() - start_time
+        logger.info("")
+        logger.info("=" * 80)
+        logger.info(f"PIPELINE FAILED after {duration}")
+        logger.info(f"Successfully completed: {success_count}/{len(layer_names)} layers")
+        logger.info(f"Completed statements are checkpointed; rerun with --resume to continue run {resume['run_id']}")
+        logger.info("=" * 80)
+        return 1
 
     # Pipeline completed successfully
+    telemetry.flush(client, LOCATION)
+    try:
+        clear_checkpoints(client, LOCATION)
+    except Exception as e:
+        logger.warning(f"⚠ Could not clear checkpoints: {str(e)}")
     end_time = datetime.now()
     duration = end_time - start_time
 
@@ -231,12 +823,15 @@ def run_pipeline():
     logger.info("=" * 80)
     logger.info(f"End time: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"Duration: {duration}")
-    logger.info(f"Layers processed: {success_count}/{len(SQL_FILES)}")
+    logger.info(f"Layers processed: {success_count}/{len(layer_names)}"
+                + (f" ({len(skipped)} skipped, unchanged)" if skipped else ""))
     logger.info("")
     logger.info("Summary:")
-    logger.info("  ✓ BRONZE: Incremental merge from raw")
-    logger.info("  ✓ SILVER: Spatial enrichment (ZIP, neighborhood)")
-    logger.info("  ✓ GOLD: Rebuilt aggregates (permits ROI, loan targets)")
+    for layer in layers:
+        if layer['name'] in skipped:
+            logger.info(f"  ⏭ {layer['name']}: Skipped (unchanged)")
+        else:
+            logger.info(f"  ✓ {layer['name']}: {layer['summary']}")
     logger.info("")
     logger.info("Next steps:")
     logger.info("  - Verify data in BigQuery")
@@ -248,8 +843,85 @@ def run_pipeline():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Layered SQL pipelines (building permits by default): raw → bronze → silver → gold"
+    )
+    parser.add_argument(
+        "--mode", choices=EXECUTION_MODES, default=DEFAULT_EXECUTION_MODE,
+        help="Submit each layer as one script job (default) or one job per statement"
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+        help="Maximum BigQuery jobs running at once (1 = sequential)"
+    )
+    parser.add_argument(
+        "--manifest-concurrency", type=int, default=DEFAULT_MANIFEST_CONCURRENCY,
+        help="Maximum of those per manifest when several run together (0 = no per-manifest limit)"
+    )
+    parser.add_argument(
+        "--byte-budget-gb", type=float, default=DEFAULT_BYTE_BUDGET_GB,
+        help="Abort when the dry-run estimate exceeds this many GB"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="Run even if the estimate exceeds the byte budget"
+    )
+    parser.add_argument(
+        "--estimate", action="store_true",
+        help="Only dry-run and report estimated bytes, execute nothing"
+    )
+    parser.add_argument(
+        "--no-skip", action="store_true",
+        help="Run every layer even if its inputs are unchanged since its last run"
+    )
+    parser.add_argument(
+        "--manifest", nargs="+", choices=list(MANIFESTS), default=DEFAULT_MANIFESTS,
+        help=f"Datasets to run, in one DAG (default: {','.join(DEFAULT_MANIFESTS)})"
+    )
+    parser.add_argument(
+        "--full-refresh", nargs="*", choices=LAYER_NAMES, metavar="LAYER",
+        help="Ignore the watermarks of these layers (default: all) and reprocess all their data, "
+             "e.g. --full-refresh GOLD to rebuild every ZIP (implies --no-skip for them)"
+    )
+    parser.add_argument(
+        "--dates", type=parse_date_range, metavar="START[:END]",
+        help="Partitioned layers (trips silver) replace these trip dates instead of those since their "
+             "watermark, e.g. --dates 2024-01-01:2024-12-31 to backfill (implies --no-skip for them)"
+    )
+    parser.add_argument(
+        "--partition-concurrency", type=int, default=DEFAULT_PARTITION_CONCURRENCY,
+        help="Maximum partition jobs running at once per partitioned layer"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue the last failed run from its first incomplete statements"
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default=DEFAULT_BACKEND,
+        help="Run against BigQuery (default) or a local DuckDB database"
+    )
+    parser.add_argument(
+        "--fixtures",
+        help="duckdb backend: load Parquet fixtures (<dir>/<dataset>/<table>.parquet) before running"
+    )
+    parser.add_argument(
+        "--database", default=DEFAULT_LOCAL_DATABASE,
+        help=f"duckdb backend: database file (default {DEFAULT_LOCAL_DATABASE})"
+    )
+    args = parser.parse_args()
+
     try:
-        exit_code = run_pipeline()
+        exit_code = run_pipeline(
+            mode=args.mode, max_concurrency=args.max_concurrency,
+            byte_budget_gb=args.byte_budget_gb, force=args.force, estimate_only=args.estimate,
+            skip_unchanged=not args.no_skip,
+            full_refresh=() if args.full_refresh is None else (
+                args.full_refresh or [layer['name'] for layer in manifest_layers(args.manifest)]
+            ),
+            manifests=args.manifest, dates=args.dates, partition_concurrency=args.partition_concurrency,
+            manifest_concurrency=args.manifest_concurrency,
+            backend=args.backend, fixtures=args.fixtures, database=args.database, resume_failed=args.resume
+        )
         sys.exit(exit_code)
     except KeyboardInterrupt:
         logger.info("\n\nPipeline interrupted by user")
@@ -2,8 +2,12 @@
 -- BRONZE LAYER: Building Permits - INCREMENTAL UPDATE
 -- ============================================================================
 -- Purpose: Incrementally merge new permits from raw to bronze layer
--- Strategy: MERGE on primary key (id) to avoid duplicates
+-- Strategy: MERGE on primary key (id) to avoid duplicates; only changed
+--           permits are updated (and get a new extracted_at)
 -- Filters: Valid coordinates, date range
+-- Parameters: @since_issue_date - high-water mark set by run_pipeline.py
+--             (latest issue_date already merged, or 2020-01-01 on initial load);
+--             raw is re-read from 30 days before it
 -- ============================================================================
 
 -- Create table if not exists (first run only)
@@ -90,22 +94,39 @@ USING (
     AND latitude BETWEEN 41.6 AND 42.1
     AND longitude BETWEEN -87.95 AND -87.5
 
-    -- Incremental filter: Process recent permits (last 30 days) OR all if bronze empty
-    AND (
-      -- Recent permits (issued in last 30 days)
-      DATE(issue_date) >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-      OR
-      -- Or all records if running initial load (when bronze is empty)
-      NOT EXISTS (
-        SELECT 1 FROM `chicago-bi-app-msds-432-476520.bronze_data.bronze_building_permits` LIMIT 1
-      )
-    )
+    -- Incremental filter: permits issued since 30 days before the
+    -- high-water mark. Raw has no load timestamp, so days loaded late or
+    -- backfilled behind the mark are only picked up inside this lookback.
+    AND DATE(issue_date) >= DATE_SUB(@since_issue_date, INTERVAL 30 DAY)
 ) AS source
 
+-- Matched on id alone: a permit's issue_date can change, so its bronze row
+-- may sit in any partition
 ON target.id = source.id
 
--- When record exists, update it
-WHEN MATCHED THEN
+-- When record exists and changed, update it. Unchanged permits keep their
+-- extracted_at, so rows with extracted_at past the silver watermark are
+-- exactly the ids this MERGE inserted or updated.
+WHEN MATCHED AND (
+  target.permit_ IS DISTINCT FROM source.permit_
+  OR target.permit_status IS DISTINCT FROM source.permit_status
+  OR target.permit_type IS DISTINCT FROM source.permit_type
+  OR target.application_start_date IS DISTINCT FROM source.application_start_date
+  OR target.issue_date IS DISTINCT FROM source.issue_date
+  OR target.processing_time IS DISTINCT FROM source.processing_time
+  OR target.street_number IS DISTINCT FROM source.street_number
+  OR target.street_direction IS DISTINCT FROM source.street_direction
+  OR target.street_name IS DISTINCT FROM source.street_name
+  OR target.work_type IS DISTINCT FROM source.work_type
+  OR target.work_description IS DISTINCT FROM source.work_description
+  OR target.permit_condition IS DISTINCT FROM source.permit_condition
+  OR target.total_fee IS DISTINCT FROM source.total_fee
+  OR target.reported_cost IS DISTINCT FROM source.reported_cost
+  OR target.pin_list IS DISTINCT FROM source.pin_list
+  OR target.community_area IS DISTINCT FROM source.community_area
+  OR target.latitude IS DISTINCT FROM source.latitude
+  OR target.longitude IS DISTINCT FROM source.longitude
+) THEN
   UPDATE SET
     permit_ = source.permit_,
     permit_status = source.permit_status,
@@ -2,8 +2,21 @@
 -- SILVER LAYER: Building Permits Enriched - INCREMENTAL UPDATE
 -- ============================================================================
 -- Purpose: Incrementally enrich permits with spatial data (ZIP, neighborhood)
--- Strategy: MERGE on primary key (id) to avoid duplicates
--- Dependencies: bronze_building_permits, zip_code_boundaries, neighborhood_boundaries
+-- Strategy: Enrich the permits bronze changed since the last run once (a
+--           session temp table), stage them in silver_permits_changes, then
+--           MERGE them on primary key (id). ZIP and neighborhood come from a
+--           cache keyed by coordinates; only unknown coordinates are
+--           resolved with spatial joins
+-- Dependencies: bronze_building_permits, zip_code_boundaries, neighborhood_boundaries,
+--               permit_geography_cache
+-- Parameters: @since_extracted_at - high-water mark set by run_pipeline.py
+--             (latest bronze extracted_at already enriched)
+--             @min_issue_date - earliest issue_date of the bronze rows
+--             extracted after the mark (prunes the bronze partitions; silver
+--             rows are matched by id, their issue_date may have moved)
+--             @enriched_at - timestamp of this run, tags its staged changes
+--             @boundaries_fingerprint - version of the boundary tables the
+--             geography cache is valid for
 -- ============================================================================
 
 -- Create table if not exists (first run only)
@@ -30,88 +43,224 @@ CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.silver_data.silver_pe
 PARTITION BY issue_date
 CLUSTER BY community_area, permit_type;
 
+-- Change log: one row per permit enriched by a run, with the ZIP it had
+-- before (gold uses it to find affected ZIPs). Old runs expire.
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.silver_data.silver_permits_changes` (
+  id STRING NOT NULL,
+  permit_ STRING,
+  permit_status STRING,
+  permit_type STRING,
+  application_start_date DATE,
+  issue_date DATE,
+  processing_time INT64,
+  work_type STRING,
+  total_fee FLOAT64,
+  reported_cost FLOAT64,
+  community_area INT64,
+  latitude FLOAT64,
+  longitude FLOAT64,
+  zip_code STRING,
+  neighborhood STRING,
+  permit_year INT64,
+  permit_month INT64,
+  enriched_at TIMESTAMP,
+  change_type STRING,
+  previous_zip_code STRING
+)
+PARTITION BY DATE(enriched_at)
+OPTIONS (partition_expiration_days = 30);
+
+-- Geography cache: ZIP and neighborhood of every permit coordinate resolved
+-- so far (NULL outside all boundaries), for one version of the boundaries
+CREATE TABLE IF NOT EXISTS `chicago-bi-app-msds-432-476520.reference_data.permit_geography_cache` (
+  latitude FLOAT64 NOT NULL,
+  longitude FLOAT64 NOT NULL,
+  zip_code STRING,
+  neighborhood STRING,
+  boundaries_fingerprint STRING,
+  resolved_at TIMESTAMP
+)
+CLUSTER BY latitude, longitude;
+
+-- Entries resolved against boundary tables that have changed since
+DELETE FROM `chicago-bi-app-msds-432-476520.reference_data.permit_geography_cache`
+WHERE boundaries_fingerprint != @boundaries_fingerprint;
+
 -- ============================================================================
--- MERGE Statement: Enrich and add/update records
+-- Session temp tables: the bronze rows changed since the mark and the silver
+-- rows they replace are read once; the enrichment below uses each of them
+-- several times, and its result feeds both the change log and the MERGE
 -- ============================================================================
 
-MERGE `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched` AS target
-USING (
-  WITH permits_with_geography AS (
-    SELECT
-      p.*,
-      -- Create geography point for spatial joins
-      ST_GEOGPOINT(p.longitude, p.latitude) as permit_point
-    FROM `chicago-bi-app-msds-432-476520.bronze_data.bronze_building_permits` p
-    WHERE issue_date >= '2020-01-01'
-      AND issue_date <= CURRENT_DATE()
-      -- Incremental: Only process recent permits (last 30 days) OR all if silver empty
-      AND (
-        p.issue_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 30 DAY)
-        OR
-        -- Or all records if silver is empty (initial load)
-        NOT EXISTS (
-          SELECT 1 FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched` LIMIT 1
-        )
-      )
-  ),
-  permits_with_zip AS (
-    SELECT
-      p.*,
-      -- ZIP code via spatial join (convert INTEGER to STRING)
-      CAST(z.zip AS STRING) as zip_code
-    FROM permits_with_geography p
-    LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.zip_code_boundaries` z
-      ON ST_CONTAINS(z.geometry, p.permit_point)
-  ),
-  permits_with_neighborhood AS (
-    SELECT
-      p.*,
-      -- Neighborhood via spatial join
-      n.pri_neigh as neighborhood
-    FROM permits_with_zip p
-    LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.neighborhood_boundaries` n
-      ON ST_CONTAINS(n.geometry, p.permit_point)
-  )
+CREATE OR REPLACE TEMP TABLE _SESSION.changed_permits AS
+SELECT p.*
+FROM `chicago-bi-app-msds-432-476520.bronze_data.bronze_building_permits` p
+WHERE issue_date >= '2020-01-01'
+  AND issue_date <= CURRENT_DATE()
+  -- Incremental: only bronze rows merged since the high-water mark
+  AND p.issue_date >= @min_issue_date
+  AND p.extracted_at > @since_extracted_at;
+
+-- Looked up by id in every partition: a changed permit's issue_date may have
+-- moved, so its silver row can be older than @min_issue_date
+CREATE OR REPLACE TEMP TABLE _SESSION.previous_permits AS
+SELECT s.id, s.latitude, s.longitude, s.zip_code, s.neighborhood
+FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched` s
+WHERE s.id IN (SELECT id FROM _SESSION.changed_permits);
+
+-- ============================================================================
+-- Resolve the coordinates of new and moved permits missing from the cache
+-- ============================================================================
+
+CREATE OR REPLACE TEMP TABLE _SESSION.resolved_coordinates AS
+WITH missing_coordinates AS (
+  SELECT DISTINCT
+    p.latitude,
+    p.longitude
+  FROM _SESSION.changed_permits p
+  -- Unmoved permits keep their geography
+  LEFT JOIN _SESSION.previous_permits s
+    ON s.id = p.id AND s.latitude = p.latitude AND s.longitude = p.longitude
+  LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.permit_geography_cache` c
+    ON c.latitude = p.latitude AND c.longitude = p.longitude
+  WHERE s.id IS NULL
+    AND c.latitude IS NULL
+),
+coordinates_with_geography AS (
   SELECT
-    -- Primary key
-    id,
+    m.*,
+    -- Create geography point for spatial joins
+    ST_GEOGPOINT(m.longitude, m.latitude) as point
+  FROM missing_coordinates m
+),
+coordinates_with_zip AS (
+  SELECT
+    m.*,
+    -- ZIP code via spatial join (convert INTEGER to STRING)
+    CAST(z.zip AS STRING) as zip_code
+  FROM coordinates_with_geography m
+  LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.zip_code_boundaries` z
+    ON ST_CONTAINS(z.geometry, m.point)
+)
+SELECT
+  m.latitude,
+  m.longitude,
+  m.zip_code,
+  -- Neighborhood via spatial join
+  n.pri_neigh as neighborhood
+FROM coordinates_with_zip m
+LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.neighborhood_boundaries` n
+  ON ST_CONTAINS(n.geometry, m.point);
+
+INSERT INTO `chicago-bi-app-msds-432-476520.reference_data.permit_geography_cache` (
+  latitude, longitude, zip_code, neighborhood, boundaries_fingerprint, resolved_at
+)
+SELECT
+  r.latitude, r.longitude, r.zip_code, r.neighborhood, @boundaries_fingerprint, @enriched_at
+FROM _SESSION.resolved_coordinates r;
+
+-- ============================================================================
+-- Enrich only the permits bronze inserted or updated
+-- ============================================================================
 
-    -- Permit details
-    permit_,
-    permit_status,
-    permit_type,
+CREATE OR REPLACE TEMP TABLE _SESSION.permit_changes AS
+WITH located_permits AS (
+  -- New and moved permits: geography of their coordinates (equi-join)
+  SELECT p.*, c.zip_code, c.neighborhood
+  FROM _SESSION.changed_permits p
+  LEFT JOIN _SESSION.previous_permits s
+    ON s.id = p.id AND s.latitude = p.latitude AND s.longitude = p.longitude
+  LEFT JOIN `chicago-bi-app-msds-432-476520.reference_data.permit_geography_cache` c
+    ON c.latitude = p.latitude AND c.longitude = p.longitude
+  WHERE s.id IS NULL
+
+  UNION ALL
+
+  -- Unmoved permits keep their geography
+  SELECT p.*, s.zip_code, s.neighborhood
+  FROM _SESSION.changed_permits p
+  INNER JOIN _SESSION.previous_permits s
+    ON s.id = p.id AND s.latitude = p.latitude AND s.longitude = p.longitude
+)
+SELECT
+  -- Primary key
+  p.id,
 
-    -- Dates
-    application_start_date,
-    issue_date,
-    processing_time,
+  -- Permit details
+  p.permit_,
+  p.permit_status,
+  p.permit_type,
 
-    -- Work details
-    work_type,
+  -- Dates
+  p.application_start_date,
+  p.issue_date,
+  p.processing_time,
 
-    -- Financials
-    ROUND(total_fee, 2) as total_fee,
-    ROUND(reported_cost, 2) as reported_cost,
+  -- Work details
+  p.work_type,
 
-    -- Location
-    community_area,
-    ROUND(latitude, 6) as latitude,
-    ROUND(longitude, 6) as longitude,
+  -- Financials
+  ROUND(p.total_fee, 2) as total_fee,
+  ROUND(p.reported_cost, 2) as reported_cost,
 
-    -- Enriched geography fields (from spatial joins)
-    zip_code,
-    neighborhood,
+  -- Location
+  p.community_area,
+  ROUND(p.latitude, 6) as latitude,
+  ROUND(p.longitude, 6) as longitude,
 
-    -- Derived date fields
-    EXTRACT(YEAR FROM issue_date) as permit_year,
-    EXTRACT(MONTH FROM issue_date) as permit_month,
+  -- Enriched geography fields (from spatial joins)
+  p.zip_code,
+  p.neighborhood,
 
-    -- Audit timestamp
-    CURRENT_TIMESTAMP() as enriched_at
+  -- Derived date fields
+  EXTRACT(YEAR FROM p.issue_date) as permit_year,
+  EXTRACT(MONTH FROM p.issue_date) as permit_month,
 
-  FROM permits_with_neighborhood
+  -- Audit timestamp (identifies this run's changes)
+  @enriched_at as enriched_at,
+
+  -- Change tracking
+  IF(s.id IS NULL, 'insert', 'update') as change_type,
+  s.zip_code as previous_zip_code
+
+FROM located_permits p
+LEFT JOIN _SESSION.previous_permits s ON s.id = p.id;
+
+-- ============================================================================
+-- Stage changes in the change log (gold reads it)
+-- ============================================================================
+
+INSERT INTO `chicago-bi-app-msds-432-476520.silver_data.silver_permits_changes` (
+  id, permit_, permit_status, permit_type,
+  application_start_date, issue_date, processing_time,
+  work_type, total_fee, reported_cost,
+  community_area, latitude, longitude,
+  zip_code, neighborhood,
+  permit_year, permit_month, enriched_at,
+  change_type, previous_zip_code
+)
+SELECT
+  id, permit_, permit_status, permit_type,
+  application_start_date, issue_date, processing_time,
+  work_type, total_fee, reported_cost,
+  community_area, latitude, longitude,
+  zip_code, neighborhood,
+  permit_year, permit_month, enriched_at,
+  change_type, previous_zip_code
+FROM _SESSION.permit_changes;
+
+-- ============================================================================
+-- MERGE Statement: Apply this run's staged changes
+-- ============================================================================
+
+MERGE `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched` AS target
+USING (
+  SELECT * EXCEPT (change_type, previous_zip_code)
+  FROM _SESSION.permit_changes
 ) AS source
 
+-- Matched on id alone, like previous_permits: pruning on the new
+-- issue_date would miss a permit whose issue_date moved earlier
 ON target.id = source.id
 
 -- When record exists, update it
@@ -1,231 +1,372 @@
 -- ============================================================================
--- GOLD LAYER: Building Permits Aggregates - FULL REFRESH
+-- GOLD LAYER: Building Permits Aggregates - INCREMENTAL BY ZIP
 -- ============================================================================
--- Purpose: Rebuild gold layer aggregates from silver data
--- Strategy: DELETE + INSERT (small tables, full refresh is fast)
--- Tables: gold_permits_roi, gold_loan_targets
--- Note: Gold aggregates are lightweight, full refresh preferred over incremental
+-- Purpose: Maintain gold layer aggregates from silver data
+-- Strategy: Recompute only the ZIPs whose permits changed since the last run
+--           (from silver_permits_changes, read once into staging tables)
+--           and MERGE them; loan target indices are re-normalized across
+--           all ZIPs from the stored per-ZIP values
+-- Tables: gold_permits_roi, gold_loan_targets (staging:
+--         _staging_permits_affected_zips, _staging_permits_affected_zip_permits)
+-- Parameters: @since_enriched_at - high-water mark set by run_pipeline.py
+--             (latest silver change already applied to gold)
+--             @full_rebuild - recompute every ZIP (initial load, --full-refresh,
+--             or a watermark older than the change log retention)
 -- ============================================================================
 
+-- ============================================================================
+-- Staging tables, read by both MERGEs
+-- ============================================================================
+-- Regular tables rather than session temp tables: a session runs one job at a
+-- time, so the two MERGEs could not run concurrently. They expire after a
+-- week and are replaced by every run.
+
+-- ZIPs that gained or lost permits since the last run (a moved permit
+-- affects both its old and new ZIP)
+CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zips`
+OPTIONS (expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 7 DAY))
+AS
+SELECT c.zip_code
+FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_changes` c
+WHERE DATE(c.enriched_at) >= DATE(@since_enriched_at)
+  AND c.enriched_at > @since_enriched_at
+  AND c.zip_code IS NOT NULL
+
+UNION DISTINCT
+
+SELECT c.previous_zip_code
+FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_changes` c
+WHERE DATE(c.enriched_at) >= DATE(@since_enriched_at)
+  AND c.enriched_at > @since_enriched_at
+  AND c.previous_zip_code IS NOT NULL;
+
+-- Silver permits of the affected ZIPs (all ZIPs on a full rebuild) with a
+-- positive reported cost
+CREATE OR REPLACE TABLE `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zip_permits`
+OPTIONS (expiration_timestamp = TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL 7 DAY))
+AS
+SELECT s.zip_code, s.permit_type, s.work_type, s.reported_cost
+FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched` s
+WHERE s.zip_code IS NOT NULL
+  AND s.reported_cost IS NOT NULL
+  AND s.reported_cost > 0  -- Exclude zero or negative values
+  AND (@full_rebuild OR s.zip_code IN (
+    SELECT a.zip_code FROM `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zips` a
+  ));
+
 -- ============================================================================
 -- TABLE 1: gold_permits_roi
 -- Purpose: Aggregate permit metrics by ZIP for ROI analysis
 -- ============================================================================
 
--- Delete existing data
-DELETE FROM `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi` WHERE TRUE;
-
--- Insert fresh aggregates
-INSERT INTO `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi` (
-  zip_code,
-  total_permits,
-  total_permit_value,
-  avg_permit_value,
-  created_at
-)
-SELECT
-  -- Primary key
-  zip_code,
-
-  -- Aggregated metrics
-  COUNT(*) as total_permits,
-  ROUND(SUM(reported_cost), 2) as total_permit_value,
-  ROUND(AVG(reported_cost), 2) as avg_permit_value,
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi` AS target
+USING (
+  WITH
+  -- Fresh aggregates of the affected ZIPs (all ZIPs on a full rebuild)
+  zip_aggregates AS (
+    SELECT
+      p.zip_code,
+      COUNT(*) as total_permits,
+      ROUND(SUM(p.reported_cost), 2) as total_permit_value,
+      ROUND(AVG(p.reported_cost), 2) as avg_permit_value
+    FROM `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zip_permits` p
+    GROUP BY p.zip_code
+  ),
+
+  -- Rows to maintain: ZIPs without aggregates any more are deleted
+  maintained_zips AS (
+    SELECT a.zip_code FROM `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zips` a
+    UNION DISTINCT
+    SELECT zip_code FROM zip_aggregates
+    UNION DISTINCT
+    SELECT zip_code FROM `chicago-bi-app-msds-432-476520.gold_data.gold_permits_roi`
+    WHERE @full_rebuild
+  )
 
-  -- Audit timestamp
-  CURRENT_TIMESTAMP() as created_at
-
-FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched`
-
-WHERE
-  zip_code IS NOT NULL
-  AND reported_cost IS NOT NULL
-  AND reported_cost > 0  -- Exclude zero or negative values
-
-GROUP BY zip_code;
+  SELECT
+    m.zip_code,
+    a.total_permits,
+    a.total_permit_value,
+    a.avg_permit_value
+  FROM maintained_zips m
+  LEFT JOIN zip_aggregates a ON a.zip_code = m.zip_code
+) AS source
+
+ON target.zip_code = source.zip_code
+
+WHEN MATCHED AND source.total_permits IS NULL THEN
+  DELETE
+
+WHEN MATCHED THEN
+  UPDATE SET
+    total_permits = source.total_permits,
+    total_permit_value = source.total_permit_value,
+    avg_permit_value = source.avg_permit_value,
+    created_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED AND source.total_permits IS NOT NULL THEN
+  INSERT (
+    zip_code,
+    total_permits,
+    total_permit_value,
+    avg_permit_value,
+    created_at
+  )
+  VALUES (
+    source.zip_code,
+    source.total_permits,
+    source.total_permit_value,
+    source.avg_permit_value,
+    CURRENT_TIMESTAMP()
+  );
 
 -- ============================================================================
 -- TABLE 2: gold_loan_targets
 -- Purpose: Calculate loan eligibility for Small Business Emergency Loan Fund
 -- Criteria: Low income + low NEW CONSTRUCTION permit activity
+-- Note: Population and income are small inputs, recomputed for every ZIP.
+--       Permit aggregates are recomputed for the affected ZIPs only; the
+--       other ZIPs keep the values stored in gold_loan_targets. The indices
+--       are normalized across all ZIPs, so they are recalculated for every
+--       row and only rows whose values changed are rewritten.
 -- ============================================================================
 
--- Delete existing data
-DELETE FROM `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets` WHERE TRUE;
-
--- Insert fresh calculations
-INSERT INTO `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets` (
-  zip_code,
-  population,
-  per_capita_income,
-  inverted_income_index,
-  total_permits_new_construction,
-  inverted_new_construction_index,
-  total_permits_construction,
-  inverted_permits_index,
-  median_permit_value,
-  permit_value_index,
-  eligibility_index,
-  is_loan_eligible,
-  created_at
-)
-WITH
--- Step 1: Get ZIP-level population from COVID data (most recent week)
-zip_population AS (
-  SELECT DISTINCT
-    zip_code,
-    FIRST_VALUE(population) OVER (PARTITION BY zip_code ORDER BY week_start DESC) as population
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_covid_weekly_historical`
-),
-
--- Step 2: Calculate weighted per_capita_income by ZIP using spatial crosswalk
-zip_income AS (
-  SELECT
-    cw.zip_code,
-    -- Weighted average: SUM(income * pct_of_zip) / SUM(pct_of_zip)
-    ROUND(
-      SUM(ph.per_capita_income * cw.pct_of_zip) / NULLIF(SUM(cw.pct_of_zip), 0),
-      0
-    ) as per_capita_income
-  FROM `chicago-bi-app-msds-432-476520.reference_data.crosswalk_community_zip` cw
-  INNER JOIN `chicago-bi-app-msds-432-476520.bronze_data.bronze_public_health` ph
-    ON cw.community_area_number = ph.community_area
-  WHERE ph.per_capita_income IS NOT NULL
-  GROUP BY cw.zip_code
-),
-
--- Step 3: Count permits by ZIP (total and new construction)
-permit_counts AS (
+MERGE `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets` AS target
+USING (
+  WITH
+  -- Step 1: Get ZIP-level population from COVID data (most recent week)
+  zip_population AS (
+    SELECT DISTINCT
+      zip_code,
+      FIRST_VALUE(population) OVER (PARTITION BY zip_code ORDER BY week_start DESC) as population
+    FROM `chicago-bi-app-msds-432-476520.silver_data.silver_covid_weekly_historical`
+  ),
+
+  -- Step 2: Calculate weighted per_capita_income by ZIP using spatial crosswalk
+  zip_income AS (
+    SELECT
+      cw.zip_code,
+      -- Weighted average: SUM(income * pct_of_zip) / SUM(pct_of_zip)
+      ROUND(
+        SUM(ph.per_capita_income * cw.pct_of_zip) / NULLIF(SUM(cw.pct_of_zip), 0),
+        0
+      ) as per_capita_income
+    FROM `chicago-bi-app-msds-432-476520.reference_data.crosswalk_community_zip` cw
+    INNER JOIN `chicago-bi-app-msds-432-476520.bronze_data.bronze_public_health` ph
+      ON cw.community_area_number = ph.community_area
+    WHERE ph.per_capita_income IS NOT NULL
+    GROUP BY cw.zip_code
+  ),
+
+  -- Step 3: Count permits by ZIP (total and new construction), affected ZIPs only
+  permit_counts AS (
+    SELECT
+      zip_code,
+      COUNT(*) as total_permits_construction,
+      COUNTIF(
+        UPPER(permit_type) LIKE '%NEW CONSTRUCTION%' OR
+        UPPER(work_type) LIKE '%NEW CONSTRUCTION%'
+      ) as total_permits_new_construction,
+      -- Median permit value
+      PERCENTILE_CONT(reported_cost, 0.5) OVER (PARTITION BY zip_code) as median_permit_value_window
+    FROM `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zip_permits` p
+    GROUP BY zip_code, reported_cost
+  ),
+
+  -- Step 4: Get one row per ZIP with median permit value: recomputed for
+  -- the affected ZIPs, as stored for the others (ZIPs stored without
+  -- permits have none)
+  permit_aggregates AS (
+    SELECT DISTINCT
+      zip_code,
+      MAX(total_permits_construction) OVER (PARTITION BY zip_code) as total_permits_construction,
+      MAX(total_permits_new_construction) OVER (PARTITION BY zip_code) as total_permits_new_construction,
+      FIRST_VALUE(median_permit_value_window) OVER (PARTITION BY zip_code ORDER BY median_permit_value_window) as median_permit_value
+    FROM permit_counts
+
+    UNION ALL
+
+    SELECT
+      zip_code,
+      total_permits_construction,
+      total_permits_new_construction,
+      median_permit_value
+    FROM `chicago-bi-app-msds-432-476520.gold_data.gold_loan_targets`
+    WHERE NOT @full_rebuild
+      AND total_permits_construction > 0
+      AND zip_code NOT IN (
+        SELECT a.zip_code FROM `chicago-bi-app-msds-432-476520.gold_data._staging_permits_affected_zips` a
+      )
+  ),
+
+  -- Step 5: Calculate normalization bounds
+  normalization_bounds AS (
+    SELECT
+      -- Income bounds
+      MIN(zi.per_capita_income) as min_income,
+      MAX(zi.per_capita_income) as max_income,
+
+      -- New construction permits bounds
+      MIN(pa.total_permits_new_construction) as min_new_construction,
+      MAX(pa.total_permits_new_construction) as max_new_construction,
+
+      -- Total permits bounds
+      MIN(pa.total_permits_construction) as min_permits,
+      MAX(pa.total_permits_construction) as max_permits,
+
+      -- Permit value bounds
+      MIN(pa.median_permit_value) as min_permit_value,
+      MAX(pa.median_permit_value) as max_permit_value
+
+    FROM zip_income zi
+    CROSS JOIN permit_aggregates pa
+  ),
+
+  -- Step 6: Combine all data and calculate indices
+  combined_data AS (
+    SELECT
+      COALESCE(zp.zip_code, zi.zip_code, pa.zip_code) as zip_code,
+      COALESCE(zp.population, 0) as population,
+      COALESCE(zi.per_capita_income, 0) as per_capita_income,
+      COALESCE(pa.total_permits_new_construction, 0) as total_permits_new_construction,
+      COALESCE(pa.total_permits_construction, 0) as total_permits_construction,
+      COALESCE(pa.median_permit_value, 0) as median_permit_value,
+
+      -- Inverted income index (low income = high index, 0-1 scale)
+      ROUND(
+        1 - (
+          (COALESCE(zi.per_capita_income, 0) - nb.min_income) /
+          NULLIF(nb.max_income - nb.min_income, 0)
+        ),
+        2
+      ) as inverted_income_index,
+
+      -- Inverted new construction index (low construction = high index)
+      ROUND(
+        1 - (
+          (COALESCE(pa.total_permits_new_construction, 0) - nb.min_new_construction) /
+          NULLIF(nb.max_new_construction - nb.min_new_construction, 0)
+        ),
+        2
+      ) as inverted_new_construction_index,
+
+      -- Inverted total permits index
+      ROUND(
+        1 - (
+          (COALESCE(pa.total_permits_construction, 0) - nb.min_permits) /
+          NULLIF(nb.max_permits - nb.min_permits, 0)
+        ),
+        2
+      ) as inverted_permits_index,
+
+      -- Permit value index (higher value = higher index, for loan sizing)
+      ROUND(
+        (COALESCE(pa.median_permit_value, 0) - nb.min_permit_value) /
+        NULLIF(nb.max_permit_value - nb.min_permit_value, 0),
+        2
+      ) as permit_value_index
+
+    FROM zip_population zp
+    FULL OUTER JOIN zip_income zi ON zp.zip_code = zi.zip_code
+    FULL OUTER JOIN permit_aggregates pa ON COALESCE(zp.zip_code, zi.zip_code) = pa.zip_code
+    CROSS JOIN normalization_bounds nb
+
+    WHERE COALESCE(zp.zip_code, zi.zip_code, pa.zip_code) IS NOT NULL
+  )
+
+  -- Step 7: Final eligibility calculation
   SELECT
     zip_code,
-    COUNT(*) as total_permits_construction,
-    COUNTIF(
-      UPPER(permit_type) LIKE '%NEW CONSTRUCTION%' OR
-      UPPER(work_type) LIKE '%NEW CONSTRUCTION%'
-    ) as total_permits_new_construction,
-    -- Median permit value
-    PERCENTILE_CONT(reported_cost, 0.5) OVER (PARTITION BY zip_code) as median_permit_value_window
-  FROM `chicago-bi-app-msds-432-476520.silver_data.silver_permits_enriched`
-  WHERE zip_code IS NOT NULL
-    AND reported_cost IS NOT NULL
-    AND reported_cost > 0
-  GROUP BY zip_code, reported_cost
-),
-
--- Step 4: Get one row per ZIP with median permit value
-permit_aggregates AS (
-  SELECT DISTINCT
-    zip_code,
-    MAX(total_permits_construction) OVER (PARTITION BY zip_code) as total_permits_construction,
-    MAX(total_permits_new_construction) OVER (PARTITION BY zip_code) as total_permits_new_construction,
-    FIRST_VALUE(median_permit_value_window) OVER (PARTITION BY zip_code ORDER BY median_permit_value_window) as median_permit_value
-  FROM permit_counts
-),
-
--- Step 5: Calculate normalization bounds
-normalization_bounds AS (
-  SELECT
-    -- Income bounds
-    MIN(zi.per_capita_income) as min_income,
-    MAX(zi.per_capita_income) as max_income,
-
-    -- New construction permits bounds
-    MIN(pa.total_permits_new_construction) as min_new_construction,
-    MAX(pa.total_permits_new_construction) as max_new_construction,
-
-    -- Total permits bounds
-    MIN(pa.total_permits_construction) as min_permits,
-    MAX(pa.total_permits_construction) as max_permits,
-
-    -- Permit value bounds
-    MIN(pa.median_permit_value) as min_permit_value,
-    MAX(pa.median_permit_value) as max_permit_value
-
-  FROM zip_income zi
-  CROSS JOIN permit_aggregates pa
-),
-
--- Step 6: Combine all data and calculate indices
-combined_data AS (
-  SELECT
-    COALESCE(zp.zip_code, zi.zip_code, pa.zip_code) as zip_code,
-    COALESCE(zp.population, 0) as population,
-    COALESCE(zi.per_capita_income, 0) as per_capita_income,
-    COALESCE(pa.total_permits_new_construction, 0) as total_permits_new_construction,
-    COALESCE(pa.total_permits_construction, 0) as total_permits_construction,
-    COALESCE(pa.median_permit_value, 0) as median_permit_value,
-
-    -- Inverted income index (low income = high index, 0-1 scale)
-    ROUND(
-      1 - (
-        (COALESCE(zi.per_capita_income, 0) - nb.min_income) /
-        NULLIF(nb.max_income - nb.min_income, 0)
-      ),
-      2
-    ) as inverted_income_index,
-
-    -- Inverted new construction index (low construction = high index)
-    ROUND(
-      1 - (
-        (COALESCE(pa.total_permits_new_construction, 0) - nb.min_new_construction) /
-        NULLIF(nb.max_new_construction - nb.min_new_construction, 0)
-      ),
-      2
-    ) as inverted_new_construction_index,
-
-    -- Inverted total permits index
+    population,
+    per_capita_income,
+    inverted_income_index,
+    total_permits_new_construction,
+    inverted_new_construction_index,
+    total_permits_construction,
+    inverted_permits_index,
+    median_permit_value,
+    permit_value_index,
+
+    -- Overall eligibility index (weighted average of key indices)
     ROUND(
-      1 - (
-        (COALESCE(pa.total_permits_construction, 0) - nb.min_permits) /
-        NULLIF(nb.max_permits - nb.min_permits, 0)
-      ),
+      (inverted_income_index * 0.4 +
+       inverted_new_construction_index * 0.4 +
+       inverted_permits_index * 0.2),
       2
-    ) as inverted_permits_index,
-
-    -- Permit value index (higher value = higher index, for loan sizing)
-    ROUND(
-      (COALESCE(pa.median_permit_value, 0) - nb.min_permit_value) /
-      NULLIF(nb.max_permit_value - nb.min_permit_value, 0),
-      2
-    ) as permit_value_index
-
-  FROM zip_population zp
-  FULL OUTER JOIN zip_income zi ON zp.zip_code = zi.zip_code
-  FULL OUTER JOIN permit_aggregates pa ON COALESCE(zp.zip_code, zi.zip_code) = pa.zip_code
-  CROSS JOIN normalization_bounds nb
-
-  WHERE COALESCE(zp.zip_code, zi.zip_code, pa.zip_code) IS NOT NULL
-)
-
--- Step 7: Final eligibility calculation
-SELECT
-  zip_code,
-  population,
-  per_capita_income,
-  inverted_income_index,
-  total_permits_new_construction,
-  inverted_new_construction_index,
-  total_permits_construction,
-  inverted_permits_index,
-  median_permit_value,
-  permit_value_index,
-
-  -- Overall eligibility index (weighted average of key indices)
-  ROUND(
-    (inverted_income_index * 0.4 +
-     inverted_new_construction_index * 0.4 +
-     inverted_permits_index * 0.2),
-    2
-  ) as eligibility_index,
-
-  -- Binary eligibility flag (high need areas)
-  (inverted_income_index >= 0.3 AND inverted_new_construction_index >= 0.3) as is_loan_eligible,
-
-  -- Audit timestamp
-  CURRENT_TIMESTAMP() as created_at
-
-FROM combined_data
-WHERE zip_code != 'Unknown';
+    ) as eligibility_index,
+
+    -- Binary eligibility flag (high need areas)
+    (inverted_income_index >= 0.3 AND inverted_new_construction_index >= 0.3) as is_loan_eligible
+
+  FROM combined_data
+  WHERE zip_code != 'Unknown'
+) AS source
+
+ON target.zip_code = source.zip_code
+
+-- Only rows whose values or rank changed are rewritten
+WHEN MATCHED AND (
+  target.population IS DISTINCT FROM source.population
+  OR target.per_capita_income IS DISTINCT FROM source.per_capita_income
+  OR target.inverted_income_index IS DISTINCT FROM source.inverted_income_index
+  OR target.total_permits_new_construction IS DISTINCT FROM source.total_permits_new_construction
+  OR target.inverted_new_construction_index IS DISTINCT FROM source.inverted_new_construction_index
+  OR target.total_permits_construction IS DISTINCT FROM source.total_permits_construction
+  OR target.inverted_permits_index IS DISTINCT FROM source.inverted_permits_index
+  OR target.median_permit_value IS DISTINCT FROM source.median_permit_value
+  OR target.permit_value_index IS DISTINCT FROM source.permit_value_index
+  OR target.eligibility_index IS DISTINCT FROM source.eligibility_index
+  OR target.is_loan_eligible IS DISTINCT FROM source.is_loan_eligible
+) THEN
+  UPDATE SET
+    population = source.population,
+    per_capita_income = source.per_capita_income,
+    inverted_income_index = source.inverted_income_index,
+    total_permits_new_construction = source.total_permits_new_construction,
+    inverted_new_construction_index = source.inverted_new_construction_index,
+    total_permits_construction = source.total_permits_construction,
+    inverted_permits_index = source.inverted_permits_index,
+    median_permit_value = source.median_permit_value,
+    permit_value_index = source.permit_value_index,
+    eligibility_index = source.eligibility_index,
+    is_loan_eligible = source.is_loan_eligible,
+    created_at = CURRENT_TIMESTAMP()
+
+WHEN NOT MATCHED THEN
+  INSERT (
+    zip_code,
+    population,
+    per_capita_income,
+    inverted_income_index,
+    total_permits_new_construction,
+    inverted_new_construction_index,
+    total_permits_construction,
+    inverted_permits_index,
+    median_permit_value,
+    permit_value_index,
+    eligibility_index,
+    is_loan_eligible,
+    created_at
+  )
+  VALUES (
+    source.zip_code,
+    source.population,
+    source.per_capita_income,
+    source.inverted_income_index,
+    source.total_permits_new_construction,
+    source.inverted_new_construction_index,
+    source.total_permits_construction,
+    source.inverted_permits_index,
+    source.median_permit_value,
+    source.permit_value_index,
+    source.eligibility_index,
+    source.is_loan_eligible,
+    CURRENT_TIMESTAMP()
+  )
+
+-- ZIPs no longer in any source
+WHEN NOT MATCHED BY SOURCE THEN
+  DELETE;
 
 -- ============================================================================
 -- Verification Queries (for logging)
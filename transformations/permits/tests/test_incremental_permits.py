@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Building Permits Data Pipeline - Incremental regression tests
+Purpose: Run the permits manifest twice on the local DuckDB backend and check
+         that the second, incremental run picks up raw data the first one
+         did not see
+
+Requires duckdb (pip install -r requirements-local.txt) and
+google-cloud-bigquery. Run from the repository root:
+    python3 -m pytest transformations/permits/tests
+"""
+
+import os
+import sys
+import logging
+from datetime import date, timedelta
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+pytest.importorskip("google.cloud.bigquery")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+from local_backend import generate_fixtures  # noqa: E402
+from run_pipeline import run_pipeline  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+UNTIL = date.today() - timedelta(days=3)
+RAW = os.path.join("raw_data", "raw_building_permits.parquet")
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Fixtures directory and a function running the permits manifest on them"""
+    fixtures = tmp_path / "fixtures"
+    generate_fixtures(str(fixtures), permits=5000, until=UNTIL, seed=0, trips=0)
+    database = str(tmp_path / "permits.duckdb")
+
+    def run():
+        assert run_pipeline(backend="duckdb", fixtures=str(fixtures), database=database,
+                            manifests=["permits"]) == 0
+        return duckdb.connect(database)
+
+    return fixtures, run
+
+
+def rewrite_raw(fixtures, select):
+    """Replace the raw permits fixture by a SELECT over it (raw) and bump its
+    mtime so the next run reloads it"""
+    path = str(fixtures / RAW)
+    conn = duckdb.connect()
+    conn.execute(f"CREATE TABLE raw AS SELECT * FROM read_parquet('{path}')")
+    conn.execute(f"COPY ({select}) TO '{path}' (FORMAT PARQUET)")
+    conn.close()
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_late_raw_day_is_merged(pipeline):
+    """A raw day loaded after later days were merged still reaches bronze"""
+    fixtures, run = pipeline
+    late_day = UNTIL - timedelta(days=5)
+    path = str(fixtures / RAW)
+    conn = duckdb.connect()
+    conn.execute(f"CREATE TABLE complete AS SELECT * FROM read_parquet('{path}')")
+    conn.execute(f"COPY complete TO '{fixtures / 'complete.parquet'}' (FORMAT PARQUET)")
+    conn.close()
+
+    rewrite_raw(fixtures, f"SELECT * FROM raw WHERE CAST(issue_date AS DATE) <> DATE '{late_day}'")
+    run().close()
+
+    rewrite_raw(fixtures, f"SELECT * FROM read_parquet('{fixtures / 'complete.parquet'}')")
+    db = run()
+    expected = db.execute("""
+        SELECT COUNT(*) FROM raw_data.raw_building_permits
+        WHERE CAST(issue_date AS DATE) = ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """, [late_day]).fetchone()[0]
+    bronze = db.execute(
+        "SELECT COUNT(*) FROM bronze_data.bronze_building_permits WHERE issue_date = ?", [late_day]
+    ).fetchone()[0]
+    silver = db.execute(
+        "SELECT COUNT(*) FROM silver_data.silver_permits_enriched WHERE issue_date = ?", [late_day]
+    ).fetchone()[0]
+    db.close()
+
+    assert expected > 0
+    assert bronze == expected
+    assert silver == expected
+
+
+def test_moved_issue_date_updates_permit(pipeline):
+    """A permit whose issue_date changes is updated in place, not duplicated"""
+    fixtures, run = pipeline
+    db = run()
+    permit_id, old_day = db.execute("""
+        SELECT id, issue_date FROM bronze_data.bronze_building_permits
+        WHERE issue_date < ? ORDER BY issue_date DESC, id LIMIT 1
+    """, [UNTIL - timedelta(days=60)]).fetchone()
+    db.close()
+
+    new_day = UNTIL - timedelta(days=1)
+    rewrite_raw(fixtures, f"""
+        SELECT * REPLACE (
+          CASE WHEN id = '{permit_id}' THEN TIMESTAMP '{new_day}' ELSE issue_date END AS issue_date
+        ) FROM raw
+    """)
+    db = run()
+    bronze = db.execute(
+        "SELECT issue_date FROM bronze_data.bronze_building_permits WHERE id = ?", [permit_id]
+    ).fetchall()
+    silver = db.execute(
+        "SELECT issue_date FROM silver_data.silver_permits_enriched WHERE id = ?", [permit_id]
+    ).fetchall()
+    change = db.execute("""
+        SELECT change_type, previous_zip_code IS NOT NULL FROM silver_data.silver_permits_changes
+        WHERE id = ? ORDER BY enriched_at DESC LIMIT 1
+    """, [permit_id]).fetchone()
+    duplicates = [
+        db.execute(f"SELECT COUNT(*) - COUNT(DISTINCT id) FROM {table}").fetchone()[0]
+        for table in ("bronze_data.bronze_building_permits", "silver_data.silver_permits_enriched")
+    ]
+    db.close()
+
+    assert old_day < new_day
+    assert bronze == [(new_day,)]
+    assert silver == [(new_day,)]
+    assert change == ('update', True)
+    assert duplicates == [0, 0]